@@ -0,0 +1,25 @@
+"""Shared fixtures; the bot's modules import each other by bare name, as under ``python main.py``."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "watchdogcam"))
+
+from config import Settings  # noqa: E402
+
+
+@pytest.fixture
+def settings(tmp_path: Path) -> Settings:
+    return Settings(
+        token="123:test",
+        cameras_file=tmp_path / "cameras.json",
+        subscribers_file=tmp_path / "subscribers.json",
+        outbox_file=tmp_path / "outbox.json",
+        subscriptions_file=tmp_path / "subscriptions.json",
+        uptime_file=tmp_path / "uptime.bin",
+        probe_timeout_seconds=1.0,
+        check_deadline_seconds=10,
+        confirm_results=1,
+        confirm_backoff_seconds=0.0,
+    )
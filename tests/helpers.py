@@ -0,0 +1,60 @@
+"""Stand-in servers and clients on the loopback interface."""
+import asyncio
+import contextlib
+import socket
+from typing import AsyncIterator, Awaitable, Callable, Dict, Tuple
+
+Handler = Callable[[asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]]
+
+
+@contextlib.asynccontextmanager
+async def serve(handler: Handler, host: str = "127.0.0.1") -> AsyncIterator[int]:
+    """Run ``handler`` for every connection to an ephemeral port; yields the port."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await handler(reader, writer)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, 0)
+    try:
+        yield server.sockets[0].getsockname()[1]
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def answer(status_line: bytes, delay: float = 0.0) -> Handler:
+    """A handler that reads the request head and answers with ``status_line``."""
+
+    async def handler(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.readuntil(b"\r\n\r\n")
+        await asyncio.sleep(delay)
+        writer.write(status_line + b"\r\n\r\n")
+        await writer.drain()
+
+    return handler
+
+
+def closed_port(host: str = "127.0.0.1") -> int:
+    """A port nothing listens on, found by binding and releasing it."""
+
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+async def http_post(port: int, path: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n{head}Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    status_line, _, rest = raw.partition(b"\r\n")
+    return int(status_line.split()[1]), rest.partition(b"\r\n\r\n")[2]
@@ -0,0 +1,31 @@
+"""Validation of imported camera rows (user-018)."""
+import io
+import json
+
+from bulk import read_import
+
+
+def _import(rows: list) -> object:
+    document = "\n".join(json.dumps(row) for row in rows).encode("utf-8")
+    return read_import(io.BytesIO(document), "cameras.jsonl", existing_ids=set(), existing_ips={"10.0.0.9"})
+
+
+def test_malformed_probes_are_rejected_per_row() -> None:
+    report = _import(
+        [
+            {"ip": "10.0.0.1", "probe": {"type": "http", "expect_status": 200}},
+            {"ip": "10.0.0.2", "probe": {"type": "tcp", "port": None}},
+            {"ip": "10.0.0.3", "probe": {"type": "tcp", "port": 70000}},
+            {"ip": "10.0.0.4", "probe": "telnet"},
+        ]
+    )
+    assert [camera["ip"] for camera in report.cameras] == ["10.0.0.1"]
+    assert [row for row, _message in report.errors] == [2, 3, 4]
+    assert report.invalid == 3
+
+
+def test_duplicates_are_rejected() -> None:
+    report = _import([{"ip": "10.0.0.9"}, {"ip": "10.0.0.5"}, {"ip": "10.0.0.5"}])
+    assert [camera["ip"] for camera in report.cameras] == ["10.0.0.5"]
+    assert [row for row, _message in report.errors] == [1, 3]
+    assert report.duplicates == 2
@@ -0,0 +1,51 @@
+"""Subnet sweeps against localhost listeners (user-019)."""
+import asyncio
+import dataclasses
+import ipaddress
+
+from discovery import Discovery, sweep
+from registry import CameraRegistry
+from storage import JsonStore
+from tests.helpers import closed_port, serve
+
+
+async def _accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    pass
+
+
+def test_sweep_finds_open_ports(settings) -> None:
+    unused = closed_port()
+
+    async def scenario():
+        async with serve(_accept) as port:
+            swept = dataclasses.replace(settings, discovery_ports=(unused, port), discovery_timeout_seconds=0.5)
+            return port, await sweep(["127.0.0.1", "127.0.0.2"], swept)
+
+    port, found = asyncio.run(scenario())
+    hosts = {host.ip: host for host in found}
+    # The listener is bound to 127.0.0.1 only.
+    assert hosts["127.0.0.1"].ports == [port]
+    assert hosts["127.0.0.1"].probe == {"type": "tcp", "port": port}
+    assert "127.0.0.2" not in hosts or hosts["127.0.0.2"].ports == []
+
+
+def test_discover_skips_known_cameras_and_enrolls(settings, tmp_path) -> None:
+    store = JsonStore(tmp_path / "cameras.json", tmp_path / "subscribers.json")
+    registry = CameraRegistry(store, [{"id": "known", "name": "known", "ip": "127.0.0.2", "enabled": True}])
+
+    async def scenario():
+        async with serve(_accept) as port:
+            swept = dataclasses.replace(settings, discovery_ports=(port,), discovery_timeout_seconds=0.5)
+            discovery = Discovery(swept, registry)
+            report = await discovery.discover(ipaddress.ip_network("127.0.0.0/30"))
+            return port, discovery, report
+
+    port, discovery, report = asyncio.run(scenario())
+    assert (report.scanned, report.known) == (1, 1)
+    assert [host.ip for host in report.found] == ["127.0.0.1"]
+    assert discovery.report(report.id) is report
+
+    [camera] = discovery.enroll(discovery.offered(report, "127.0.0.1"))
+    assert camera["probe"] == {"type": "tcp", "port": port}
+    assert registry.find("127.0.0.1") is not None
+    assert discovery.pending(report) == []
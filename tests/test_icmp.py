@@ -0,0 +1,34 @@
+"""Batch ICMP echo against 127.0.0.0/8 (user-002)."""
+import asyncio
+
+import pytest
+
+from icmp import _checksum, _echo_request, open_icmp_socket, ping_many
+
+
+@pytest.fixture(autouse=True)
+def icmp_socket() -> None:
+    try:
+        sock, _raw = open_icmp_socket()
+    except OSError as exc:
+        pytest.skip(f"no ICMP socket on this host: {exc}")
+    sock.close()
+
+
+def test_echo_request_checksum() -> None:
+    assert _checksum(_echo_request(0x1234, 7)) == 0
+
+
+def test_ping_many_loopback() -> None:
+    targets = ["127.0.0.1", "127.0.0.2", "127.0.0.3", "127.0.0.1"]
+    results = asyncio.run(ping_many(targets, timeout_seconds=1, count=2, interval_seconds=0.01))
+    assert sorted(results) == ["127.0.0.1", "127.0.0.2", "127.0.0.3"]
+    for result in results.values():
+        assert result.reachable
+        assert (result.sent, result.received) == (2, 2)
+        assert result.loss == 0
+        assert result.rtt_ms is not None and result.rtt_ms >= 0
+
+
+def test_ping_many_without_targets() -> None:
+    assert asyncio.run(ping_many([])) == {}
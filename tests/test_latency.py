@@ -0,0 +1,35 @@
+"""Fleet RTT percentiles from the incremental histogram."""
+import math
+import random
+
+from latency import PERCENTILES, LatencyHistory, percentile
+from probes import ProbeResult
+
+
+def _exact(history: LatencyHistory) -> dict:
+    ordered = sorted(value for camera_id in history._rtt for value in history.samples(camera_id)[0])
+    return {percent: percentile(ordered, percent) for percent in PERCENTILES} if ordered else {}
+
+
+def test_fleet_percentiles_follow_records_and_evictions() -> None:
+    rng = random.Random(7)
+    history = LatencyHistory(capacity=16)
+    for _round in range(40):
+        for camera in range(50):
+            online = rng.random() > 0.1
+            history.record(str(camera), ProbeResult(online=online, rtt_ms=rng.lognormvariate(3, 1) if online else None))
+
+    fleet, exact = history.fleet_percentiles(), _exact(history)
+    assert fleet.keys() == exact.keys()
+    for percent in PERCENTILES:
+        assert math.isclose(fleet[percent], exact[percent], rel_tol=0.011)
+
+
+def test_removed_cameras_leave_the_histogram() -> None:
+    history = LatencyHistory(capacity=4)
+    history.record("slow", ProbeResult(online=True, rtt_ms=900.0))
+    history.record("fast", ProbeResult(online=True, rtt_ms=2.0))
+    history._on_camera_changed("slow", None)
+    assert math.isclose(history.fleet_percentiles()[99], 2.0, rel_tol=0.011)
+    history._on_camera_changed("fast", None)
+    assert history.fleet_percentiles() == {}
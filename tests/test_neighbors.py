@@ -0,0 +1,91 @@
+"""Passive liveness from a /proc/net/arp fixture (user-023)."""
+import asyncio
+from pathlib import Path
+
+from monitor import probe_cameras
+from neighbors import PassiveLiveness, parse_ip_neigh, parse_neighbors
+
+ARP_FIXTURE = Path(__file__).parent / "data" / "proc_net_arp"
+
+
+def _camera(camera_id: str, ip: str, **fields) -> dict:
+    return {"id": camera_id, "name": camera_id, "ip": ip, "enabled": True, "last_status": "online", **fields}
+
+
+def test_parse_proc_arp() -> None:
+    neighbors = parse_neighbors(ARP_FIXTURE.read_text())
+    assert {ip: neighbor.state for ip, neighbor in neighbors.items()} == {
+        "10.20.0.11": "REACHABLE",
+        "10.20.0.12": "REACHABLE",
+        "10.20.0.13": "INCOMPLETE",
+        "10.20.0.1": "PERMANENT",
+    }
+    assert neighbors["10.20.0.11"].mac == "00:40:8c:1a:2b:01"
+    assert neighbors["10.20.0.11"].device == "eth0"
+
+
+def test_parse_ip_neigh() -> None:
+    text = (
+        "10.20.0.11 dev eth0 lladdr 00:40:8c:1a:2b:01 REACHABLE\n"
+        "10.20.0.12 dev eth0 lladdr 00:40:8c:1a:2b:02 STALE\n"
+    )
+    neighbors = parse_ip_neigh(text)
+    assert neighbors["10.20.0.11"].state == "REACHABLE"
+    assert neighbors["10.20.0.12"].state == "STALE"
+
+
+def test_only_fresh_icmp_cameras_are_skipped() -> None:
+    liveness = PassiveLiveness(str(ARP_FIXTURE), max_age_seconds=300)
+    cameras = [
+        _camera("fresh", "10.20.0.11"),
+        _camera("tcp", "10.20.0.12", probe={"type": "tcp", "port": 554}),
+        _camera("incomplete", "10.20.0.13"),
+        _camera("absent", "10.20.0.14"),
+        _camera("was-offline", "10.20.0.12", last_status="offline"),
+    ]
+
+    async def scenario():
+        snapshot = await liveness.snapshot()
+        # Every camera is probed once before the table can vouch for it.
+        first = snapshot.split(cameras)
+        snapshot.probed(str(camera["id"]) for camera in cameras)
+        return first, snapshot.split(cameras)
+
+    (passive, active), (passive_later, active_later) = asyncio.run(scenario())
+    assert passive == [] and active == cameras
+    assert [camera["id"] for camera in passive_later] == ["fresh"]
+    assert [camera["id"] for camera in active_later] == ["tcp", "incomplete", "absent", "was-offline"]
+
+
+def test_stale_probe_is_due_again() -> None:
+    liveness = PassiveLiveness(str(ARP_FIXTURE), max_age_seconds=0)
+    camera = _camera("fresh", "10.20.0.11")
+
+    async def scenario():
+        snapshot = await liveness.snapshot()
+        snapshot.probed(["fresh"])
+        return snapshot.split([camera])
+
+    assert asyncio.run(scenario()) == ([], [camera])
+
+
+def test_unreadable_table_probes_everything(tmp_path: Path) -> None:
+    liveness = PassiveLiveness(str(tmp_path / "missing"), max_age_seconds=300)
+    camera = _camera("fresh", "10.20.0.11")
+    liveness.probed(["fresh"])
+    snapshot = asyncio.run(liveness.snapshot())
+    assert snapshot.split([camera]) == ([], [camera])
+
+
+def test_cycle_counts_fresh_cameras_online_without_probing(settings) -> None:
+    liveness = PassiveLiveness(str(ARP_FIXTURE), max_age_seconds=300)
+    liveness.probed(["fresh"])
+    camera = _camera("fresh", "10.20.0.11")
+
+    async def scenario():
+        return await probe_cameras([camera], settings, await liveness.snapshot())
+
+    [(probed_camera, result)] = asyncio.run(scenario())
+    assert probed_camera is camera
+    assert result.online and result.passive
+    assert camera["last_status"] == "online"
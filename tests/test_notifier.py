@@ -0,0 +1,150 @@
+"""Notification delivery with a fake Bot (user-008)."""
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from telegram.error import Forbidden, NetworkError, RetryAfter
+
+from notifier import NotificationDispatcher
+
+
+class FakeBot:
+    """Records sends; ``errors`` maps a message text to exceptions raised on its first attempts."""
+
+    def __init__(self, errors: Dict[str, List[Exception]] | None = None) -> None:
+        self.errors = errors or {}
+        self.sent: List[Tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, reply_markup=None) -> None:
+        await asyncio.sleep(0)
+        if self.errors.get(text):
+            raise self.errors[text].pop(0)
+        self.sent.append((chat_id, text))
+
+
+async def _deliver(dispatcher: NotificationDispatcher, timeout: float = 10.0) -> None:
+    await dispatcher.start()
+    deadline = time.monotonic() + timeout
+    while dispatcher.backlog and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    await dispatcher.stop(drain_timeout=0)
+
+
+def test_delivers_every_chat_in_order() -> None:
+    bot = FakeBot()
+    dispatcher = NotificationDispatcher(bot, workers=3, rate_per_second=1000, chat_rate_per_second=1000)
+
+    async def scenario() -> None:
+        for index in range(5):
+            dispatcher.enqueue_many([1, 2, 3], f"m{index}")
+        await _deliver(dispatcher)
+
+    asyncio.run(scenario())
+    for chat_id in (1, 2, 3):
+        assert [text for chat, text in bot.sent if chat == chat_id] == [f"m{index}" for index in range(5)]
+    assert (dispatcher.sent, dispatcher.backlog) == (15, 0)
+
+
+def test_rate_limited_chat_does_not_hold_up_others() -> None:
+    bot = FakeBot()
+    # One worker: before per-chat scheduling the quiet chat waited behind the busy one.
+    dispatcher = NotificationDispatcher(bot, workers=1, rate_per_second=1000, chat_rate_per_second=10)
+
+    async def scenario() -> None:
+        for index in range(3):
+            dispatcher.enqueue(1, f"busy{index}")
+        dispatcher.enqueue(2, "quiet")
+        await _deliver(dispatcher)
+
+    asyncio.run(scenario())
+    assert bot.sent == [(1, "busy0"), (2, "quiet"), (1, "busy1"), (1, "busy2")]
+
+
+def test_retry_after_pauses_and_resends() -> None:
+    bot = FakeBot({"flood": [RetryAfter(1)]})
+    dispatcher = NotificationDispatcher(bot, rate_per_second=1000, chat_rate_per_second=1000)
+
+    async def scenario() -> float:
+        started = time.monotonic()
+        dispatcher.enqueue(1, "flood")
+        await _deliver(dispatcher)
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 1.0
+    assert bot.sent == [(1, "flood")]
+    assert (dispatcher.retried, dispatcher.sent, dispatcher.attempts) == (1, 1, 2)
+
+
+def test_transient_errors_are_retried_then_given_up() -> None:
+    bot = FakeBot({"flaky": [NetworkError("reset")], "broken": [NetworkError("reset")] * 2})
+    dispatcher = NotificationDispatcher(bot, rate_per_second=1000, chat_rate_per_second=1000, max_attempts=2)
+
+    async def scenario() -> None:
+        dispatcher.enqueue(1, "flaky")
+        dispatcher.enqueue(2, "broken")
+        await _deliver(dispatcher)
+
+    asyncio.run(scenario())
+    assert bot.sent == [(1, "flaky")]
+    assert (dispatcher.sent, dispatcher.failed, dispatcher.retried) == (1, 1, 2)
+
+
+def test_blocked_chat_is_dropped() -> None:
+    bot = FakeBot({"blocked": [Forbidden("bot was blocked by the user")]})
+    dispatcher = NotificationDispatcher(bot, rate_per_second=1000, chat_rate_per_second=1000)
+
+    async def scenario() -> None:
+        dispatcher.enqueue(1, "blocked")
+        await _deliver(dispatcher)
+
+    asyncio.run(scenario())
+    assert bot.sent == []
+    assert (dispatcher.failed, dispatcher.retried, dispatcher.backlog) == (1, 0, 0)
+
+
+def test_outbox_survives_restart(tmp_path: Path) -> None:
+    outbox = tmp_path / "outbox.json"
+
+    async def first_run() -> None:
+        dispatcher = NotificationDispatcher(FakeBot(), outbox_file=outbox, chat_rate_per_second=1)
+        dispatcher.enqueue(1, "first")
+        dispatcher.enqueue(1, "second")
+        await dispatcher.start()
+        await asyncio.sleep(0.1)
+        # The chat bucket holds "second" back for a second; stop before that.
+        await dispatcher.stop(drain_timeout=0)
+
+    asyncio.run(first_run())
+    assert [message["text"] for message in json.loads(outbox.read_text())] == ["second"]
+
+    bot = FakeBot()
+    dispatcher = NotificationDispatcher(bot, outbox_file=outbox)
+    asyncio.run(_deliver(dispatcher))
+    assert bot.sent == [(1, "second")]
+    assert json.loads(outbox.read_text()) == []
+
+
+def test_background_outbox_write_does_not_outlive_stop(tmp_path: Path) -> None:
+    """A slow snapshot written in the background used to land after the final write."""
+
+    outbox = tmp_path / "outbox.json"
+    dispatcher = NotificationDispatcher(FakeBot(), outbox_file=outbox)
+    write_outbox = dispatcher._write_outbox
+
+    def slow_write(messages=None) -> None:
+        if messages is not None:
+            time.sleep(0.3)
+        write_outbox(messages)
+
+    dispatcher._write_outbox = slow_write
+
+    async def scenario() -> None:
+        dispatcher.enqueue(1, "delivered")
+        dispatcher._flush_outbox()
+        await _deliver(dispatcher)
+        await asyncio.sleep(0.5)
+
+    asyncio.run(scenario())
+    assert json.loads(outbox.read_text()) == []
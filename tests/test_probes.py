@@ -0,0 +1,134 @@
+"""Probes against asyncio stand-in servers (user-003)."""
+import asyncio
+
+import pytest
+
+from monitor import probe_cameras
+from probes import HttpProbe, IcmpProbe, RtspProbe, TcpProbe, build_probe, probe_for_camera
+from tests.helpers import answer, closed_port, serve
+
+
+async def _silent(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    await asyncio.sleep(5)
+
+
+def _camera(camera_id: str, ip: str, probe: object) -> dict:
+    return {"id": camera_id, "name": camera_id, "ip": ip, "enabled": True, "last_status": "unknown", "probe": probe}
+
+
+def test_tcp_probe_connects() -> None:
+    async def scenario():
+        async with serve(_silent) as port:
+            return await TcpProbe(port=port).check("127.0.0.1", 1.0)
+
+    result = asyncio.run(scenario())
+    assert result.online
+    assert result.rtt_ms is not None
+
+
+def test_tcp_probe_refused() -> None:
+    result = asyncio.run(TcpProbe(port=closed_port()).check("127.0.0.1", 1.0))
+    assert not result.online
+    assert "failed" in result.error
+
+
+@pytest.mark.parametrize(
+    "status_line, expect_status, online",
+    [
+        (b"HTTP/1.1 200 OK", [], True),
+        # Cameras answer anonymous requests with 401, which still proves the service is up.
+        (b"HTTP/1.1 401 Unauthorized", [], True),
+        (b"HTTP/1.1 503 Service Unavailable", [], False),
+        (b"HTTP/1.1 401 Unauthorized", [200], False),
+    ],
+)
+def test_http_probe_status(status_line: bytes, expect_status: list, online: bool) -> None:
+    async def scenario():
+        async with serve(answer(status_line)) as port:
+            return await HttpProbe(port=port, expect_status=expect_status).check("127.0.0.1", 1.0)
+
+    result = asyncio.run(scenario())
+    assert result.online is online
+    if not online:
+        assert result.error.startswith("status ")
+
+
+def test_http_probe_without_answer() -> None:
+    async def scenario():
+        async with serve(_silent) as port:
+            return await HttpProbe(port=port).check("127.0.0.1", 0.2)
+
+    result = asyncio.run(scenario())
+    assert not result.online
+    assert result.error == "no response"
+
+
+def test_rtsp_probe_options() -> None:
+    requests = []
+
+    async def handler(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        requests.append(await reader.readuntil(b"\r\n\r\n"))
+        writer.write(b"RTSP/1.0 200 OK\r\nCSeq: 1\r\n\r\n")
+        await writer.drain()
+
+    async def scenario():
+        async with serve(handler) as port:
+            return await RtspProbe(port=port, path="/stream").check("127.0.0.1", 1.0)
+
+    result = asyncio.run(scenario())
+    assert result.online
+    assert requests[0].startswith(b"OPTIONS rtsp://127.0.0.1:")
+
+
+def test_rtsp_probe_rejects_other_protocols() -> None:
+    async def scenario():
+        async with serve(answer(b"HTTP/1.1 200 OK")) as port:
+            return await RtspProbe(port=port).check("127.0.0.1", 1.0)
+
+    result = asyncio.run(scenario())
+    assert not result.online
+    assert result.error.startswith("protocol error")
+
+
+def test_build_probe_options() -> None:
+    assert isinstance(build_probe(None), IcmpProbe)
+    assert build_probe("rtsp") == RtspProbe()
+    assert build_probe({"type": "tcp", "port": "8000"}) == TcpProbe(port=8000)
+    probe = build_probe({"type": "HTTP", "method": "get", "expect_status": 200})
+    assert probe == HttpProbe(method="GET", expect_status=[200])
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        "telnet",
+        42,
+        {"type": "tcp", "port": None},
+        {"type": "tcp", "port": [1]},
+        {"type": "tcp", "port": "eighty"},
+        {"type": "tcp", "port": 0},
+        {"type": "tcp", "port": 70000},
+        {"type": "http", "expect_status": [200, "ok"]},
+        {"type": "http", "expect_status": {"code": 200}},
+        {"type": "tcp", "timeout": 5},
+    ],
+)
+def test_build_probe_rejects_malformed_options(spec: object) -> None:
+    with pytest.raises(ValueError):
+        build_probe(spec)
+    assert isinstance(probe_for_camera(_camera("bad", "127.0.0.1", spec)), IcmpProbe)
+
+
+def test_malformed_probe_does_not_stop_the_cycle(settings) -> None:
+    """A camera with a broken probe used to abort probing of every other camera."""
+
+    async def scenario():
+        async with serve(_silent) as port:
+            cameras = [
+                _camera("broken", "127.0.0.1", {"type": "http", "port": None}),
+                _camera("healthy", "127.0.0.1", {"type": "tcp", "port": port}),
+            ]
+            return await probe_cameras(cameras, settings)
+
+    results = {camera["id"]: result for camera, result in asyncio.run(scenario())}
+    assert results["healthy"].online
@@ -0,0 +1,46 @@
+"""Uptime history rows, widening and trimming."""
+import asyncio
+
+from uptime import OFFLINE, ONLINE, UptimeHistory
+
+
+def _status(history: UptimeHistory, camera_id: str, status: str) -> None:
+    history._on_camera_changed(camera_id, {"id": camera_id, "last_status": status})
+
+
+def test_trim_keeps_the_retention_window(tmp_path) -> None:
+    history = UptimeHistory(tmp_path / "uptime.bin", slot_seconds=60, retention_days=1)
+    start = history._start
+    for slot in range(3000):
+        _status(history, "cam", "offline" if slot % 2 else "online")
+        history.tick(start + slot * 60)
+
+    day = history.chunk_slots
+    assert day <= history._slots <= 2 * day
+    assert history._start == start + (3000 - history._slots) * 60
+    codes = history._codes(0, 0, history._slots)
+    assert codes[-1] == OFFLINE
+    assert all(codes[index] != codes[index + 1] for index in range(len(codes) - 1))
+    assert history._map.size() == 64 + history._allocated * history.row_bytes
+    history.close()
+
+
+def test_widening_in_a_worker_thread_keeps_rows(tmp_path) -> None:
+    async def scenario():
+        history = UptimeHistory(tmp_path / "uptime.bin", slot_seconds=60)
+        start = history._start
+        _status(history, "first", "online")
+        history.tick(start)
+        for camera in range(200):
+            _status(history, f"cam{camera}", "offline")
+        while history._rewriting is not None:
+            await asyncio.sleep(0.01)
+        history.tick(start + 60)
+        return history, start
+
+    history, start = asyncio.run(scenario())
+    assert history._capacity == 256
+    assert history._codes(history._columns["first"], 0, 2) == bytes([ONLINE, ONLINE])
+    # Columns added during the rewrite are in every row written after it.
+    assert history._codes(history._columns["cam199"], 1, 2) == bytes([OFFLINE])
+    history.close()
@@ -0,0 +1,117 @@
+"""Recorded Telegram updates POSTed to the local webhook server (user-020)."""
+import asyncio
+import dataclasses
+import json
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Tuple
+
+import pytest
+
+from httpserver import HttpServer
+from webhook import TelegramWebhook
+from tests.helpers import http_post
+
+UPDATES = json.loads((Path(__file__).parent / "data" / "telegram_updates.json").read_text(encoding="utf-8"))
+SECRET = "s3cret-token"
+PATH = "/telegram/hook"
+
+
+class FakeApplication:
+    """Stands in for the PTB Application: records updates instead of running handlers."""
+
+    def __init__(self, slow_chats: Tuple[int, ...] = (), delay: float = 0.3) -> None:
+        self.slow_chats = slow_chats
+        self.delay = delay
+        self.webhooks: List[dict] = []
+        # (chat ID, update ID, finished at)
+        self.processed: List[Tuple[int, int, float]] = []
+        self.bot = SimpleNamespace(set_webhook=self._set_webhook)
+
+    async def _set_webhook(self, **kwargs) -> None:
+        self.webhooks.append(kwargs)
+
+    async def process_update(self, update) -> None:
+        chat_id = update.effective_chat.id
+        await asyncio.sleep(self.delay if chat_id in self.slow_chats else 0)
+        self.processed.append((chat_id, update.update_id, time.monotonic()))
+
+
+@pytest.fixture
+def webhook_settings(settings):
+    return dataclasses.replace(
+        settings,
+        webhook_url=f"https://bot.example.org{PATH}",
+        webhook_secret=SECRET,
+        update_workers=2,
+        webhook_drain_seconds=5.0,
+    )
+
+
+async def _run(application: FakeApplication, settings, requests) -> List[int]:
+    """Start the webhook on an ephemeral port, POST ``requests`` and stop; returns the statuses."""
+
+    server = HttpServer("127.0.0.1", 0)
+    webhook = TelegramWebhook(application, settings)
+    webhook.route(server)
+    await server.start()
+    await webhook.start()
+    statuses = []
+    for body, secret in requests:
+        status, _reply = await http_post(
+            server.bound_port, PATH, body, {"X-Telegram-Bot-Api-Secret-Token": secret}
+        )
+        statuses.append(status)
+    await webhook.stop()
+    status, _reply = await http_post(
+        server.bound_port, PATH, json.dumps(UPDATES[0]).encode(), {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    )
+    statuses.append(status)
+    await server.stop()
+    return statuses
+
+
+def test_recorded_updates_are_processed(webhook_settings) -> None:
+    application = FakeApplication()
+    requests = [(json.dumps(update).encode("utf-8"), SECRET) for update in UPDATES]
+    statuses = asyncio.run(_run(application, webhook_settings, requests))
+
+    # The last request came after stop(): Telegram is told to retry it later.
+    assert statuses == [200] * len(UPDATES) + [503]
+    assert sorted(update_id for _chat, update_id, _at in application.processed) == [
+        update["update_id"] for update in UPDATES
+    ]
+    assert application.webhooks[0]["url"] == webhook_settings.webhook_url
+    assert application.webhooks[0]["secret_token"] == SECRET
+
+
+def test_rejects_bad_requests(webhook_settings) -> None:
+    application = FakeApplication()
+    update = json.dumps(UPDATES[0]).encode("utf-8")
+    requests = [
+        (update, "wrong"),
+        (b"{not json", SECRET),
+        (b'{"message": {}}', SECRET),
+        (update, SECRET),
+        # Telegram redelivers an update it did not see acknowledged.
+        (update, SECRET),
+    ]
+    statuses = asyncio.run(_run(application, webhook_settings, requests))
+
+    assert statuses == [401, 400, 400, 200, 200, 503]
+    assert [update_id for _chat, update_id, _at in application.processed] == [UPDATES[0]["update_id"]]
+
+
+def test_slow_chat_keeps_order_without_holding_up_others(webhook_settings) -> None:
+    private_chat = UPDATES[0]["message"]["chat"]["id"]
+    group_chat = UPDATES[2]["message"]["chat"]["id"]
+    application = FakeApplication(slow_chats=(private_chat,))
+    requests = [(json.dumps(update).encode("utf-8"), SECRET) for update in UPDATES]
+    asyncio.run(_run(application, webhook_settings, requests))
+
+    private = [(update_id, at) for chat, update_id, at in application.processed if chat == private_chat]
+    group = [at for chat, _update_id, at in application.processed if chat == group_chat]
+    assert [update_id for update_id, _at in private] == [815200001, 815200002, 815200004]
+    # The group's update is done while the private chat is still on its first one.
+    assert group[0] < private[0][1]
@@ -0,0 +1,173 @@
+"""Headless probe agent for cameras on a remote site network.
+
+Started with ``python main.py agent``.  The agent needs neither a Telegram
+token nor a cameras file: it sends a heartbeat with its ``AGENT_SITES`` to
+``COORDINATOR_URL``, receives its shard of cameras (see :mod:`agents`),
+probes the shard every check interval with the same probes as the bot and
+posts the raw results back in batches.  A changed shard is probed right
+away.  If the coordinator is unreachable the agent keeps retrying; results
+that could not be delivered are dropped and the next cycle sends fresh ones.
+"""
+import asyncio
+import json
+import logging
+import ssl
+import time
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from config import Settings
+from monitor import probe_cameras
+from probes import probe_for_camera
+from storage import Camera
+
+logger = logging.getLogger(__name__)
+
+RESULT_BATCH_SIZE = 1000
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+
+class CoordinatorError(Exception):
+    """Raised when the coordinator rejects a request."""
+
+
+async def post_json(url: str, token: str, payload: dict, timeout: float = REQUEST_TIMEOUT_SECONDS) -> dict:
+    """POST ``payload`` as JSON with a bearer token and return the decoded JSON reply."""
+
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    host = parts.hostname or "localhost"
+    port = parts.port or (443 if secure else 80)
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"POST {parts.path or '/'} HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        f"Authorization: Bearer {token}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+
+    async def exchange() -> bytes:
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl.create_default_context() if secure else None)
+        try:
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+            return await reader.read()
+        finally:
+            writer.close()
+
+    raw = await asyncio.wait_for(exchange(), timeout)
+    status_line, _, rest = raw.partition(b"\r\n")
+    _headers, _, reply = rest.partition(b"\r\n\r\n")
+    try:
+        status = int(status_line.split(b" ", 2)[1])
+    except (IndexError, ValueError) as exc:
+        raise CoordinatorError(f"malformed response: {status_line[:80]!r}") from exc
+    if status != 200:
+        raise CoordinatorError(f"HTTP {status}: {reply[:200].decode('utf-8', 'replace')}")
+    return json.loads(reply)
+
+
+class ProbeAgent:
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.url = settings.coordinator_url.rstrip("/")
+        self.cameras: List[Camera] = []
+        self.version: str | None = None
+        self.interval = float(settings.check_interval_seconds)
+        self.heartbeat_seconds = float(settings.agent_heartbeat_seconds)
+        self.cycles = 0
+        # Statuses found by this agent; results that contradict them are confirmed before they are sent.
+        self._statuses: Dict[str, str] = {}
+        self._shard_changed = asyncio.Event()
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        payload = {"agent": self.settings.agent_id, **payload}
+        return await post_json(self.url + path, self.settings.agent_token, payload)
+
+    async def heartbeat(self) -> None:
+        payload = {"sites": list(self.settings.agent_sites), "version": self.version}
+        reply = await self._post("/agent/heartbeat", payload)
+        self.interval = float(reply.get("interval") or self.interval)
+        self.heartbeat_seconds = float(reply.get("heartbeat") or self.heartbeat_seconds)
+        if "cameras" in reply:
+            self.cameras = [camera for camera in reply["cameras"] if isinstance(camera, dict)]
+            self.version = str(reply.get("version"))
+            # Statuses this agent found itself are at least as recent as those in the shard.
+            statuses = {str(camera.get("id")): camera.get("last_status") for camera in self.cameras}
+            self._statuses = {
+                camera_id: self._statuses.get(camera_id, status)
+                for camera_id, status in statuses.items()
+                if camera_id in self._statuses or status
+            }
+            logger.info("Received shard %s with %d cameras", self.version, len(self.cameras))
+            self._shard_changed.set()
+
+    async def probe_shard(self) -> int:
+        """Probe the current shard once and post the results; returns how many were sent."""
+
+        # Probing updates status fields in place; keep the shard itself pristine.
+        cameras = [dict(camera) for camera in self.cameras]
+        for camera in cameras:
+            camera["last_status"] = self._statuses.get(str(camera.get("id")))
+        results = await probe_cameras(cameras, self.settings)
+        self._statuses.update((str(camera.get("id")), str(camera.get("last_status"))) for camera, _result in results)
+        items = [
+            {
+                "id": camera.get("id"),
+                "probe": probe_for_camera(camera).kind,
+                "online": result.online,
+                "rtt_ms": result.rtt_ms,
+                "loss": result.loss,
+                "error": result.error,
+            }
+            for camera, result in results
+        ]
+        stale = False
+        for start in range(0, len(items), RESULT_BATCH_SIZE):
+            reply = await self._post("/agent/results", {"results": items[start : start + RESULT_BATCH_SIZE]})
+            stale = stale or reply.get("version") != self.version
+        self.cycles += 1
+        logger.info("Probed %d of %d cameras", len(items), len(cameras))
+        if stale:
+            # The shard changed meanwhile; fetch it now instead of at the next heartbeat.
+            await self.heartbeat()
+        return len(items)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            try:
+                await self.heartbeat()
+            except (OSError, asyncio.TimeoutError, CoordinatorError, ValueError) as exc:
+                logger.warning("Heartbeat to %s failed: %s", self.url, exc)
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    async def _probe_loop(self) -> None:
+        while True:
+            if not self.cameras:
+                await self._shard_changed.wait()
+            self._shard_changed.clear()
+            started = time.monotonic()
+            try:
+                await self.probe_shard()
+            except (OSError, asyncio.TimeoutError, CoordinatorError, ValueError) as exc:
+                logger.warning("Could not deliver results to %s: %s", self.url, exc)
+            remaining = self.interval - (time.monotonic() - started)
+            try:
+                await asyncio.wait_for(self._shard_changed.wait(), max(0.0, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> None:
+        logger.info(
+            "Probe agent %s for sites %s reporting to %s",
+            self.settings.agent_id,
+            ", ".join(self.settings.agent_sites),
+            self.url,
+        )
+        await asyncio.gather(self._heartbeat_loop(), self._probe_loop())
+
+
+async def run_agent(settings: Settings) -> None:
+    await ProbeAgent(settings).run()
@@ -0,0 +1,356 @@
+"""Coordinator side of distributed probing with probe agents.
+
+Cameras can carry a ``site`` tag.  Probe agents (``python main.py agent``)
+run inside the site networks, announce the sites they can reach with a
+heartbeat and get back their shard of the cameras tagged with those sites.
+They probe the shard locally and post the raw results, which are applied
+exactly like the results of a local check cycle.
+
+The cameras of a site served by several agents are split between them by
+rendezvous hashing, so an agent joining or leaving only moves its own share.
+An agent that misses heartbeats for ``agent_timeout_seconds`` is dropped and
+its cameras go to the other agents of the site, or back to local probing
+when there are none.  Cameras without a site are always probed locally.
+
+Protocol (JSON over HTTP, ``Authorization: Bearer <AGENT_TOKEN>``):
+
+* ``POST /agent/heartbeat`` with ``{"agent", "sites", "version"}`` returns
+  the current shard ``version``, the probe ``interval`` and ``heartbeat``
+  period, and ``cameras`` (``id``, ``ip``, ``probe`` and ``last_status``)
+  whenever the agent's version is out of date;
+* ``POST /agent/results`` with ``{"agent", "results": [{"id", "probe",
+  "online", "rtt_ms", "loss", "error"}]}`` returns how many results were
+  accepted; results for cameras no longer assigned to the agent are ignored.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from config import Settings
+from flapping import FlapDetector
+from httpserver import HttpServer, Request, Response
+from latency import LatencyHistory
+from metrics import AGENT_CAMERAS, AGENT_RESULTS, PROBE_AGENTS
+from monitor import apply_probe_results, observe_probe
+from notifier import NotificationDispatcher
+from probes import ProbeResult
+from registry import CameraRegistry
+from storage import Camera
+from subscriptions import Subscriptions
+from topology import Topology
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AgentState:
+    agent_id: str
+    sites: frozenset
+    peer: str = ""
+    last_seen: float = 0.0
+    version: int = 0
+    results: int = 0
+
+
+def _weight(agent_id: str, camera_id: str) -> int:
+    digest = hashlib.blake2b(f"{agent_id}/{camera_id}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _optional_float(value: object) -> float | None:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _json_response(payload: dict, status: int = 200) -> Response:
+    return Response(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+
+class AgentPool:
+    def __init__(
+        self,
+        settings: Settings,
+        registry: CameraRegistry,
+        dispatcher: NotificationDispatcher | None = None,
+        history: LatencyHistory | None = None,
+        topology: Topology | None = None,
+        subscriptions: Subscriptions | None = None,
+        flaps: FlapDetector | None = None,
+    ) -> None:
+        self.settings = settings
+        self.registry = registry
+        self.dispatcher = dispatcher
+        self.history = history
+        self.topology = topology
+        self.subscriptions = subscriptions
+        self.flaps = flaps
+        self._agents: Dict[str, AgentState] = {}
+        self._agents_by_site: Dict[str, List[str]] = {}
+        # Site, IP and probe of every enabled camera with a site: a change of
+        # any of them has to reach the agent.
+        self._specs: Dict[str, tuple] = {}
+        self._site_members: Dict[str, set[str]] = {}
+        self._owner: Dict[str, str] = {}
+        self._shards: Dict[str, set[str]] = {}
+        # Versions from a previous coordinator process never match.
+        self._epoch = uuid.uuid4().hex[:8]
+
+        for camera in registry.all():
+            self._on_camera_changed(str(camera.get("id")), camera)
+        registry.add_listener(self._on_camera_changed)
+
+    # Assignment ----------------------------------------------------------
+
+    @property
+    def agents(self) -> List[AgentState]:
+        return list(self._agents.values())
+
+    @property
+    def remote_cameras(self) -> int:
+        return len(self._owner)
+
+    def owns(self, camera: Camera) -> bool:
+        """Whether ``camera`` is currently probed by an agent instead of locally."""
+
+        return str(camera.get("id")) in self._owner
+
+    def owner(self, camera_id: str) -> str | None:
+        return self._owner.get(camera_id)
+
+    @staticmethod
+    def _spec(camera: Camera | None) -> tuple | None:
+        if camera is None or not camera.get("enabled", True) or not camera.get("site"):
+            return None
+        return str(camera.get("site")), str(camera.get("ip")), camera.get("probe")
+
+    def _on_camera_changed(self, camera_id: str, camera: Camera | None) -> None:
+        spec = self._spec(camera)
+        old = self._specs.get(camera_id)
+        if old == spec:
+            return  # status updates do not change the assignment
+        if old is not None:
+            self._site_members[old[0]].discard(camera_id)
+        if spec is None:
+            self._specs.pop(camera_id, None)
+        else:
+            self._specs[camera_id] = spec
+            self._site_members.setdefault(spec[0], set()).add(camera_id)
+        self._bump(self._assign(camera_id, force=True))
+
+    def _assign(self, camera_id: str, force: bool = False) -> set[str]:
+        """Recompute the owner of one camera and return the agents whose shard changed."""
+
+        spec = self._specs.get(camera_id)
+        candidates = self._agents_by_site.get(spec[0], ()) if spec is not None else ()
+        new_owner = max(candidates, key=lambda agent_id: _weight(agent_id, camera_id)) if candidates else None
+        old_owner = self._owner.get(camera_id)
+        if old_owner == new_owner and not force:
+            return set()
+
+        if old_owner is not None:
+            self._shards[old_owner].discard(camera_id)
+        if new_owner is None:
+            self._owner.pop(camera_id, None)
+        else:
+            self._owner[camera_id] = new_owner
+            self._shards[new_owner].add(camera_id)
+        return {agent_id for agent_id in (old_owner, new_owner) if agent_id is not None}
+
+    def _rebalance(self, sites: Iterable[str]) -> None:
+        changed: set[str] = set()
+        for site in sites:
+            for camera_id in self._site_members.get(site, ()):
+                changed |= self._assign(camera_id)
+        self._bump(changed)
+
+    def _bump(self, agent_ids: Iterable[str]) -> None:
+        for agent_id in agent_ids:
+            state = self._agents.get(agent_id)
+            if state is not None:
+                state.version += 1
+
+    def _index_sites(self) -> None:
+        by_site: Dict[str, List[str]] = {}
+        for state in self._agents.values():
+            for site in state.sites:
+                by_site.setdefault(site, []).append(state.agent_id)
+        self._agents_by_site = by_site
+
+    def heartbeat(self, agent_id: str, sites: Iterable[str], peer: str = "") -> AgentState:
+        sites = frozenset(sites)
+        state = self._agents.get(agent_id)
+        if state is None:
+            state = self._agents[agent_id] = AgentState(agent_id, sites, peer, version=1)
+            self._shards[agent_id] = set()
+            self._index_sites()
+            self._rebalance(sites)
+            logger.info(
+                "Probe agent %s (%s) joined for sites %s with %d cameras",
+                agent_id,
+                peer,
+                ", ".join(sorted(sites)),
+                len(self._shards[agent_id]),
+            )
+        elif state.sites != sites:
+            previous = state.sites
+            state.sites = sites
+            self._index_sites()
+            self._rebalance(previous | sites)
+            logger.info("Probe agent %s now serves sites %s", agent_id, ", ".join(sorted(sites)))
+        state.peer = peer
+        state.last_seen = time.monotonic()
+        return state
+
+    def remove(self, agent_id: str) -> None:
+        state = self._agents.pop(agent_id, None)
+        if state is None:
+            return
+        self._index_sites()
+        self._rebalance(state.sites)
+        del self._shards[agent_id]
+
+    def reap(self, now: float | None = None) -> List[str]:
+        """Drop agents that missed their heartbeats; their cameras are reassigned."""
+
+        now = time.monotonic() if now is None else now
+        expired = [
+            state.agent_id
+            for state in self._agents.values()
+            if now - state.last_seen > self.settings.agent_timeout_seconds
+        ]
+        for agent_id in expired:
+            cameras = len(self._shards.get(agent_id, ()))
+            self.remove(agent_id)
+            logger.warning("Probe agent %s stopped sending heartbeats, reassigned %d cameras", agent_id, cameras)
+        return expired
+
+    def shard(self, agent_id: str) -> List[dict]:
+        cameras = []
+        for camera_id in sorted(self._shards.get(agent_id, ())):
+            camera = self.registry.get(camera_id)
+            if camera is not None:
+                cameras.append(
+                    {
+                        "id": camera_id,
+                        "ip": camera.get("ip"),
+                        "probe": camera.get("probe"),
+                        # The agent confirms results that contradict it, from the very first probe on.
+                        "last_status": camera.get("last_status"),
+                    }
+                )
+        return cameras
+
+    def _version(self, state: AgentState) -> str:
+        return f"{self._epoch}:{state.version}"
+
+    def accept_results(self, agent_id: str, items: Iterable[dict]) -> Tuple[int, int]:
+        """Apply results posted by ``agent_id``; returns the accepted and ignored counts."""
+
+        results: List[Tuple[Camera, ProbeResult]] = []
+        ignored = 0
+        for item in items:
+            camera_id = str(item.get("id"))
+            camera = self.registry.get(camera_id)
+            if camera is None or self._owner.get(camera_id) != agent_id:
+                ignored += 1
+                continue
+            result = ProbeResult(
+                online=bool(item.get("online")),
+                rtt_ms=_optional_float(item.get("rtt_ms")),
+                loss=_optional_float(item.get("loss")),
+                error=str(item["error"]) if item.get("error") else None,
+            )
+            observe_probe(str(item.get("probe") or "icmp"), result)
+            results.append((camera, result))
+
+        if results:
+            apply_probe_results(
+                self.settings,
+                self.registry,
+                self.dispatcher,
+                results,
+                self.history,
+                self.topology,
+                self.subscriptions,
+                self.flaps,
+            )
+        state = self._agents.get(agent_id)
+        if state is not None:
+            state.results += len(results)
+        AGENT_RESULTS.inc(agent_id, "accepted", amount=len(results))
+        if ignored:
+            AGENT_RESULTS.inc(agent_id, "ignored", amount=ignored)
+        return len(results), ignored
+
+    # HTTP ----------------------------------------------------------------
+
+    def _authorized(self, request: Request) -> bool:
+        expected = f"Bearer {self.settings.agent_token}".encode("utf-8")
+        supplied = request.headers.get("authorization", "").encode("utf-8")
+        return bool(self.settings.agent_token) and hmac.compare_digest(supplied, expected)
+
+    def _parse(self, request: Request) -> Tuple[dict | None, Response | None]:
+        if not self._authorized(request):
+            logger.warning("Rejected probe agent request from %s: bad token", request.peer)
+            return None, _json_response({"error": "unauthorized"}, 401)
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return None, _json_response({"error": "invalid JSON"}, 400)
+        if not isinstance(payload, dict) or not str(payload.get("agent") or ""):
+            return None, _json_response({"error": "agent is required"}, 400)
+        return payload, None
+
+    async def handle_heartbeat(self, request: Request) -> Response:
+        payload, error = self._parse(request)
+        if error is not None:
+            return error
+        sites = payload.get("sites")
+        if not isinstance(sites, list) or not all(isinstance(site, str) for site in sites):
+            return _json_response({"error": "sites must be a list of strings"}, 400)
+
+        state = self.heartbeat(str(payload["agent"]), sites, request.peer)
+        reply: dict = {
+            "version": self._version(state),
+            "interval": self.settings.check_interval_seconds,
+            "heartbeat": self.settings.agent_heartbeat_seconds,
+        }
+        if payload.get("version") != reply["version"]:
+            reply["cameras"] = self.shard(state.agent_id)
+        return _json_response(reply)
+
+    async def handle_results(self, request: Request) -> Response:
+        payload, error = self._parse(request)
+        if error is not None:
+            return error
+        agent_id = str(payload["agent"])
+        state = self._agents.get(agent_id)
+        if state is None:
+            return _json_response({"error": "unknown agent, send a heartbeat first"}, 409)
+        items = payload.get("results")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return _json_response({"error": "results must be a list of objects"}, 400)
+
+        state.last_seen = time.monotonic()
+        accepted, ignored = self.accept_results(agent_id, items)
+        return _json_response({"accepted": accepted, "ignored": ignored, "version": self._version(state)})
+
+    def route(self, server: HttpServer) -> None:
+        server.route("POST", "/agent/heartbeat", self.handle_heartbeat)
+        server.route("POST", "/agent/results", self.handle_results)
+
+    def register_metrics(self) -> None:
+        PROBE_AGENTS.set_function(lambda: len(self._agents))
+        AGENT_CAMERAS.set_function(lambda: {(agent_id,): len(shard) for agent_id, shard in self._shards.items()})
+
+    async def run(self) -> None:
+        """Drop silent agents until cancelled."""
+
+        while True:
+            await asyncio.sleep(self.settings.agent_heartbeat_seconds)
+            self.reap()
@@ -0,0 +1,338 @@
+"""Synthetic-fleet benchmark for the monitoring pipeline.
+
+Generates a cameras file with N cameras, replaces the network probes with a
+fake backend (log-normal latency, per-probe failures and a fraction of
+cameras that are down for the whole run) and Telegram with a fake bot that
+only records calls, then drives the real code end to end:
+
+* writing and reading the cameras file;
+* loading the registry through the selected storage backend;
+* full ``check_cameras`` cycles, including notification fan-out;
+* delivering the queued notifications through the dispatcher;
+* flushing the registry;
+* the ``/all``, ``/online``, ``/offline`` and ``/stats`` handlers.
+
+Every fleet size runs in its own process so peak RSS is per size.  Results
+are printed as JSON (or written to ``--output``) for comparing runs::
+
+    python bench.py --cameras 1000 10000 50000 --backend journal --output before.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+import bot
+import monitor
+from config import STORAGE_BACKENDS, Settings
+from coordinator import CheckCoordinator
+from latency import LatencyHistory
+from notifier import NotificationDispatcher
+from probes import Probe, ProbeResult
+from registry import CameraRegistry
+from status_index import StatusIndex
+from storage import Camera, open_store, read_cameras, write_cameras, write_subscribers
+
+
+def generate_cameras(count: int, rng: random.Random) -> List[Camera]:
+    return [
+        {
+            "id": f"bench-{index:06d}",
+            "name": f"Камера {index}",
+            "ip": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+            "enabled": rng.random() > 0.01,
+            "last_status": "online",
+            "previous_status": "online",
+            "last_check_at": None,
+            "last_status_change_at": None,
+        }
+        for index in range(count)
+    ]
+
+
+class FakeProbe(Probe):
+    """Probe with log-normal latency and configurable failures; never touches the network."""
+
+    kind = "fake"
+
+    def __init__(self, median_ms: float, sigma: float, failure_rate: float, down: set, seed: int) -> None:
+        self.mu = math.log(max(median_ms, 0.001) / 1000)
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.down = down
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    async def check(self, ip: str, timeout_seconds: float, attempts: int = 1) -> ProbeResult:
+        self.calls += 1
+        latency = self.rng.lognormvariate(self.mu, self.sigma) if self.sigma else math.exp(self.mu)
+        await asyncio.sleep(min(latency, timeout_seconds))
+        if latency >= timeout_seconds:
+            return ProbeResult(online=False, error="timeout", loss=1.0)
+        if ip in self.down or self.rng.random() < self.failure_rate:
+            return ProbeResult(online=False, error="no echo reply", loss=1.0)
+        return ProbeResult(online=True, rtt_ms=latency * 1000, loss=0.0)
+
+
+class FakeBot:
+    """Stands in for ``telegram.Bot``: records ``send_message`` calls."""
+
+    def __init__(self, latency_seconds: float = 0.0) -> None:
+        self.latency_seconds = latency_seconds
+        self.calls: List[tuple] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: object) -> None:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        self.calls.append((chat_id, len(text)))
+
+
+class FakeMessage:
+    def __init__(self) -> None:
+        self.replies = 0
+        self.characters = 0
+
+    async def reply_text(self, text: str, **kwargs: object) -> None:
+        self.replies += 1
+        self.characters += len(text)
+
+
+class LoopLagMonitor:
+    """Measures how long the event loop was blocked beyond a short periodic sleep."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+
+    def __enter__(self) -> "LoopLagMonitor":
+        self.max_lag = self.total_lag = 0.0
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    def report(self) -> Dict[str, float]:
+        return {
+            "loop_blocked_max_ms": round(self.max_lag * 1000, 3),
+            "loop_blocked_total_ms": round(self.total_lag * 1000, 3),
+        }
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+async def _timed(phases: Dict[str, dict], name: str, coroutine, **rates: int) -> object:
+    with LoopLagMonitor() as lag:
+        started = time.perf_counter()
+        result = await coroutine
+        elapsed = time.perf_counter() - started
+    phase = {"wall_seconds": round(elapsed, 4), **lag.report()}
+    for key, amount in rates.items():
+        phase[key] = amount
+        phase[f"{key}_per_second"] = round(amount / elapsed, 1) if elapsed else None
+    phases[name] = phase
+    return result
+
+
+async def _wait_for_delivery(dispatcher: NotificationDispatcher, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while dispatcher.backlog and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def run_benchmark(args: argparse.Namespace, count: int) -> dict:
+    rng = random.Random(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="watchdogcam-bench-"))
+    settings = Settings(
+        token="bench",
+        cameras_file=workdir / "cameras.json",
+        subscribers_file=workdir / "subscribers.json",
+        probe_concurrency=args.concurrency,
+        check_deadline_seconds=0,
+        probe_timeout_seconds=args.timeout,
+        storage_backend=args.backend,
+        database_file=workdir / "watchdogcam.db",
+        storage_flush_delay_seconds=3600,
+        outbox_file=workdir / "outbox.json",
+        notify_rate_per_second=args.notify_rate,
+        notify_chat_rate_per_second=args.notify_rate,
+        digest_threshold=args.digest_threshold,
+        confirm_results=args.confirm_results,
+        confirm_backoff_seconds=args.confirm_backoff,
+    )
+    phases: Dict[str, dict] = {}
+
+    cameras = generate_cameras(count, rng)
+    await _timed(phases, "storage.write_cameras", asyncio.to_thread(write_cameras, settings.cameras_file, cameras))
+    await _timed(phases, "storage.read_cameras", asyncio.to_thread(read_cameras, settings.cameras_file))
+    write_subscribers(settings.subscribers_file, list(range(1, args.subscribers + 1)))
+
+    down = {str(camera["ip"]) for camera in rng.sample(cameras, int(count * args.down_fraction))}
+    probe = FakeProbe(args.latency_ms, args.latency_sigma, args.failure_rate, down, args.seed)
+    monitor.probe_for_camera = lambda camera: probe
+
+    store = open_store(settings)
+
+    async def load() -> CameraRegistry:
+        return CameraRegistry.load(store, flush_delay=settings.storage_flush_delay_seconds)
+
+    registry = await _timed(phases, "registry.load", load())
+    fake_bot = FakeBot(args.send_latency_ms / 1000)
+    dispatcher = NotificationDispatcher(
+        fake_bot,
+        outbox_file=None,
+        workers=settings.notify_workers,
+        rate_per_second=settings.notify_rate_per_second,
+        chat_rate_per_second=settings.notify_chat_rate_per_second,
+    )
+    await dispatcher.start()
+    history = LatencyHistory(settings.latency_samples, registry)
+    index = StatusIndex(registry)
+
+    enabled = len(registry.enabled())
+    for cycle in range(1, args.cycles + 1):
+        await _timed(
+            phases,
+            f"check_cameras.{cycle}",
+            monitor.check_cameras(settings, registry, dispatcher, history=history),
+            probes=enabled,
+        )
+        queued = dispatcher.backlog
+        await _timed(
+            phases, f"notifications.{cycle}", _wait_for_delivery(dispatcher, args.delivery_timeout), messages=queued
+        )
+
+    await _timed(phases, "registry.flush", registry.flush())
+    await dispatcher.stop(drain_timeout=0)
+
+    context = SimpleNamespace(
+        bot_data={
+            "settings": settings,
+            "registry": registry,
+            "status_index": index,
+            "latency": history,
+            "coordinator": CheckCoordinator(settings, registry, dispatcher, history),
+        },
+        user_data={},
+        args=[],
+    )
+    handlers = {"all": bot.list_all, "online": bot.list_online, "offline": bot.list_offline, "stats": bot.stats}
+    for name, handler in handlers.items():
+        for attempt in ("cold", "warm"):
+            message = FakeMessage()
+            await _timed(phases, f"handler.{name}.{attempt}", handler(SimpleNamespace(message=message), context))
+            phases[f"handler.{name}.{attempt}"]["reply_characters"] = message.characters
+
+    store.close()
+    return {
+        "cameras": count,
+        "enabled": enabled,
+        "backend": args.backend,
+        "probes": probe.calls,
+        "messages_sent": len(fake_bot.calls),
+        "peak_rss_mb": _peak_rss_mb(),
+        "phases": phases,
+    }
+
+
+def _parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1000, 10000, 50000], help="fleet sizes to run")
+    parser.add_argument("--backend", choices=STORAGE_BACKENDS, default="json")
+    parser.add_argument("--cycles", type=int, default=2, help="full check cycles per fleet size")
+    parser.add_argument("--concurrency", type=int, default=256, help="PROBE_CONCURRENCY")
+    parser.add_argument("--timeout", type=float, default=2.0, help="probe timeout in seconds")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="median fake probe latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal sigma of probe latency")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="chance of a single probe failing")
+    parser.add_argument("--down-fraction", type=float, default=0.02, help="cameras down for the whole run")
+    parser.add_argument("--confirm-results", type=int, default=3, help="CONFIRM_RESULTS")
+    parser.add_argument(
+        "--confirm-backoff", type=float, default=0.0, help="CONFIRM_BACKOFF_SECONDS (default: 0, no idle waits)"
+    )
+    parser.add_argument("--subscribers", type=int, default=5)
+    parser.add_argument("--digest-threshold", type=int, default=5)
+    parser.add_argument("--notify-rate", type=float, default=1e6, help="notification rate limits (default: none)")
+    parser.add_argument("--send-latency-ms", type=float, default=0.0, help="fake Telegram send latency")
+    parser.add_argument("--delivery-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write JSON results here instead of stdout")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _strip_option(argv: List[str], option: str) -> List[str]:
+    """Drop ``option`` and its values from an argument list."""
+
+    result: List[str] = []
+    skipping = False
+    for arg in argv:
+        if arg == option or arg.startswith(option + "="):
+            skipping = arg == option
+            continue
+        if skipping and not arg.startswith("--"):
+            continue
+        skipping = False
+        result.append(arg)
+    return result
+
+
+def main(argv: List[str] | None = None) -> None:
+    args = _parse_args(argv)
+    if args.single:
+        print(json.dumps(asyncio.run(run_benchmark(args, args.cameras[0]))))
+        return
+
+    child_args = _strip_option(_strip_option(list(argv if argv is not None else sys.argv[1:]), "--cameras"), "--output")
+    runs = []
+    for count in args.cameras:
+        output = subprocess.run(
+            [sys.executable, __file__, "--single", "--cameras", str(count), *child_args],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+        print(f"{count} cameras done", file=sys.stderr)
+
+    result = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "single", "cameras")},
+        "runs": runs,
+    }
+    text = json.dumps(result, indent=2, ensure_ascii=False, default=str)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
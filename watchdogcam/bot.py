@@ -1,34 +1,54 @@
 import asyncio
 import logging
+import tempfile
 import uuid
-from typing import List
+from datetime import datetime
+from typing import Dict, List, Tuple
 
-from telegram import ReplyKeyboardMarkup, Update
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, Update
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     ApplicationBuilder,
+    CallbackQueryHandler,
     CommandHandler,
     ConversationHandler,
     MessageHandler,
     ContextTypes,
-    Job,
     filters,
 )
 
+from agents import AgentPool
+from bulk import EXPORT_FORMATS, ImportFormatError, ImportReport, add_imported, read_import, write_export
 from config import Settings
-from monitor import check_cameras
-from storage import (
-    Camera,
-    find_camera,
-    read_cameras,
-    read_subscribers,
-    write_cameras,
-    write_subscribers,
-)
+import metrics
+from coordinator import CheckCoordinator, CheckResult
+from discovery import Discovery, parse_network
+from flapping import FlapDetector
+from httpserver import HttpServer
+from latency import PERCENTILES, LatencyHistory
+from monitor import split_message
+from neighbors import PassiveLiveness
+from notifier import NotificationDispatcher, inline_keyboard
+from probes import probe_for_camera
+from profiling import CycleProfiler
+from registry import CameraRegistry
+from scheduler import AdaptiveScheduler
+from status_index import VIEWS, StatusIndex, status_text
+from storage import Camera, open_store
+from subscriptions import MUTE_ALL, Subscriptions, camera_tags, normalize_tag, parse_duration, parse_tags
+from topology import Topology
+from uptime import WINDOWS as UPTIME_WINDOWS, UptimeHistory
+from webhook import TelegramWebhook
 
 logger = logging.getLogger(__name__)
 
-ADD_NAME, ADD_IP, DELETE_TARGET, EDIT_TARGET, EDIT_FIELD, EDIT_VALUE = range(6)
+ADD_NAME, ADD_IP, DELETE_TARGET, EDIT_TARGET, EDIT_FIELD, EDIT_VALUE, IMPORT_FILE = range(7)
+# Bot API limit for files downloaded by bots.
+MAX_IMPORT_BYTES = 20 * 1024 * 1024
+# Uploads and exports larger than this are buffered on disk instead of in memory.
+SPOOL_BYTES = 4 * 1024 * 1024
+DEFAULT_MUTE_SECONDS = 3600
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -37,107 +57,367 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     text = (
         "Привет, я бот мониторинга камер.\n"
-        "Я каждые 5 минут проверяю доступность камер и присылаю уведомления, если что-то меняется.\n\n"
+        f"Я проверяю каждую камеру раз в {_format_duration(settings.check_interval_seconds)}, "
+        f"стабильно работающие — всё реже, до раза в {_format_duration(settings.max_check_interval_seconds)}, "
+        f"а недоступные и только что изменившиеся — раз в {_format_duration(settings.recheck_fast_seconds)}. "
+        "Если что-то меняется, присылаю уведомление.\n\n"
         "Команды:\n"
         "• /all – все камеры и их статус\n"
         "• /online – только рабочие камеры\n"
+        "• /degraded – камеры с большими задержками или потерями\n"
         "• /offline – только нерабочие камеры\n"
         "• /stats – статистика\n"
+        "• /camera <IP или ID> – подробности о камере\n"
+        "• /uptime [IP или ID] – доступность за 24 часа, 7 и 30 дней\n"
         "• /refresh – обновить статусы камер\n"
         "• /add – добавить камеру\n"
         "• /edit – изменить камеру\n"
-        "• /delete – удалить камеру"
+        "• /delete – удалить камеру\n"
+        "• /import – добавить камеры из файла CSV или JSON\n"
+        "• /export – выгрузить камеры в файл\n"
+        "• /discover <сеть> – найти в сети устройства, которых нет в списке\n"
+        "• /subscribe [теги] – получать уведомления только о камерах с этими тегами или площадками\n"
+        "• /unsubscribe [теги] – отписаться от тегов или от всех уведомлений\n"
+        "• /mute [IP, ID, тег или all] [30m, 2h, 1d] – временно не присылать уведомления\n"
+        "• /unmute [IP, ID, тег или all] – снова присылать уведомления"
     )
+    if chat_id in settings.admin_chat_ids:
+        text += "\n• /profile [now] – профиль следующего цикла проверки (для администраторов)"
     if chat_id is not None:
-        subscribers = read_subscribers(settings.subscribers_file)
-        if chat_id not in subscribers:
-            subscribers.append(chat_id)
-            write_subscribers(settings.subscribers_file, subscribers)
+        subscriptions: Subscriptions = context.bot_data["subscriptions"]
+        if not subscriptions.is_subscribed(chat_id):
+            subscriptions.subscribe(chat_id)
             text += "\n\nВы подписаны на уведомления об изменении статуса камер."
 
     await update.message.reply_text(text)
 
 
-def _format_camera_line(camera: Camera) -> str:
-    status = camera.get("last_status", "unknown")
-    if status == "online":
-        status_text = "работает"
-    elif status == "offline":
-        status_text = "не работает"
+def _subscription_text(subscriptions: Subscriptions, chat_id: int) -> str:
+    if not subscriptions.is_subscribed(chat_id):
+        return "Вы не подписаны на уведомления. Подписаться: /subscribe"
+    tags = subscriptions.tags(chat_id)
+    lines = ["Уведомления: " + ("камеры с тегами " + ", ".join(tags) if tags else "все камеры")]
+    for target, until in sorted(subscriptions.mutes(chat_id).items()):
+        title = "все камеры" if target == MUTE_ALL else target
+        lines.append(f"• без уведомлений: {title} до {datetime.fromtimestamp(until):%d.%m %H:%M}")
+    return "\n".join(lines)
+
+
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    subscriptions: Subscriptions = context.bot_data["subscriptions"]
+    chat_id = update.effective_chat.id
+    subscriptions.subscribe(chat_id, context.args)
+    await update.message.reply_text(_subscription_text(subscriptions, chat_id))
+
+
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    subscriptions: Subscriptions = context.bot_data["subscriptions"]
+    chat_id = update.effective_chat.id
+    unknown = subscriptions.unsubscribe(chat_id, context.args)
+    text = _subscription_text(subscriptions, chat_id)
+    if unknown:
+        text = f"Этих тегов нет в вашей подписке: {', '.join(unknown)}.\n\n" + text
+    await update.message.reply_text(text)
+
+
+def _mute_target(registry: CameraRegistry, text: str) -> Tuple[str, str]:
+    """Mute key and its description for a camera IP or ID, a tag or ``all``."""
+
+    camera = registry.find(text)
+    if camera is not None:
+        return str(camera.get("id")), f"камера {camera.get('name')} ({camera.get('ip')})"
+    tag = normalize_tag(text)
+    return tag, "все камеры" if tag == MUTE_ALL else f"камеры с тегом {tag}"
+
+
+async def mute(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    registry: CameraRegistry = context.bot_data["registry"]
+    subscriptions: Subscriptions = context.bot_data["subscriptions"]
+    args = list(context.args)
+    seconds = DEFAULT_MUTE_SECONDS
+    if args:
+        try:
+            seconds = parse_duration(args[-1])
+            args.pop()
+        except ValueError as exc:
+            if len(args) > 1:
+                await update.message.reply_text(f"Неверная длительность: {exc}.")
+                return
+    target, title = _mute_target(registry, args[0] if args else MUTE_ALL)
+    until = subscriptions.mute(update.effective_chat.id, target, seconds)
+    await update.message.reply_text(
+        f"🔕 Без уведомлений до {datetime.fromtimestamp(until):%d.%m %H:%M}: {title}. Вернуть: /unmute"
+    )
+
+
+async def unmute(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    registry: CameraRegistry = context.bot_data["registry"]
+    subscriptions: Subscriptions = context.bot_data["subscriptions"]
+    chat_id = update.effective_chat.id
+    target = _mute_target(registry, context.args[0])[0] if context.args else None
+    if not subscriptions.unmute(chat_id, target):
+        await update.message.reply_text("Таких отключённых уведомлений нет.")
+        return
+    await update.message.reply_text("🔔 Уведомления снова включены.\n" + _subscription_text(subscriptions, chat_id))
+
+
+def _page_keyboard(view: str, page: int, pages: int) -> InlineKeyboardMarkup | None:
+    if pages <= 1:
+        return None
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("⬅️", callback_data=f"page:{view}:{page - 1}"))
+    buttons.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=f"page:{view}:{page}"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton("➡️", callback_data=f"page:{view}:{page + 1}"))
+    return InlineKeyboardMarkup([buttons])
+
+
+def _render_view(index: StatusIndex, view: str, page: int = 0) -> Tuple[str, InlineKeyboardMarkup | None]:
+    if view == "all":
+        header = [
+            "📋 Все камеры",
+            f"Всего: {index.total}",
+            f"Работают: {index.count('online')}",
+            f"С задержками: {index.count('degraded')}",
+            f"Не работают: {index.count('offline')}",
+            "",
+        ]
+    elif view == "online":
+        if not index.size(view):
+            return "Нет камер в статусе 'online'.", None
+        header = [f"✅ Рабочие камеры ({index.size(view)}):"]
+    elif view == "degraded":
+        if not index.size(view):
+            return "Нет камер с большими задержками или потерями.", None
+        header = [f"📶 Камеры с задержками или потерями ({index.size(view)}):"]
     else:
-        status_text = "неизвестно"
-    return f"{camera.get('name')} – {camera.get('ip')} – {status_text}"
+        if not index.size(view):
+            return "✅ Все камеры в сети. Неработающих нет.", None
+        header = [f"⚠️ Неработающие камеры ({index.size(view)}):"]
 
+    body, page, pages = index.page(view, page)
+    text = "\n".join(header) + "\n" + body
+    if pages > 1:
+        text += f"\n\nСтраница {page + 1} из {pages}"
+    return text, _page_keyboard(view, page, pages)
 
-def _filter_cameras(cameras: List[Camera], status: str) -> List[Camera]:
-    return [cam for cam in cameras if cam.get("last_status") == status and cam.get("enabled", True)]
 
+async def _reply_view(update: Update, context: ContextTypes.DEFAULT_TYPE, view: str) -> None:
+    index: StatusIndex = context.bot_data["status_index"]
+    text, keyboard = _render_view(index, view)
+    await update.message.reply_text(text, reply_markup=keyboard)
 
-async def list_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.bot_data["settings"]
-    cameras = read_cameras(settings.cameras_file)
-    enabled_cameras = [c for c in cameras if c.get("enabled", True)]
-    online = _filter_cameras(enabled_cameras, "online")
-    offline = _filter_cameras(enabled_cameras, "offline")
 
-    lines = [
-        "📋 Все камеры",
-        f"Всего: {len(enabled_cameras)}",
-        f"Работают: {len(online)}",
-        f"Не работают: {len(offline)}",
-        "",
-    ]
-    lines.extend(_format_camera_line(cam) for cam in enabled_cameras)
-    await update.message.reply_text("\n".join(lines))
+async def list_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await _reply_view(update, context, "all")
 
 
 async def list_online(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.bot_data["settings"]
-    cameras = read_cameras(settings.cameras_file)
-    online = _filter_cameras(cameras, "online")
+    await _reply_view(update, context, "online")
 
-    if not online:
-        await update.message.reply_text("Нет камер в статусе 'online'.")
-        return
 
-    lines = [f"✅ Рабочие камеры ({len(online)}):"]
-    lines.extend(f"• {cam.get('name')} – {cam.get('ip')}" for cam in online)
-    await update.message.reply_text("\n".join(lines))
+async def list_degraded(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await _reply_view(update, context, "degraded")
 
 
 async def list_offline(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.bot_data["settings"]
-    cameras = read_cameras(settings.cameras_file)
-    offline = _filter_cameras(cameras, "offline")
+    await _reply_view(update, context, "offline")
+
 
-    if not offline:
-        await update.message.reply_text("✅ Все камеры в сети. Неработающих нет.")
+async def turn_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    try:
+        _, view, page = query.data.split(":")
+        page_number = int(page)
+    except ValueError:
+        return
+    if view not in VIEWS:
         return
 
-    lines = [f"⚠️ Неработающие камеры ({len(offline)}):"]
-    lines.extend(f"• {cam.get('name')} – {cam.get('ip')}" for cam in offline)
-    await update.message.reply_text("\n".join(lines))
+    index: StatusIndex = context.bot_data["status_index"]
+    text, keyboard = _render_view(index, view, page_number)
+    try:
+        await query.edit_message_text(text, reply_markup=keyboard)
+    except BadRequest as exc:
+        # Pressing the current page button leaves the message unchanged.
+        if "not modified" not in str(exc).lower():
+            raise
+
+
+def _format_ms(value: float) -> str:
+    return f"{value:.1f}" if value < 10 else f"{value:.0f}"
+
+
+def _format_percentiles(values: Dict[int, float]) -> str:
+    return " / ".join(_format_ms(values[percent]) for percent in PERCENTILES) + " мс"
 
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.bot_data["settings"]
-    cameras = read_cameras(settings.cameras_file)
-    enabled_cameras = [c for c in cameras if c.get("enabled", True)]
-    online = _filter_cameras(enabled_cameras, "online")
-    offline = _filter_cameras(enabled_cameras, "offline")
-    total = len(enabled_cameras)
-    percent = round(len(online) / total * 100, 1) if total else 0
+    index: StatusIndex = context.bot_data["status_index"]
+    history: LatencyHistory = context.bot_data["latency"]
+    total = index.total
+    online = index.count("online")
+    degraded = index.count("degraded")
+    percent = round((online + degraded) / total * 100, 1) if total else 0
 
     text = (
         "📊 Статистика\n"
         f"Всего камер: {total}\n"
-        f"Работают: {len(online)}\n"
-        f"Не работают: {len(offline)}\n"
-        f"Работает: {percent}%"
+        f"Работают: {online}\n"
+        f"С задержками: {degraded}\n"
+        f"Не работают: {index.count('offline')}\n"
+        f"Недоступны из-за вышестоящего узла: {index.count('unreachable')}\n"
+        f"В сети: {percent}%"
+    )
+    fleet = history.fleet_percentiles()
+    if fleet:
+        text += f"\nЗадержка p50 / p95 / p99: {_format_percentiles(fleet)}"
+    coordinator: CheckCoordinator = context.bot_data["coordinator"]
+    text += (
+        "\n\nЦиклы проверки: выполнено "
+        f"{coordinator.executed}, объединено {coordinator.coalesced}, из кэша {coordinator.cached}"
     )
+    agents: AgentPool | None = context.bot_data.get("agents")
+    if agents is not None:
+        text += f"\nАгенты проверки: {len(agents.agents)}, камер на агентах: {agents.remote_cameras}"
     await update.message.reply_text(text)
 
 
+async def camera_details(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    registry: CameraRegistry = context.bot_data["registry"]
+    history: LatencyHistory = context.bot_data["latency"]
+
+    if not context.args:
+        await update.message.reply_text("Укажите IP или ID камеры: /camera <IP или ID>")
+        return
+    camera = registry.find(context.args[0])
+    if not camera:
+        await update.message.reply_text("Камера не найдена.")
+        return
+
+    camera_id = str(camera.get("id"))
+    lines = [
+        f"📷 {camera.get('name')}",
+        f"IP: {camera.get('ip')}",
+        f"ID: {camera_id}",
+        f"Статус: {status_text(camera)}",
+        f"Проверка: {probe_for_camera(camera).kind}",
+        f"Последняя проверка: {camera.get('last_check_at') or '—'}",
+        f"Статус изменился: {camera.get('last_status_change_at') or '—'}",
+    ]
+    flaps: FlapDetector = context.bot_data["flaps"]
+    if flaps.is_flapping(camera_id):
+        lines.append(
+            f"🔁 Статус постоянно меняется ({flaps.changes(camera_id)} раз за последнее время), "
+            "уведомления приостановлены"
+        )
+    tags = sorted(camera_tags(camera))
+    if tags:
+        lines.append(f"Теги: {', '.join(tags)}")
+    parent = context.bot_data["topology"].parent(camera_id)
+    if parent is not None:
+        lines.append(f"Вышестоящий узел: {parent.get('name')} ({parent.get('ip')}) – {status_text(parent)}")
+    rtt, loss = history.last(camera_id)
+    if loss is not None:
+        lines.append("")
+        lines.append(f"Последний RTT: {_format_ms(rtt) + ' мс' if rtt is not None else '—'}, потери: {loss:.0f}%")
+        rtts, losses = history.samples(camera_id)
+        lines.append(f"Последние проверки ({len(losses)}):")
+        if rtts:
+            lines.append(f"• RTT p50 / p95 / p99: {_format_percentiles(history.camera_percentiles(camera_id))}")
+        lines.append(f"• средние потери: {sum(losses) / len(losses):.0f}%")
+    await update.message.reply_text("\n".join(lines))
+
+
+UPTIME_WINDOW_TITLES = {"24h": "24 часа", "7d": "7 дней", "30d": "30 дней"}
+MAX_LISTED_OUTAGES = 10
+
+
+def _format_duration(seconds: float) -> str:
+    minutes = max(1, round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} ч {minutes} мин" if minutes else f"{hours} ч"
+
+
+def _format_outage(start: float, end: float) -> str:
+    began = datetime.fromtimestamp(start)
+    ended = datetime.fromtimestamp(end)
+    ended_text = ended.strftime("%H:%M") if ended.date() == began.date() else ended.strftime("%Y-%m-%d %H:%M")
+    return f"• {began:%Y-%m-%d %H:%M} – {ended_text} ({_format_duration(end - start)})"
+
+
+def _camera_uptime_text(history: UptimeHistory, camera: Camera) -> str:
+    camera_id = str(camera.get("id"))
+    reports = {window: history.report(camera_id, seconds) for window, seconds in UPTIME_WINDOWS.items()}
+    lines = [f"📈 Доступность камеры {camera.get('name')} ({camera.get('ip')})"]
+    for window, report in reports.items():
+        if report.uptime_percent is None:
+            lines.append(f"• {UPTIME_WINDOW_TITLES[window]}: нет данных")
+            continue
+        line = f"• {UPTIME_WINDOW_TITLES[window]}: {report.uptime_percent:.2f}%"
+        if report.coverage < 0.99:
+            line += f" (есть данные за {report.coverage * 100:.0f}% периода)"
+        lines.append(line)
+
+    outages = reports["7d"].outages
+    if outages:
+        lines.append("")
+        lines.append(f"Отключения за 7 дней ({len(outages)}):")
+        if len(outages) > MAX_LISTED_OUTAGES:
+            lines.append(f"последние {MAX_LISTED_OUTAGES}:")
+        lines.extend(_format_outage(start, end) for start, end in outages[-MAX_LISTED_OUTAGES:])
+    elif reports["7d"].uptime_percent is not None:
+        lines.append("")
+        lines.append("Отключений за 7 дней не было.")
+    return "\n".join(lines)
+
+
+def _fleet_uptime_text(history: UptimeHistory, cameras: List[Camera]) -> str:
+    camera_ids = [str(camera.get("id")) for camera in cameras]
+    lines = ["📈 Доступность камер (в среднем по камерам)"]
+    weekly: Dict[str, float] = {}
+    for window, seconds in UPTIME_WINDOWS.items():
+        uptimes = history.fleet_uptime(camera_ids, seconds)
+        if window == "7d":
+            weekly = uptimes
+        average = f"{sum(uptimes.values()) / len(uptimes):.2f}%" if uptimes else "нет данных"
+        lines.append(f"• {UPTIME_WINDOW_TITLES[window]}: {average}")
+
+    worst = sorted((percent, camera_id) for camera_id, percent in weekly.items() if percent < 100)[:5]
+    if worst:
+        by_id = {str(camera.get("id")): camera for camera in cameras}
+        lines.append("")
+        lines.append("Хуже всего за 7 дней:")
+        lines.extend(
+            f"• {by_id[camera_id].get('name')} – {by_id[camera_id].get('ip')} – {percent:.2f}%"
+            for percent, camera_id in worst
+        )
+    lines.append("")
+    lines.append("Подробнее о камере: /uptime <IP или ID>")
+    return "\n".join(lines)
+
+
+async def uptime_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    registry: CameraRegistry = context.bot_data["registry"]
+    history: UptimeHistory = context.bot_data["uptime"]
+
+    if context.args:
+        camera = registry.find(context.args[0])
+        if not camera:
+            await update.message.reply_text("Камера не найдена.")
+            return
+        text = await asyncio.to_thread(_camera_uptime_text, history, camera)
+    else:
+        text = await asyncio.to_thread(_fleet_uptime_text, history, registry.enabled())
+
+    for chunk in split_message(text):
+        await update.message.reply_text(chunk)
+
+
 async def add_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.message.reply_text("Введите название камеры:")
     return ADD_NAME
@@ -150,11 +430,15 @@ async def add_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 
 async def add_ip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    settings: Settings = context.bot_data["settings"]
+    registry: CameraRegistry = context.bot_data["registry"]
     ip = update.message.text.strip()
     name = context.user_data.pop("new_camera_name", "Камера")
 
-    cameras = read_cameras(settings.cameras_file)
+    existing = registry.find(ip)
+    if existing:
+        await update.message.reply_text(f"Камера с IP {ip} уже есть: {existing.get('name')}.")
+        return ConversationHandler.END
+
     new_camera = {
         "id": str(uuid.uuid4()),
         "name": name,
@@ -165,8 +449,7 @@ async def add_ip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         "last_check_at": None,
         "last_status_change_at": None,
     }
-    cameras.append(new_camera)
-    write_cameras(settings.cameras_file, cameras)
+    registry.add(new_camera)
 
     await update.message.reply_text(
         "Камера добавлена:\n" f"Название: {name}\n" f"IP: {ip}"
@@ -180,17 +463,15 @@ async def delete_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
 
 async def delete_target(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    settings: Settings = context.bot_data["settings"]
+    registry: CameraRegistry = context.bot_data["registry"]
     target = update.message.text.strip()
-    cameras = read_cameras(settings.cameras_file)
-    camera = find_camera(cameras, target)
+    camera = registry.find(target)
 
     if not camera:
         await update.message.reply_text("Камера не найдена. Попробуйте снова или отмените.")
         return ConversationHandler.END
 
-    cameras = [c for c in cameras if c is not camera]
-    write_cameras(settings.cameras_file, cameras)
+    registry.remove(str(camera.get("id")))
     await update.message.reply_text(f"Камера {camera.get('name')} удалена.")
     return ConversationHandler.END
 
@@ -201,17 +482,16 @@ async def edit_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 
 async def edit_target(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    settings: Settings = context.bot_data["settings"]
+    registry: CameraRegistry = context.bot_data["registry"]
     target = update.message.text.strip()
-    cameras = read_cameras(settings.cameras_file)
-    camera = find_camera(cameras, target)
+    camera = registry.find(target)
 
     if not camera:
         await update.message.reply_text("Камера не найдена. Попробуйте снова или отмените.")
         return ConversationHandler.END
 
     context.user_data["edit_camera_id"] = camera.get("id")
-    keyboard = ReplyKeyboardMarkup([["Название", "IP"]], one_time_keyboard=True, resize_keyboard=True)
+    keyboard = ReplyKeyboardMarkup([["Название", "IP", "Теги"]], one_time_keyboard=True, resize_keyboard=True)
     await update.message.reply_text(
         f"Редактируем {camera.get('name')} ({camera.get('ip')}). Что изменить?",
         reply_markup=keyboard,
@@ -221,17 +501,21 @@ async def edit_target(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
 async def edit_field(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     choice = update.message.text.strip().lower()
-    if choice not in {"название", "ip"}:
-        await update.message.reply_text("Пожалуйста, выберите 'Название' или 'IP'.")
+    fields = {"название": "name", "ip": "ip", "теги": "tags"}
+    if choice not in fields:
+        await update.message.reply_text("Пожалуйста, выберите 'Название', 'IP' или 'Теги'.")
         return EDIT_FIELD
 
-    context.user_data["edit_field"] = "name" if choice == "название" else "ip"
-    await update.message.reply_text("Введите новое значение:")
+    context.user_data["edit_field"] = fields[choice]
+    if choice == "теги":
+        await update.message.reply_text("Введите теги через запятую (или «-», чтобы убрать все):")
+    else:
+        await update.message.reply_text("Введите новое значение:")
     return EDIT_VALUE
 
 
 async def edit_value(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    settings: Settings = context.bot_data["settings"]
+    registry: CameraRegistry = context.bot_data["registry"]
     new_value = update.message.text.strip()
     field = context.user_data.get("edit_field")
     camera_id = context.user_data.get("edit_camera_id")
@@ -240,14 +524,20 @@ async def edit_value(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("Не удалось получить данные для редактирования.")
         return ConversationHandler.END
 
-    cameras = read_cameras(settings.cameras_file)
-    camera = find_camera(cameras, camera_id)
+    if field == "ip":
+        existing = registry.find(new_value)
+        if existing and existing.get("id") != camera_id:
+            await update.message.reply_text(f"Камера с IP {new_value} уже есть: {existing.get('name')}.")
+            return ConversationHandler.END
+
+    value: object = new_value
+    if field == "tags":
+        value = [] if new_value == "-" else parse_tags(new_value)
+    camera = registry.update(camera_id, **{field: value})
     if not camera:
         await update.message.reply_text("Камера не найдена.")
         return ConversationHandler.END
 
-    camera[field] = new_value
-    write_cameras(settings.cameras_file, cameras)
     await update.message.reply_text("Изменения сохранены.")
     return ConversationHandler.END
 
@@ -257,68 +547,304 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ConversationHandler.END
 
 
-async def manual_check(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.bot_data["settings"]
-    bot = context.bot
-    notifications = await check_cameras(settings, bot)
-    message = "Проверка завершена."
-    if notifications:
-        message += "\n" + "\n".join(notifications)
-    await update.message.reply_text(message)
+async def import_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    context.user_data["import_check"] = "check" in [arg.lower() for arg in context.args or []]
+    await update.message.reply_text(
+        "Отправьте файл CSV или JSON с камерами.\n"
+        "CSV: первая строка — названия колонок, обязательна колонка ip; "
+        "необязательные: name, id, enabled, site, parent, probe.\n"
+        "JSON: массив объектов с теми же полями (как в файле камер).\n"
+        "Для отмены — /cancel."
+    )
+    return IMPORT_FILE
 
 
-async def refresh_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+def _import_report_text(report: ImportReport, checked: bool) -> str:
+    lines = [
+        f"📥 Импорт завершён: строк {report.rows}",
+        f"Добавлено камер: {len(report.cameras)}",
+        f"Пропущено дубликатов: {report.duplicates}",
+        f"Строк с ошибками: {report.invalid}",
+    ]
+    if checked and report.cameras:
+        statuses = [status_text(camera) for camera in report.cameras]
+        lines.append("")
+        lines.append("Первая проверка:")
+        lines.extend(f"• {status}: {statuses.count(status)}" for status in sorted(set(statuses)))
+    if report.errors:
+        lines.append("")
+        lines.append("Проблемы (номер строки или записи):")
+        lines.extend(f"• {row}: {message}" for row, message in report.errors)
+        hidden = report.invalid + report.duplicates - len(report.errors)
+        if hidden > 0:
+            lines.append(f"…и ещё {hidden}")
+    return "\n".join(lines)
+
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    registry: CameraRegistry = context.bot_data["registry"]
+    message = update.message
+    document = message.document
+    caption_args = (message.caption or "").split()[1:]
+    check = context.user_data.pop("import_check", False) or "check" in [arg.lower() for arg in caption_args]
+
+    if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+        await message.reply_text("Файл слишком большой: Telegram позволяет боту скачивать файлы до 20 МБ.")
+        return ConversationHandler.END
+
+    existing_ids = {str(camera.get("id")) for camera in registry.all()}
+    existing_ips = {str(camera.get("ip")) for camera in registry.all()}
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as buffer:
+        telegram_file = await document.get_file()
+        await telegram_file.download_to_memory(out=buffer)
+        buffer.seek(0)
+        try:
+            report = await asyncio.to_thread(read_import, buffer, document.file_name or "", existing_ids, existing_ips)
+        except ImportFormatError as exc:
+            await message.reply_text(f"Не удалось прочитать файл: {exc}. Камеры не добавлены.")
+            return ConversationHandler.END
+
+    added = add_imported(registry, report)
+    await registry.flush()
+    if check and added:
+        await message.reply_text(f"Проверяю новые камеры: {len(added)}…")
+        scheduler: AdaptiveScheduler = context.bot_data["scheduler"]
+        await scheduler.check_now(added)
+    for chunk in split_message(_import_report_text(report, check)):
+        await message.reply_text(chunk)
+    return ConversationHandler.END
+
+
+async def export_cameras(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    registry: CameraRegistry = context.bot_data["registry"]
+    export_format = (context.args[0].lower() if context.args else "csv").lstrip(".")
+    if export_format not in EXPORT_FORMATS:
+        await update.message.reply_text(f"Формат должен быть одним из: {', '.join(EXPORT_FORMATS)}.")
+        return
+
+    cameras = [dict(camera) for camera in registry.all()]
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as buffer:
+        await asyncio.to_thread(write_export, cameras, export_format, buffer)
+        buffer.seek(0)
+        await update.message.reply_document(
+            document=buffer,
+            filename=f"cameras-{datetime.now():%Y%m%d-%H%M}.{export_format}",
+            caption=f"Камер: {len(cameras)}",
+        )
+
+
+async def discover(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     settings: Settings = context.bot_data["settings"]
-    bot = context.bot
+    discovery: Discovery = context.bot_data["discovery"]
+    if not context.args:
+        text = "Укажите сеть, например: /discover 192.168.1.0/24"
+        if settings.discovery_networks:
+            text += "\nПо расписанию проверяются: " + ", ".join(settings.discovery_networks)
+        await update.message.reply_text(text)
+        return
+    try:
+        network = parse_network(context.args[0], settings.discovery_max_hosts)
+    except ValueError as exc:
+        await update.message.reply_text(f"Неверная сеть: {exc}.")
+        return
 
-    await check_cameras(settings, bot)
-    cameras = read_cameras(settings.cameras_file)
-    enabled_cameras = [c for c in cameras if c.get("enabled", True)]
-    online = _filter_cameras(enabled_cameras, "online")
-    offline = _filter_cameras(enabled_cameras, "offline")
+    await update.message.reply_text(f"Ищу устройства в сети {network}…")
+    report = await discovery.discover(network)
+    text, buttons = discovery.message(report)
+    await update.message.reply_text(text, reply_markup=inline_keyboard(buttons))
 
-    lines = [
-        "🔄 Актуальные статусы камер",
-        f"Проверено: {len(enabled_cameras)}",
-        f"Работают: {len(online)}",
-        f"Не работают: {len(offline)}",
-    ]
 
-    if offline:
-        lines.append("")
-        lines.append("⚠️ Неработающие камеры:")
-        lines.extend(f"• {cam.get('name')} – {cam.get('ip')}" for cam in offline)
+async def enroll_discovered(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    discovery: Discovery = context.bot_data["discovery"]
+    try:
+        _, sweep_id, target = query.data.split(":", 2)
+    except ValueError:
+        await query.answer()
+        return
+    report = discovery.report(sweep_id)
+    if report is None:
+        await query.answer("Результаты поиска устарели, повторите /discover.", show_alert=True)
+        return
 
-    if online:
-        lines.append("")
-        lines.append("✅ Работают:")
-        lines.extend(f"• {cam.get('name')} – {cam.get('ip')}" for cam in online)
+    added = discovery.enroll(discovery.offered(report, target))
+    await query.answer(f"Добавлено камер: {len(added)}" if added else "Уже в списке камер.")
+    try:
+        await query.edit_message_reply_markup(reply_markup=inline_keyboard(discovery.buttons(report)))
+    except BadRequest as exc:
+        if "not modified" not in str(exc).lower():
+            raise
+
+
+def _check_source_note(result: CheckResult) -> str:
+    if result.source == "cached":
+        return f"Показан результат проверки {round(result.age_seconds)} с назад."
+    if result.source == "coalesced":
+        return "Проверка уже выполнялась, показан её результат."
+    return ""
+
+
+async def manual_check(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    coordinator: CheckCoordinator = context.bot_data["coordinator"]
+    result = await coordinator.run()
+    message = "Проверка завершена."
+    note = _check_source_note(result)
+    if note:
+        message += " " + note
+    if result.notifications:
+        message += "\n" + "\n".join(result.notifications)
+    for chunk in split_message(message):
+        await update.message.reply_text(chunk)
 
-    await update.message.reply_text("\n".join(lines))
 
+async def profile_cycle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    settings: Settings = context.bot_data["settings"]
+    profiler: CycleProfiler = context.bot_data["profiler"]
+    if update.effective_chat is None or update.effective_chat.id not in settings.admin_chat_ids:
+        await update.message.reply_text("Команда доступна только администраторам (ADMIN_CHAT_IDS).")
+        return
 
-async def scheduled_check(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job = context.job
-    if not job:
-        logger.warning("Scheduled check called without job context")
+    now = bool(context.args) and context.args[0].lower() in ("now", "сейчас")
+    report = profiler.arm()
+    if now:
+        await update.message.reply_text("Запускаю полный цикл проверки под профилировщиком…")
+        coordinator: CheckCoordinator = context.bot_data["coordinator"]
+        # A cycle already running is not profiled; the armed profiler then takes the next one.
+        context.application.create_task(coordinator.run(max_age=0), update=update)
+    else:
+        await update.message.reply_text(
+            "Следующий цикл проверки пройдёт под профилировщиком, отчёт придёт файлом. "
+            "/profile now запустит полный цикл сразу."
+        )
+    timeout = settings.check_interval_seconds + settings.check_deadline_seconds
+    try:
+        text = await asyncio.wait_for(report, timeout)
+    except asyncio.TimeoutError:
+        await update.message.reply_text("Цикл проверки так и не начался, профилирование отменено.")
         return
 
-    settings: Settings = job.data["settings"]
-    bot = context.application.bot
-    await check_cameras(settings, bot)
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as buffer:
+        buffer.write(text.encode("utf-8"))
+        buffer.seek(0)
+        await update.message.reply_document(
+            document=buffer,
+            filename=f"profile-{datetime.now():%Y%m%d-%H%M%S}.txt",
+            caption=text.split("\n", 1)[0],
+        )
+
+
+async def refresh_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    index: StatusIndex = context.bot_data["status_index"]
+    coordinator: CheckCoordinator = context.bot_data["coordinator"]
+
+    result = await coordinator.run()
+    lines = [
+        "🔄 Актуальные статусы камер",
+        f"Проверено: {index.total}",
+        f"Работают: {index.count('online')}",
+        f"С задержками: {index.count('degraded')}",
+        f"Не работают: {index.count('offline')}",
+    ]
+    note = _check_source_note(result)
+    if note:
+        lines.append(note)
+
+    keyboard = None
+    if index.size("offline"):
+        # Only the first page is inlined; the keyboard pages through /offline.
+        body, page, pages = index.page("offline", 0)
+        lines.extend(["", "⚠️ Неработающие камеры:", body])
+        if pages > 1:
+            lines.append(f"Страница 1 из {pages}")
+        keyboard = _page_keyboard("offline", page, pages)
+
+    if index.size("online"):
+        lines.extend(["", "✅ Список работающих камер: /online"])
+
+    await update.message.reply_text("\n".join(lines), reply_markup=keyboard)
+
+
+def _register_metrics(application: Application) -> None:
+    index: StatusIndex = application.bot_data["status_index"]
+    dispatcher: NotificationDispatcher = application.bot_data["dispatcher"]
+    metrics.CAMERAS.set_function(lambda: {(status,): count for status, count in index.counts().items()})
+    metrics.NOTIFICATION_ATTEMPTS.set_function(lambda: dispatcher.attempts)
+    metrics.NOTIFICATIONS_SENT.set_function(lambda: dispatcher.sent)
+    metrics.NOTIFICATION_FAILURES.set_function(lambda: dispatcher.failed)
+    metrics.NOTIFICATION_RETRIES.set_function(lambda: dispatcher.retried)
+    metrics.NOTIFICATION_BACKLOG.set_function(lambda: dispatcher.backlog)
+    agents: AgentPool | None = application.bot_data["agents"]
+    if agents is not None:
+        agents.register_metrics()
 
 
 def build_application(settings: Settings) -> Application:
-    application = ApplicationBuilder().token(settings.token).build()
+    builder = ApplicationBuilder().token(settings.token)
+    if settings.webhook_url:
+        # Updates arrive through the webhook; there is nothing to poll.
+        builder = builder.updater(None)
+    application = builder.build()
     application.bot_data["settings"] = settings
+    registry = CameraRegistry.load(open_store(settings), flush_delay=settings.storage_flush_delay_seconds)
+    application.bot_data["registry"] = registry
+    dispatcher = NotificationDispatcher(
+        application.bot,
+        outbox_file=settings.outbox_file,
+        workers=settings.notify_workers,
+        rate_per_second=settings.notify_rate_per_second,
+        chat_rate_per_second=settings.notify_chat_rate_per_second,
+    )
+    application.bot_data["dispatcher"] = dispatcher
+    history = LatencyHistory(settings.latency_samples, registry)
+    application.bot_data["latency"] = history
+    topology = Topology(registry)
+    application.bot_data["topology"] = topology
+    subscriptions = Subscriptions(registry.store, settings.subscriptions_file)
+    application.bot_data["subscriptions"] = subscriptions
+    flaps = FlapDetector(settings.flap_window_seconds, settings.flap_threshold)
+    application.bot_data["flaps"] = flaps
+    profiler = CycleProfiler()
+    application.bot_data["profiler"] = profiler
+    agents = (
+        AgentPool(settings, registry, dispatcher, history, topology, subscriptions, flaps)
+        if settings.agent_port
+        else None
+    )
+    application.bot_data["agents"] = agents
+    neighbors = (
+        PassiveLiveness(settings.neighbor_table, settings.passive_max_age_seconds) if settings.neighbor_table else None
+    )
+    application.bot_data["coordinator"] = CheckCoordinator(
+        settings, registry, dispatcher, history, agents, topology, subscriptions, neighbors, flaps, profiler
+    )
+    application.bot_data["status_index"] = StatusIndex(registry)
+    application.bot_data["discovery"] = Discovery(settings, registry, dispatcher, subscriptions)
+    application.bot_data["uptime"] = UptimeHistory(
+        settings.uptime_file,
+        slot_seconds=settings.uptime_slot_seconds,
+        retention_days=settings.uptime_retention_days,
+        registry=registry,
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("all", list_all))
     application.add_handler(CommandHandler("online", list_online))
+    application.add_handler(CommandHandler("degraded", list_degraded))
     application.add_handler(CommandHandler("offline", list_offline))
     application.add_handler(CommandHandler("stats", stats))
+    application.add_handler(CommandHandler("camera", camera_details))
+    application.add_handler(CommandHandler("uptime", uptime_report))
     application.add_handler(CommandHandler("refresh", refresh_info))
     application.add_handler(CommandHandler("check", manual_check))
+    # Non-blocking: the handler waits for the next cycle, other updates must not.
+    application.add_handler(CommandHandler("profile", profile_cycle, block=False))
+    application.add_handler(CommandHandler("discover", discover))
+    application.add_handler(CommandHandler("subscribe", subscribe))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
+    application.add_handler(CommandHandler("mute", mute))
+    application.add_handler(CommandHandler("unmute", unmute))
+    application.add_handler(CallbackQueryHandler(turn_page, pattern=r"^page:"))
+    application.add_handler(CallbackQueryHandler(enroll_discovered, pattern=r"^discover:"))
 
     add_handler = ConversationHandler(
         entry_points=[CommandHandler("add", add_start)],
@@ -350,13 +876,21 @@ def build_application(settings: Settings) -> Application:
     )
     application.add_handler(edit_handler)
 
-    application.job_queue.run_repeating(
-        scheduled_check,
-        interval=settings.check_interval_seconds,
-        first=5,
-        name="camera-monitor",
-        data={"settings": settings},
+    import_handler = ConversationHandler(
+        entry_points=[
+            CommandHandler("import", import_start),
+            MessageHandler(filters.Document.ALL & filters.CaptionRegex(r"^/import\b"), import_document),
+        ],
+        states={
+            IMPORT_FILE: [MessageHandler(filters.Document.ALL, import_document)],
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
     )
+    application.add_handler(import_handler)
+    application.add_handler(CommandHandler("export", export_cameras))
+
+    application.bot_data["scheduler"] = AdaptiveScheduler(application.bot_data["coordinator"])
+    _register_metrics(application)
 
     return application
 
@@ -365,11 +899,59 @@ async def run_bot(settings: Settings) -> None:
     application = build_application(settings)
     await application.initialize()
     await application.start()
+    dispatcher: NotificationDispatcher = application.bot_data["dispatcher"]
+    await dispatcher.start()
+    scheduler: AdaptiveScheduler = application.bot_data["scheduler"]
+    uptime: UptimeHistory = application.bot_data["uptime"]
+    discovery: Discovery = application.bot_data["discovery"]
+    background = [
+        asyncio.create_task(scheduler.run()),
+        asyncio.create_task(uptime.run()),
+        asyncio.create_task(discovery.run()),
+    ]
+    # Endpoints configured with the same host and port share one server.
+    http_servers: Dict[Tuple[str, int], HttpServer] = {}
+
+    def http_server(host: str, port: int) -> HttpServer:
+        if (host, port) not in http_servers:
+            http_servers[(host, port)] = HttpServer(host, port)
+        return http_servers[(host, port)]
+
+    if settings.metrics_port:
+        http_server(settings.metrics_host, settings.metrics_port).route("GET", "/metrics", metrics.handle_metrics)
+        background.append(asyncio.create_task(metrics.monitor_event_loop_lag()))
+    agents: AgentPool | None = application.bot_data["agents"]
+    if agents is not None:
+        agents.route(http_server(settings.agent_host, settings.agent_port))
+        background.append(asyncio.create_task(agents.run()))
+    webhook = TelegramWebhook(application, settings) if settings.webhook_url else None
+    if webhook is not None:
+        webhook.route(http_server(settings.webhook_host, settings.webhook_port))
+    for server in http_servers.values():
+        await server.start()
     logger.info("Bot started")
 
     try:
-        await application.updater.start_polling()
+        if webhook is not None:
+            await webhook.start()
+        else:
+            await application.updater.start_polling()
         await asyncio.Event().wait()
     finally:
+        if webhook is not None:
+            # While the listener is still open: refuse new updates with 503 and drain the received ones.
+            await webhook.stop()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        if application.updater is not None and application.updater.running:
+            await application.updater.stop()
+        for server in http_servers.values():
+            await server.stop()
+        uptime.close()
+        await dispatcher.stop()
         await application.stop()
+        registry: CameraRegistry = application.bot_data["registry"]
+        await registry.flush()
+        registry.store.close()
         await application.shutdown()
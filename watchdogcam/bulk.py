@@ -0,0 +1,309 @@
+"""Bulk import and export of cameras as CSV or JSON documents.
+
+Imports are read as a stream: CSV row by row, JSON arrays element by element
+(JSON Lines are accepted as well), so a large file is never held in memory
+as one parsed document.  Every row is validated on its own (IP syntax, probe
+options, duplicate ``id``/``ip`` against the registry and the file itself)
+and the valid ones are added to the registry as one change.
+
+Reading and writing happen in a worker thread; only :func:`add_imported`
+touches the registry and runs on the event loop.
+"""
+import csv
+import io
+import ipaddress
+import json
+import uuid
+from dataclasses import dataclass, field
+from typing import BinaryIO, Collection, Dict, Iterator, List, TextIO, Tuple
+
+from probes import build_probe
+from registry import CameraRegistry
+from storage import Camera
+from subscriptions import parse_tags
+
+EXPORT_FORMATS = ("csv", "json")
+EXPORT_FIELDS = (
+    "id",
+    "name",
+    "ip",
+    "enabled",
+    "site",
+    "parent",
+    "tags",
+    "probe",
+    "last_status",
+    "last_check_at",
+    "last_status_change_at",
+)
+# Column names accepted in addition to the field names.
+_HEADER_ALIASES = {
+    "название": "name",
+    "имя": "name",
+    "адрес": "ip",
+    "площадка": "site",
+    "узел": "parent",
+    "теги": "tags",
+}
+_TRUE = {"1", "true", "yes", "y", "да", "on"}
+_FALSE = {"0", "false", "no", "n", "нет", "off", ""}
+CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportFormatError(ValueError):
+    """Raised when a document cannot be parsed at all."""
+
+
+@dataclass
+class ImportReport:
+    cameras: List[Camera] = field(default_factory=list)
+    rows: int = 0
+    invalid: int = 0
+    duplicates: int = 0
+    # ``(row, message)`` for the first MAX_REPORTED_ERRORS problems.
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    def reject(self, row: int, message: str, duplicate: bool = False) -> None:
+        if duplicate:
+            self.duplicates += 1
+        else:
+            self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row, message))
+
+
+def _parse_bool(value: object) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"неверное значение enabled: {value!r}")
+
+
+def validate_row(row: Dict[str, object]) -> Camera:
+    """Build a camera from an imported row; raises :class:`ValueError` with a user-facing message."""
+
+    ip = str(row.get("ip") or "").strip()
+    if not ip:
+        raise ValueError("не указан IP")
+    try:
+        ipaddress.ip_address(ip)
+    except ValueError:
+        raise ValueError(f"неверный IP {ip!r}") from None
+
+    camera: Camera = {
+        "id": str(row.get("id") or "").strip() or str(uuid.uuid4()),
+        "name": str(row.get("name") or "").strip() or ip,
+        "ip": ip,
+        "enabled": _parse_bool(row["enabled"]) if row.get("enabled") not in (None, "") else True,
+        "last_status": "unknown",
+        "previous_status": "unknown",
+        "last_check_at": None,
+        "last_status_change_at": None,
+    }
+    for name in ("site", "parent"):
+        value = str(row.get(name) or "").strip()
+        if value:
+            camera[name] = value
+    tags = row.get("tags")
+    if isinstance(tags, str) and tags.strip().startswith("["):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            raise ValueError("поле tags содержит некорректный JSON") from None
+    if tags and not isinstance(tags, (str, list)):
+        raise ValueError("поле tags должно быть списком или строкой через запятую")
+    tags = parse_tags(tags)
+    if tags:
+        camera["tags"] = tags
+
+    probe = row.get("probe")
+    if isinstance(probe, str):
+        probe = probe.strip()
+        if probe.startswith("{"):
+            try:
+                probe = json.loads(probe)
+            except ValueError:
+                raise ValueError("поле probe содержит некорректный JSON") from None
+    if probe:
+        try:
+            build_probe(probe)
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"неверная проверка: {exc}") from None
+        camera["probe"] = probe
+    return camera
+
+
+def _iter_csv(text: TextIO) -> Iterator[Tuple[int, object]]:
+    sample = text.read(CHUNK_SIZE)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(_chain(sample, text), dialect)
+    header = next(reader, None)
+    if not header:
+        return
+    columns = [_HEADER_ALIASES.get(name.strip().lower(), name.strip().lower()) for name in header]
+    if "ip" not in columns:
+        raise ImportFormatError("в CSV нет колонки ip")
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        yield reader.line_num, dict(zip(columns, values))
+
+
+def _chain(head: str, rest: TextIO) -> Iterator[str]:
+    """Lines of ``head`` followed by the rest of the stream."""
+
+    buffer = io.StringIO(head + rest.readline())
+    yield from buffer
+    yield from rest
+
+
+def _iter_json_array(text: TextIO) -> Iterator[Tuple[int, object]]:
+    decoder = json.JSONDecoder()
+    buffer = text.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise ImportFormatError("ожидался JSON-массив")
+    position = 1
+    index = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            if position >= len(buffer):
+                raise json.JSONDecodeError("need more data", buffer, position)
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as exc:
+            if eof:
+                raise ImportFormatError(f"некорректный JSON около элемента {index + 1}: {exc.msg}") from None
+            chunk = text.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        index += 1
+        yield index, item
+
+
+def _iter_json_lines(text: TextIO) -> Iterator[Tuple[int, object]]:
+    for number, line in enumerate(text, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+
+def iter_rows(stream: BinaryIO, filename: str = "") -> Iterator[Tuple[int, object]]:
+    """Yield ``(row number, row)`` from a CSV, JSON array or JSON Lines document."""
+
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    suffix = filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
+    if suffix not in ("csv", "json", "jsonl", "ndjson"):
+        start = text.read(1)
+        while start.isspace():
+            start = text.read(1)
+        text.detach()
+        stream.seek(0)
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        suffix = "json" if start == "[" else "jsonl" if start == "{" else "csv"
+    try:
+        if suffix == "csv":
+            yield from _iter_csv(text)
+        elif suffix == "json":
+            yield from _iter_json_array(text)
+        else:
+            yield from _iter_json_lines(text)
+    except UnicodeDecodeError:
+        raise ImportFormatError("файл должен быть в кодировке UTF-8") from None
+    except csv.Error as exc:
+        raise ImportFormatError(f"некорректный CSV: {exc}") from None
+
+
+def read_import(
+    stream: BinaryIO, filename: str, existing_ids: Collection[str], existing_ips: Collection[str]
+) -> ImportReport:
+    """Parse and validate a document; duplicates of existing or earlier rows are rejected."""
+
+    report = ImportReport()
+    ids: set[str] = set()
+    ips: set[str] = set()
+    for number, row in iter_rows(stream, filename):
+        report.rows += 1
+        if row is None:
+            report.reject(number, "некорректный JSON")
+            continue
+        if not isinstance(row, dict):
+            report.reject(number, "ожидался объект с полями камеры")
+            continue
+        try:
+            camera = validate_row(row)
+        except (TypeError, ValueError) as exc:
+            report.reject(number, str(exc))
+            continue
+        camera_id, ip = str(camera["id"]), str(camera["ip"])
+        if camera_id in existing_ids or camera_id in ids:
+            report.reject(number, f"камера с ID {camera_id} уже есть", duplicate=True)
+        elif ip in existing_ips or ip in ips:
+            report.reject(number, f"камера с IP {ip} уже есть", duplicate=True)
+        else:
+            ids.add(camera_id)
+            ips.add(ip)
+            report.cameras.append(camera)
+    return report
+
+
+def add_imported(registry: CameraRegistry, report: ImportReport) -> List[Camera]:
+    """Add the cameras of ``report`` that are still new in one registry change."""
+
+    cameras = []
+    for camera in report.cameras:
+        if registry.find(str(camera["id"])) or registry.find(str(camera["ip"])):
+            # Added by someone else while the document was being read.
+            report.duplicates += 1
+            continue
+        cameras.append(camera)
+    report.cameras = registry.add_many(cameras)
+    return report.cameras
+
+
+def _csv_value(value: object) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, list):
+        return ",".join(str(item) for item in value)
+    return str(value)
+
+
+def write_export(cameras: List[Camera], export_format: str, out: BinaryIO) -> None:
+    """Write ``cameras`` to ``out`` as CSV (one column per EXPORT_FIELDS) or as a JSON array."""
+
+    # utf-8-sig so that spreadsheet programs detect the encoding of the CSV.
+    encoding = "utf-8-sig" if export_format == "csv" else "utf-8"
+    text = io.TextIOWrapper(out, encoding=encoding, newline="")
+    if export_format == "csv":
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_FIELDS)
+        for camera in cameras:
+            writer.writerow([_csv_value(camera.get(name)) for name in EXPORT_FIELDS])
+    else:
+        text.write("[")
+        for index, camera in enumerate(cameras):
+            text.write(",\n  " if index else "\n  ")
+            text.write(json.dumps(camera, ensure_ascii=False))
+        text.write("\n]\n")
+    text.flush()
+    text.detach()
@@ -0,0 +1,253 @@
+"""Headless ``check`` command for cron, systemd timers and scripts.
+
+``python main.py check`` runs one check cycle over the cameras in the
+configured storage and prints the results as one JSON document; ``--daemon``
+keeps checking every CHECK_INTERVAL_SECONDS and prints NDJSON, one line per
+camera and cycle.  Neither TELEGRAM_TOKEN nor a ``.env`` file is needed and
+only configuration, storage and the probe layer are imported; Telegram is
+loaded only for ``--notify``, which sends the usual notifications to the
+subscribers, filtered by their tags and mutes.
+
+Statuses are written back to storage only with ``--save`` (implied by
+``--notify``, whose transitions are relative to the saved statuses), so a
+check next to a running bot leaves its files alone.  A single run exits with
+status 0 when every checked camera answers and 2 when some are offline or
+unreachable.  ``--profile FILE`` writes a profile of the first cycle to FILE
+(``-`` for standard error, as standard output carries the results).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sys
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Collection, Dict, List, TextIO
+
+from config import Settings
+from flapping import FlapDetector
+from monitor import CycleResult, run_cycle
+from neighbors import PassiveLiveness
+from probes import probe_for_camera
+from profiling import CycleProfiler
+from registry import CameraRegistry
+from storage import Camera, CameraStore, SubscriberId, open_store
+from subscriptions import Subscriptions
+from topology import DOWN_STATUSES, Topology
+
+if TYPE_CHECKING:
+    from notifier import NotificationDispatcher
+
+logger = logging.getLogger(__name__)
+
+EXIT_DOWN = 2
+DRAIN_SECONDS = 30.0
+
+
+class ReadOnlyStore:
+    """Wraps a store so that checks without ``--save`` never write to it."""
+
+    def __init__(self, store: CameraStore) -> None:
+        self.store = store
+
+    def load_cameras(self) -> List[Camera]:
+        return self.store.load_cameras()
+
+    def save_cameras(
+        self,
+        cameras: List[Camera],
+        changed: List[Camera],
+        removed: Collection[str],
+        checked: Dict[str, Collection[str]],
+    ) -> None:
+        pass
+
+    def read_subscribers(self) -> list[SubscriberId]:
+        return self.store.read_subscribers()
+
+    def write_subscribers(self, subscribers: list[SubscriberId]) -> None:
+        pass
+
+    def close(self) -> None:
+        self.store.close()
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="main.py check", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--daemon", action="store_true", help="keep checking every CHECK_INTERVAL_SECONDS")
+    parser.add_argument("--interval", type=float, help="seconds between cycles in daemon mode")
+    parser.add_argument("--format", choices=("json", "ndjson"), help="default: json, ndjson in daemon mode")
+    parser.add_argument("--camera", action="append", default=[], help="IP or ID to check (repeatable)")
+    parser.add_argument("--save", action="store_true", help="write statuses back to storage")
+    parser.add_argument("--notify", action="store_true", help="send Telegram notifications (implies --save)")
+    parser.add_argument("--profile", metavar="FILE", help="write a profile of the first cycle to FILE (- for stderr)")
+    return parser.parse_args(argv)
+
+
+def _record(
+    camera: Camera,
+    rtt_ms: float | None = None,
+    loss: float | None = None,
+    error: str | None = None,
+    passive: bool = False,
+) -> dict:
+    return {
+        "id": camera.get("id"),
+        "name": camera.get("name"),
+        "ip": camera.get("ip"),
+        "probe": "neighbor" if passive else probe_for_camera(camera).kind,
+        "status": camera.get("last_status"),
+        "previous_status": camera.get("previous_status"),
+        "changed": camera.get("last_status") != camera.get("previous_status"),
+        "rtt_ms": round(rtt_ms, 3) if rtt_ms is not None else None,
+        "loss": loss,
+        "error": error,
+        "checked_at": camera.get("last_check_at"),
+    }
+
+
+def cycle_records(cycle: CycleResult) -> List[dict]:
+    records = [
+        _record(camera, result.rtt_ms, result.loss, result.error, result.passive) for camera, result in cycle.results
+    ]
+    records.extend(_record(camera, error="upstream node is down") for camera in cycle.unreachable)
+    return records
+
+
+def _select(registry: CameraRegistry, targets: List[str]) -> List[Camera] | None:
+    if not targets:
+        return None
+    cameras = []
+    for target in targets:
+        camera = registry.find(target)
+        if camera is None:
+            logger.warning("Camera %s not found", target)
+        else:
+            cameras.append(camera)
+    return cameras
+
+
+async def _open_dispatcher(settings: Settings) -> "NotificationDispatcher":
+    # Imported here so that checks without notifications never load Telegram.
+    from telegram import Bot
+
+    from notifier import NotificationDispatcher
+
+    bot = Bot(settings.token)
+    await bot.initialize()
+    dispatcher = NotificationDispatcher(
+        bot,
+        outbox_file=settings.outbox_file,
+        workers=settings.notify_workers,
+        rate_per_second=settings.notify_rate_per_second,
+        chat_rate_per_second=settings.notify_chat_rate_per_second,
+    )
+    await dispatcher.start()
+    return dispatcher
+
+
+def _write_profile(path: str, report: str) -> None:
+    if path == "-":
+        sys.stderr.write(report)
+        sys.stderr.flush()
+        return
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(report)
+    logger.info("Profile written to %s", path)
+
+
+def _emit(out: TextIO, records: List[dict], output_format: str, started: float, total: int) -> None:
+    if output_format == "ndjson":
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        statuses: Dict[str, int] = {}
+        for record in records:
+            statuses[str(record["status"])] = statuses.get(str(record["status"]), 0) + 1
+        document = {
+            "checked_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+            "seconds": round(time.monotonic() - started, 3),
+            "cameras": total,
+            "checked": len(records),
+            "statuses": statuses,
+            "results": records,
+        }
+        json.dump(document, out, ensure_ascii=False, indent=2)
+        out.write("\n")
+    out.flush()
+
+
+async def run_check(settings: Settings, args: argparse.Namespace, out: TextIO = sys.stdout) -> int:
+    """Run the ``check`` command; returns the process exit status."""
+
+    if args.notify and not settings.token:
+        logger.error("--notify needs TELEGRAM_TOKEN")
+        return 1
+    save = args.save or args.notify
+    output_format = args.format or ("ndjson" if args.daemon else "json")
+    interval = args.interval or settings.check_interval_seconds
+
+    store = open_store(settings)
+    registry = CameraRegistry.load(store if save else ReadOnlyStore(store), settings.storage_flush_delay_seconds)
+    topology = Topology(registry)
+    cameras = _select(registry, args.camera)
+    if cameras is not None and not cameras:
+        store.close()
+        return 1
+    dispatcher = await _open_dispatcher(settings) if args.notify else None
+    subscriptions = Subscriptions(store, settings.subscriptions_file) if args.notify else None
+    neighbors = (
+        PassiveLiveness(settings.neighbor_table, settings.passive_max_age_seconds) if settings.neighbor_table else None
+    )
+    flaps = FlapDetector(settings.flap_window_seconds, settings.flap_threshold)
+    profiler = CycleProfiler() if args.profile else None
+    report = profiler.arm() if profiler is not None else None
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    down = False
+    try:
+        while True:
+            started = time.monotonic()
+            cycle = await run_cycle(
+                settings,
+                registry,
+                dispatcher,
+                cameras,
+                topology=topology,
+                subscriptions=subscriptions,
+                neighbors=neighbors,
+                flaps=flaps,
+                profiler=profiler,
+            )
+            if report is not None and report.done():
+                _write_profile(args.profile, report.result())
+                profiler = report = None
+            records = cycle_records(cycle)
+            total = len(cameras) if cameras is not None else len(registry.enabled())
+            _emit(out, records, output_format, started, total)
+            down = any(record["status"] in DOWN_STATUSES for record in records)
+            if save:
+                await registry.flush()
+            if not args.daemon:
+                break
+            try:
+                await asyncio.wait_for(stop.wait(), max(0.0, interval - (time.monotonic() - started)))
+                break
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if dispatcher is not None:
+            await dispatcher.stop(drain_timeout=DRAIN_SECONDS)
+            await dispatcher.bot.shutdown()
+        if save:
+            await registry.flush()
+        store.close()
+    return EXIT_DOWN if down else 0
@@ -1,4 +1,8 @@
+import ipaddress
 import os
+import re
+import secrets
+import socket
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -19,13 +23,13 @@ class SettingsError(Exception):
     """Raised when required settings are missing or invalid."""
 
 
-def _load_env_from_dotenv(env_path: Path | None = None) -> None:
+def _load_env_from_dotenv(env_path: Path | None = None, required: bool = True) -> None:
     """Populate ``os.environ`` with values from a ``.env`` file.
 
     The function prioritizes the `.env` file located next to ``main.py`` but
     will also search from the current working directory using ``find_dotenv``.
-    If no file is found, a :class:`SettingsError` is raised with the inspected
-    paths to help debug missing secrets.
+    If no file is found and ``required`` is set, a :class:`SettingsError` is
+    raised with the inspected paths to help debug missing secrets.
     """
 
     primary_path = env_path or Path(__file__).resolve().parent / ".env"
@@ -42,12 +46,18 @@ def _load_env_from_dotenv(env_path: Path | None = None) -> None:
             load_dotenv(dotenv_path=path, override=True)
             return
 
+    if not required:
+        return
     raise SettingsError(
         "Не найден файл .env с секретами. Проверьте наличие по путям: "
         + ", ".join(str(path) for path in candidate_paths)
     )
 
 
+PING_MODES = ("subprocess", "icmp")
+STORAGE_BACKENDS = ("json", "journal", "sqlite")
+
+
 @dataclass
 class Settings:
     token: str
@@ -55,38 +65,350 @@ class Settings:
     subscribers_file: Path
     check_interval_seconds: int = 300
     ping_timeout_seconds: int = 1
+    probe_concurrency: int = 64
+    check_deadline_seconds: int = 60
+    ping_mode: str = "subprocess"
+    probe_timeout_seconds: float = 2.0
+    storage_flush_delay_seconds: float = 2.0
+    storage_backend: str = "json"
+    database_file: Path = Path("watchdogcam.db")
+    journal_file: Path | None = None
+    journal_compact_bytes: int = 1024 * 1024
+    check_freshness_seconds: int = 30
+    outbox_file: Path = Path("outbox.json")
+    subscriptions_file: Path = Path("subscriptions.json")
+    notify_workers: int = 4
+    notify_rate_per_second: float = 25.0
+    notify_chat_rate_per_second: float = 1.0
+    digest_threshold: int = 5
+    recheck_fast_seconds: int = 60
+    max_check_interval_seconds: int = 1800
+    echo_attempts: int = 3
+    confirm_results: int = 3
+    confirm_backoff_seconds: float = 1.0
+    flap_window_seconds: int = 3600
+    flap_threshold: int = 4
+    degraded_rtt_ms: float = 500.0
+    degraded_loss_percent: float = 20.0
+    latency_samples: int = 64
+    uptime_file: Path = Path("uptime.bin")
+    uptime_slot_seconds: int = 60
+    uptime_retention_days: int = 400
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+    agent_token: str = ""
+    agent_host: str = "0.0.0.0"
+    agent_port: int = 0
+    agent_heartbeat_seconds: int = 10
+    agent_timeout_seconds: int = 30
+    coordinator_url: str = ""
+    agent_id: str = ""
+    agent_sites: tuple[str, ...] = ()
+    discovery_networks: tuple[str, ...] = ()
+    discovery_interval_seconds: int = 3600
+    discovery_ports: tuple[int, ...] = (554, 80, 8000)
+    discovery_concurrency: int = 512
+    discovery_timeout_seconds: float = 1.0
+    discovery_max_hosts: int = 4096
+    webhook_url: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_secret: str = ""
+    update_workers: int = 8
+    webhook_drain_seconds: float = 10.0
+    neighbor_table: str = ""
+    passive_max_age_seconds: int = 300
+    admin_chat_ids: tuple[int, ...] = ()
 
 
-def load_settings() -> Settings:
+def load_settings(agent: bool = False, headless: bool = False) -> Settings:
     """Load settings from environment variables.
 
+    With ``agent`` set the settings are for a headless probe agent: neither
+    TELEGRAM_TOKEN nor a ``.env`` file is needed, but COORDINATOR_URL,
+    AGENT_TOKEN and AGENT_SITES are.  ``headless`` (the ``check`` command)
+    needs neither TELEGRAM_TOKEN nor a ``.env`` file.
+
     Expected environment variables:
-    - TELEGRAM_TOKEN: Telegram bot token (required)
+    - TELEGRAM_TOKEN: Telegram bot token (required unless running as an agent or a headless check)
     - CAMERAS_FILE: path to cameras JSON file (default: cameras.json)
     - SUBSCRIBERS_FILE: path to subscribers JSON file (default: subscribers.json)
-    - CHECK_INTERVAL_SECONDS: monitoring interval (default: 300)
+    - CHECK_INTERVAL_SECONDS: base per-camera check interval (default: 300)
+    - RECHECK_FAST_SECONDS: recheck interval for offline or just changed cameras (default: 60)
+    - MAX_CHECK_INTERVAL_SECONDS: interval long-stable cameras back off to (default: 1800)
     - PING_TIMEOUT_SECONDS: ping timeout (default: 1)
+    - ECHO_ATTEMPTS: echo requests per ICMP probe, for RTT and loss; with CONFIRM_RESULTS above 1
+      only confirmation probes send that many, routine probes send one (default: 3)
+    - CONFIRM_RESULTS: consecutive results disagreeing with the status needed to change it (default: 3)
+    - CONFIRM_BACKOFF_SECONDS: delay before the first confirmation probe, doubled for each next one (default: 1)
+    - FLAP_WINDOW_SECONDS: window in which status changes are counted for flap detection (default: 3600)
+    - FLAP_THRESHOLD: status changes within FLAP_WINDOW_SECONDS that make a camera flapping;
+      0 disables flap detection (default: 4)
+    - DEGRADED_RTT_MS: average RTT from which a camera counts as degraded (default: 500)
+    - DEGRADED_LOSS_PERCENT: packet loss from which a camera counts as degraded (default: 20)
+    - LATENCY_SAMPLES: RTT/loss samples kept per camera (default: 64)
+    - UPTIME_FILE: memory-mapped uptime history (default: uptime.bin)
+    - UPTIME_SLOT_SECONDS: resolution of the uptime history (default: 60)
+    - UPTIME_RETENTION_DAYS: how long uptime history is kept (default: 400)
+    - METRICS_PORT: serve Prometheus metrics on this port; 0 disables it (default: 0)
+    - METRICS_HOST: address the metrics endpoint listens on (default: 127.0.0.1)
+    - AGENT_TOKEN: shared secret probe agents authenticate with
+    - AGENT_PORT: accept probe agents on this port; 0 disables them (default: 0)
+    - AGENT_HOST: address the agent endpoint listens on (default: 0.0.0.0)
+    - AGENT_HEARTBEAT_SECONDS: how often agents send a heartbeat (default: 10)
+    - AGENT_TIMEOUT_SECONDS: agents silent for this long lose their cameras (default: 30)
+    - COORDINATOR_URL: agent only, base URL of the bot's agent endpoint
+    - AGENT_ID: agent only, unique agent name (default: host name)
+    - AGENT_SITES: agent only, comma-separated site tags the agent can reach
+    - DISCOVERY_NETWORKS: comma-separated CIDRs swept for new cameras on a schedule (default: none)
+    - DISCOVERY_INTERVAL_SECONDS: how often DISCOVERY_NETWORKS are swept (default: 3600)
+    - DISCOVERY_PORTS: TCP ports that identify a camera during a sweep (default: 554,80,8000)
+    - DISCOVERY_CONCURRENCY: maximum simultaneous connects and pings of a sweep (default: 512)
+    - DISCOVERY_TIMEOUT_SECONDS: connect timeout of sweep probes (default: 1)
+    - DISCOVERY_MAX_HOSTS: largest number of addresses a single /discover may sweep (default: 4096)
+    - WEBHOOK_URL: public HTTPS URL for Telegram updates; unset means long polling (default: unset)
+    - WEBHOOK_HOST: address the webhook endpoint listens on (default: 0.0.0.0)
+    - WEBHOOK_PORT: port the webhook endpoint listens on (default: 8443)
+    - WEBHOOK_SECRET: secret Telegram sends with every update (default: random per start)
+    - UPDATE_WORKERS: webhook updates processed at once; one chat is always handled in order (default: 8)
+    - WEBHOOK_DRAIN_SECONDS: time received updates get to finish on shutdown (default: 10)
+    - NEIGHBOR_TABLE: ``ip`` or a file like /proc/net/arp whose REACHABLE entries spare
+      online cameras their probe (default: empty, always probe)
+    - PASSIVE_MAX_AGE_SECONDS: cameras counted online from NEIGHBOR_TABLE still get a real
+      probe this often (default: CHECK_INTERVAL_SECONDS)
+    - ADMIN_CHAT_IDS: comma-separated chat IDs allowed to run admin commands such as /profile (default: none)
+    - PROBE_CONCURRENCY: maximum number of simultaneous probes (default: 64)
+    - CHECK_DEADLINE_SECONDS: time budget for a single check cycle (default: 60)
+    - CHECK_FRESHNESS_SECONDS: /check and /refresh reuse a cycle this recent (default: 30)
+    - OUTBOX_FILE: undelivered notifications kept across restarts (default: outbox.json)
+    - SUBSCRIPTIONS_FILE: per-subscriber tag filters and mutes (default: subscriptions.json)
+    - NOTIFY_WORKERS: number of notification delivery workers (default: 4)
+    - NOTIFY_RATE_PER_SECOND: overall notification rate limit (default: 25)
+    - NOTIFY_CHAT_RATE_PER_SECOND: per-chat notification rate limit (default: 1)
+    - DIGEST_THRESHOLD: more status changes per cycle than this are sent as one digest (default: 5)
+    - PING_MODE: ``subprocess`` (system ping) or ``icmp`` (built-in batch pinger)
+    - PROBE_TIMEOUT_SECONDS: connect/response timeout of TCP, HTTP and RTSP probes (default: 2)
+    - STORAGE_FLUSH_DELAY_SECONDS: how long changes are batched before writing (default: 2)
+    - STORAGE_BACKEND: ``json`` (CAMERAS_FILE/SUBSCRIBERS_FILE), ``journal`` (CAMERAS_FILE
+      snapshot plus an append-only status journal) or ``sqlite`` (default: json)
+    - DATABASE_FILE: SQLite database path for the sqlite backend (default: watchdogcam.db)
+    - JOURNAL_FILE: journal path for the journal backend (default: CAMERAS_FILE with .journal suffix)
+    - JOURNAL_COMPACT_BYTES: journal size that triggers compaction into the snapshot (default: 1048576)
     """
 
     _load_env_from_venv()
-    _load_env_from_dotenv()
+    _load_env_from_dotenv(required=not (agent or headless))
 
     token = os.environ.get("TELEGRAM_TOKEN")
     cameras_file_raw = os.environ.get("CAMERAS_FILE", "cameras.json")
     subscribers_file_raw = os.environ.get("SUBSCRIBERS_FILE", "subscribers.json")
     check_interval_raw = os.environ.get("CHECK_INTERVAL_SECONDS")
+    recheck_fast_raw = os.environ.get("RECHECK_FAST_SECONDS")
+    max_check_interval_raw = os.environ.get("MAX_CHECK_INTERVAL_SECONDS")
     ping_timeout_raw = os.environ.get("PING_TIMEOUT_SECONDS")
+    echo_attempts_raw = os.environ.get("ECHO_ATTEMPTS")
+    confirm_results_raw = os.environ.get("CONFIRM_RESULTS")
+    confirm_backoff_raw = os.environ.get("CONFIRM_BACKOFF_SECONDS")
+    flap_window_raw = os.environ.get("FLAP_WINDOW_SECONDS")
+    flap_threshold_raw = os.environ.get("FLAP_THRESHOLD")
+    degraded_rtt_raw = os.environ.get("DEGRADED_RTT_MS")
+    degraded_loss_raw = os.environ.get("DEGRADED_LOSS_PERCENT")
+    latency_samples_raw = os.environ.get("LATENCY_SAMPLES")
+    uptime_file_raw = os.environ.get("UPTIME_FILE", "uptime.bin")
+    uptime_slot_raw = os.environ.get("UPTIME_SLOT_SECONDS")
+    uptime_retention_raw = os.environ.get("UPTIME_RETENTION_DAYS")
+    metrics_host = os.environ.get("METRICS_HOST", "127.0.0.1").strip()
+    metrics_port_raw = os.environ.get("METRICS_PORT")
+    agent_token = os.environ.get("AGENT_TOKEN", "").strip()
+    agent_host = os.environ.get("AGENT_HOST", "0.0.0.0").strip()
+    agent_port_raw = os.environ.get("AGENT_PORT")
+    agent_heartbeat_raw = os.environ.get("AGENT_HEARTBEAT_SECONDS")
+    agent_timeout_raw = os.environ.get("AGENT_TIMEOUT_SECONDS")
+    coordinator_url = os.environ.get("COORDINATOR_URL", "").strip()
+    agent_id = os.environ.get("AGENT_ID", "").strip() or socket.gethostname()
+    agent_sites_raw = os.environ.get("AGENT_SITES", "")
+    discovery_networks_raw = os.environ.get("DISCOVERY_NETWORKS", "")
+    discovery_interval_raw = os.environ.get("DISCOVERY_INTERVAL_SECONDS")
+    discovery_ports_raw = os.environ.get("DISCOVERY_PORTS", "554,80,8000")
+    discovery_concurrency_raw = os.environ.get("DISCOVERY_CONCURRENCY")
+    discovery_timeout_raw = os.environ.get("DISCOVERY_TIMEOUT_SECONDS")
+    discovery_max_hosts_raw = os.environ.get("DISCOVERY_MAX_HOSTS")
+    webhook_url = os.environ.get("WEBHOOK_URL", "").strip()
+    webhook_host = os.environ.get("WEBHOOK_HOST", "0.0.0.0").strip()
+    webhook_port_raw = os.environ.get("WEBHOOK_PORT")
+    webhook_secret = os.environ.get("WEBHOOK_SECRET", "").strip() or secrets.token_urlsafe(32)
+    update_workers_raw = os.environ.get("UPDATE_WORKERS")
+    webhook_drain_raw = os.environ.get("WEBHOOK_DRAIN_SECONDS")
+    neighbor_table = os.environ.get("NEIGHBOR_TABLE", "").strip()
+    passive_max_age_raw = os.environ.get("PASSIVE_MAX_AGE_SECONDS")
+    admin_chat_ids_raw = os.environ.get("ADMIN_CHAT_IDS", "")
+    probe_concurrency_raw = os.environ.get("PROBE_CONCURRENCY")
+    check_deadline_raw = os.environ.get("CHECK_DEADLINE_SECONDS")
+    check_freshness_raw = os.environ.get("CHECK_FRESHNESS_SECONDS")
+    outbox_file_raw = os.environ.get("OUTBOX_FILE", "outbox.json")
+    subscriptions_file_raw = os.environ.get("SUBSCRIPTIONS_FILE", "subscriptions.json")
+    notify_workers_raw = os.environ.get("NOTIFY_WORKERS")
+    notify_rate_raw = os.environ.get("NOTIFY_RATE_PER_SECOND")
+    notify_chat_rate_raw = os.environ.get("NOTIFY_CHAT_RATE_PER_SECOND")
+    digest_threshold_raw = os.environ.get("DIGEST_THRESHOLD")
+    ping_mode = os.environ.get("PING_MODE", "subprocess").strip().lower()
+    probe_timeout_raw = os.environ.get("PROBE_TIMEOUT_SECONDS")
+    flush_delay_raw = os.environ.get("STORAGE_FLUSH_DELAY_SECONDS")
+    storage_backend = os.environ.get("STORAGE_BACKEND", "json").strip().lower()
+    database_file_raw = os.environ.get("DATABASE_FILE", "watchdogcam.db")
+    journal_file_raw = os.environ.get("JOURNAL_FILE")
+    journal_compact_raw = os.environ.get("JOURNAL_COMPACT_BYTES")
 
-    if not token:
+    if not token and not (agent or headless):
         raise SettingsError("TELEGRAM_TOKEN is not set")
 
     check_interval_seconds = int(check_interval_raw) if check_interval_raw else 300
+    recheck_fast_seconds = int(recheck_fast_raw) if recheck_fast_raw else 60
+    max_check_interval_seconds = int(max_check_interval_raw) if max_check_interval_raw else 1800
     ping_timeout_seconds = int(ping_timeout_raw) if ping_timeout_raw else 1
+    echo_attempts = int(echo_attempts_raw) if echo_attempts_raw else 3
+    confirm_results = int(confirm_results_raw) if confirm_results_raw else 3
+    confirm_backoff_seconds = float(confirm_backoff_raw) if confirm_backoff_raw else 1.0
+    flap_window_seconds = int(flap_window_raw) if flap_window_raw else 3600
+    flap_threshold = int(flap_threshold_raw) if flap_threshold_raw else 4
+    degraded_rtt_ms = float(degraded_rtt_raw) if degraded_rtt_raw else 500.0
+    degraded_loss_percent = float(degraded_loss_raw) if degraded_loss_raw else 20.0
+    latency_samples = int(latency_samples_raw) if latency_samples_raw else 64
+    uptime_slot_seconds = int(uptime_slot_raw) if uptime_slot_raw else 60
+    uptime_retention_days = int(uptime_retention_raw) if uptime_retention_raw else 400
+    metrics_port = int(metrics_port_raw) if metrics_port_raw else 0
+    agent_port = int(agent_port_raw) if agent_port_raw else 0
+    agent_heartbeat_seconds = int(agent_heartbeat_raw) if agent_heartbeat_raw else 10
+    agent_timeout_seconds = int(agent_timeout_raw) if agent_timeout_raw else 30
+    agent_sites = tuple(site.strip() for site in agent_sites_raw.split(",") if site.strip())
+    discovery_networks = tuple(net.strip() for net in discovery_networks_raw.split(",") if net.strip())
+    discovery_interval_seconds = int(discovery_interval_raw) if discovery_interval_raw else 3600
+    discovery_ports = tuple(int(port) for port in discovery_ports_raw.split(",") if port.strip())
+    discovery_concurrency = int(discovery_concurrency_raw) if discovery_concurrency_raw else 512
+    discovery_timeout_seconds = float(discovery_timeout_raw) if discovery_timeout_raw else 1.0
+    discovery_max_hosts = int(discovery_max_hosts_raw) if discovery_max_hosts_raw else 4096
+    webhook_port = int(webhook_port_raw) if webhook_port_raw else 8443
+    update_workers = int(update_workers_raw) if update_workers_raw else 8
+    webhook_drain_seconds = float(webhook_drain_raw) if webhook_drain_raw else 10.0
+    passive_max_age_seconds = int(passive_max_age_raw) if passive_max_age_raw else check_interval_seconds
+    try:
+        admin_chat_ids = tuple(int(chat_id) for chat_id in admin_chat_ids_raw.split(",") if chat_id.strip())
+    except ValueError as exc:
+        raise SettingsError("ADMIN_CHAT_IDS must be comma-separated chat IDs") from exc
+    probe_concurrency = int(probe_concurrency_raw) if probe_concurrency_raw else 64
+    check_deadline_seconds = int(check_deadline_raw) if check_deadline_raw else 60
+    check_freshness_seconds = int(check_freshness_raw) if check_freshness_raw else 30
+    notify_workers = int(notify_workers_raw) if notify_workers_raw else 4
+    notify_rate_per_second = float(notify_rate_raw) if notify_rate_raw else 25.0
+    notify_chat_rate_per_second = float(notify_chat_rate_raw) if notify_chat_rate_raw else 1.0
+    digest_threshold = int(digest_threshold_raw) if digest_threshold_raw else 5
+
+    probe_timeout_seconds = float(probe_timeout_raw) if probe_timeout_raw else 2.0
+    storage_flush_delay_seconds = float(flush_delay_raw) if flush_delay_raw else 2.0
+    journal_compact_bytes = int(journal_compact_raw) if journal_compact_raw else 1024 * 1024
+
+    if probe_concurrency < 1:
+        raise SettingsError("PROBE_CONCURRENCY must be a positive integer")
+    if notify_workers < 1 or notify_rate_per_second <= 0 or notify_chat_rate_per_second <= 0:
+        raise SettingsError("NOTIFY_WORKERS and notification rates must be positive")
+    if echo_attempts < 1 or latency_samples < 1:
+        raise SettingsError("ECHO_ATTEMPTS and LATENCY_SAMPLES must be positive integers")
+    if confirm_results < 1 or confirm_backoff_seconds < 0:
+        raise SettingsError("CONFIRM_RESULTS must be a positive integer and CONFIRM_BACKOFF_SECONDS not negative")
+    if flap_window_seconds < 1 or flap_threshold < 0 or flap_threshold == 1:
+        raise SettingsError("FLAP_WINDOW_SECONDS must be positive and FLAP_THRESHOLD 0 or at least 2")
+    if uptime_slot_seconds < 1 or uptime_retention_days < 1:
+        raise SettingsError("UPTIME_SLOT_SECONDS and UPTIME_RETENTION_DAYS must be positive integers")
+    if not 0 <= metrics_port <= 65535 or not 0 <= agent_port <= 65535:
+        raise SettingsError("METRICS_PORT and AGENT_PORT must be between 0 and 65535")
+    if agent_heartbeat_seconds < 1 or agent_timeout_seconds <= agent_heartbeat_seconds:
+        raise SettingsError("AGENT_TIMEOUT_SECONDS must be longer than AGENT_HEARTBEAT_SECONDS")
+    if (agent_port or agent) and not agent_token:
+        raise SettingsError("AGENT_TOKEN is required for probe agents")
+    if agent and (not coordinator_url or not agent_sites):
+        raise SettingsError("COORDINATOR_URL and AGENT_SITES are required in agent mode")
+    for network in discovery_networks:
+        try:
+            ipaddress.ip_network(network, strict=False)
+        except ValueError as exc:
+            raise SettingsError(f"DISCOVERY_NETWORKS: {exc}") from exc
+    if not all(0 < port <= 65535 for port in discovery_ports):
+        raise SettingsError("DISCOVERY_PORTS must be TCP ports between 1 and 65535")
+    if discovery_interval_seconds < 1 or discovery_concurrency < 1 or discovery_max_hosts < 1:
+        raise SettingsError(
+            "DISCOVERY_INTERVAL_SECONDS, DISCOVERY_CONCURRENCY and DISCOVERY_MAX_HOSTS must be positive"
+        )
+    if passive_max_age_seconds < 1:
+        raise SettingsError("PASSIVE_MAX_AGE_SECONDS must be a positive integer")
+    if webhook_url and not webhook_url.startswith("https://"):
+        raise SettingsError("WEBHOOK_URL must be an https:// URL")
+    if not 0 < webhook_port <= 65535 or update_workers < 1:
+        raise SettingsError("WEBHOOK_PORT must be a TCP port and UPDATE_WORKERS a positive integer")
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", webhook_secret):
+        raise SettingsError("WEBHOOK_SECRET may only contain 1-256 characters A-Z, a-z, 0-9, _ and -")
+    if ping_mode not in PING_MODES:
+        raise SettingsError(f"PING_MODE must be one of: {', '.join(PING_MODES)}")
+    if storage_backend not in STORAGE_BACKENDS:
+        raise SettingsError(f"STORAGE_BACKEND must be one of: {', '.join(STORAGE_BACKENDS)}")
 
     return Settings(
-        token=token,
+        token=token or "",
         cameras_file=Path(cameras_file_raw),
         subscribers_file=Path(subscribers_file_raw),
         check_interval_seconds=check_interval_seconds,
+        recheck_fast_seconds=recheck_fast_seconds,
+        max_check_interval_seconds=max(max_check_interval_seconds, check_interval_seconds),
         ping_timeout_seconds=ping_timeout_seconds,
+        echo_attempts=echo_attempts,
+        confirm_results=confirm_results,
+        confirm_backoff_seconds=confirm_backoff_seconds,
+        flap_window_seconds=flap_window_seconds,
+        flap_threshold=flap_threshold,
+        degraded_rtt_ms=degraded_rtt_ms,
+        degraded_loss_percent=degraded_loss_percent,
+        latency_samples=latency_samples,
+        uptime_file=Path(uptime_file_raw),
+        uptime_slot_seconds=uptime_slot_seconds,
+        uptime_retention_days=uptime_retention_days,
+        metrics_host=metrics_host,
+        metrics_port=metrics_port,
+        agent_token=agent_token,
+        agent_host=agent_host,
+        agent_port=agent_port,
+        agent_heartbeat_seconds=agent_heartbeat_seconds,
+        agent_timeout_seconds=agent_timeout_seconds,
+        coordinator_url=coordinator_url,
+        agent_id=agent_id,
+        agent_sites=agent_sites,
+        discovery_networks=discovery_networks,
+        discovery_interval_seconds=discovery_interval_seconds,
+        discovery_ports=discovery_ports,
+        discovery_concurrency=discovery_concurrency,
+        discovery_timeout_seconds=discovery_timeout_seconds,
+        discovery_max_hosts=discovery_max_hosts,
+        webhook_url=webhook_url,
+        webhook_host=webhook_host,
+        webhook_port=webhook_port,
+        webhook_secret=webhook_secret,
+        update_workers=update_workers,
+        webhook_drain_seconds=webhook_drain_seconds,
+        neighbor_table=neighbor_table,
+        passive_max_age_seconds=passive_max_age_seconds,
+        admin_chat_ids=admin_chat_ids,
+        probe_concurrency=probe_concurrency,
+        check_deadline_seconds=check_deadline_seconds,
+        check_freshness_seconds=check_freshness_seconds,
+        outbox_file=Path(outbox_file_raw),
+        subscriptions_file=Path(subscriptions_file_raw),
+        notify_workers=notify_workers,
+        notify_rate_per_second=notify_rate_per_second,
+        notify_chat_rate_per_second=notify_chat_rate_per_second,
+        digest_threshold=digest_threshold,
+        ping_mode=ping_mode,
+        probe_timeout_seconds=probe_timeout_seconds,
+        storage_flush_delay_seconds=storage_flush_delay_seconds,
+        storage_backend=storage_backend,
+        database_file=Path(database_file_raw),
+        journal_file=Path(journal_file_raw) if journal_file_raw else None,
+        journal_compact_bytes=journal_compact_bytes,
     )
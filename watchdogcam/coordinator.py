@@ -0,0 +1,164 @@
+"""Single-flight coordination of check cycles.
+
+``/check`` and ``/refresh`` both go through one :class:`CheckCoordinator`.
+At most one cycle runs at a time: a request that arrives while a cycle is in
+flight awaits that cycle instead of starting another one, and a request that
+accepts slightly stale data is answered from the last finished cycle if it is
+recent enough.
+
+Scheduler batches go through :meth:`CheckCoordinator.check_batch`.  The
+coordinator keeps the IDs of the cameras that any cycle is probing, and
+neither path probes a camera that the other one has in flight.  Otherwise
+the second result would overwrite ``previous_status`` and the transition,
+with its alert, would be lost.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+from agents import AgentPool
+from config import Settings
+from flapping import FlapDetector
+from latency import LatencyHistory
+from monitor import check_cameras
+from neighbors import PassiveLiveness
+from notifier import NotificationDispatcher
+from profiling import CycleProfiler
+from registry import CameraRegistry
+from storage import Camera
+from subscriptions import Subscriptions
+from topology import Topology
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CheckResult:
+    notifications: List[str] = field(default_factory=list)
+    finished_at: float = 0.0
+    source: str = "executed"
+
+    @property
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.finished_at
+
+
+class CheckCoordinator:
+    def __init__(
+        self,
+        settings: Settings,
+        registry: CameraRegistry,
+        dispatcher: NotificationDispatcher | None = None,
+        history: LatencyHistory | None = None,
+        agents: AgentPool | None = None,
+        topology: Topology | None = None,
+        subscriptions: Subscriptions | None = None,
+        neighbors: PassiveLiveness | None = None,
+        flaps: FlapDetector | None = None,
+        profiler: CycleProfiler | None = None,
+    ) -> None:
+        self.settings = settings
+        self.registry = registry
+        self.dispatcher = dispatcher
+        self.history = history
+        self.agents = agents
+        self.topology = topology
+        self.subscriptions = subscriptions
+        self.neighbors = neighbors
+        self.flaps = flaps
+        self.profiler = profiler
+        self.executed = 0
+        self.coalesced = 0
+        self.cached = 0
+        self._in_flight: asyncio.Task | None = None
+        # IDs of the cameras being probed by a full cycle or a scheduler batch.
+        self._probing: set[str] = set()
+        self._last: CheckResult | None = None
+
+    @property
+    def in_flight(self) -> bool:
+        return self._in_flight is not None
+
+    async def run(self, max_age: float | None = None) -> CheckResult:
+        """Return the result of a check cycle no older than ``max_age`` seconds.
+
+        ``max_age`` defaults to ``settings.check_freshness_seconds``; pass ``0``
+        to require a new cycle (or the one currently running).
+        """
+
+        if max_age is None:
+            max_age = self.settings.check_freshness_seconds
+
+        if self._in_flight is not None:
+            self.coalesced += 1
+            result = await asyncio.shield(self._in_flight)
+            return CheckResult(result.notifications, result.finished_at, source="coalesced")
+
+        if self._last is not None and max_age > 0 and self._last.age_seconds <= max_age:
+            self.cached += 1
+            return CheckResult(self._last.notifications, self._last.finished_at, source="cached")
+
+        self.executed += 1
+        self._in_flight = asyncio.get_running_loop().create_task(self._execute())
+        return await asyncio.shield(self._in_flight)
+
+    async def check_batch(self, cameras: List[Camera]) -> List[Camera]:
+        """Check ``cameras`` that no other cycle is probing right now; returns the ones checked."""
+
+        batch = [camera for camera in cameras if str(camera.get("id")) not in self._probing]
+        if not batch:
+            return batch
+        claimed = {str(camera.get("id")) for camera in batch}
+        self._probing |= claimed
+        try:
+            await check_cameras(
+                self.settings,
+                self.registry,
+                self.dispatcher,
+                cameras=batch,
+                history=self.history,
+                topology=self.topology,
+                subscriptions=self.subscriptions,
+                neighbors=self.neighbors,
+                flaps=self.flaps,
+                profiler=self.profiler,
+            )
+        finally:
+            self._probing -= claimed
+        return batch
+
+    async def _execute(self) -> CheckResult:
+        cameras = None
+        enabled = self.registry.enabled()
+        if self._probing:
+            # Scheduler batches in flight keep their cameras; the rest is checked as usual.
+            cameras = [camera for camera in enabled if str(camera.get("id")) not in self._probing]
+        claimed = {str(camera.get("id")) for camera in (enabled if cameras is None else cameras)}
+        self._probing |= claimed
+        try:
+            notifications = await check_cameras(
+                self.settings,
+                self.registry,
+                self.dispatcher,
+                cameras=cameras,
+                history=self.history,
+                agents=self.agents,
+                topology=self.topology,
+                subscriptions=self.subscriptions,
+                neighbors=self.neighbors,
+                flaps=self.flaps,
+                profiler=self.profiler,
+            )
+            self._last = CheckResult(notifications, time.monotonic())
+            return self._last
+        finally:
+            self._probing -= claimed
+            self._in_flight = None
+            logger.debug(
+                "Check cycles: %d executed, %d coalesced, %d served from cache",
+                self.executed,
+                self.coalesced,
+                self.cached,
+            )
@@ -0,0 +1,274 @@
+"""Subnet sweeps that find cameras nobody has added yet.
+
+``/discover <CIDR>`` and the scheduled sweep of DISCOVERY_NETWORKS probe every
+address of a range that is not in the registry yet: one batch ICMP echo for
+the whole range (subprocess ping when no ICMP socket can be opened) and a TCP
+connect to each of DISCOVERY_PORTS, all at once and bounded only by
+DISCOVERY_CONCURRENCY, so a /22 takes a few connect timeouts instead of a
+thousand sequential pings.  Addresses already in the registry are skipped
+through its IP index before anything is sent.
+
+Hosts that answer are offered with inline buttons; enrolling one adds a
+camera with a probe matching its first open port.  Scheduled sweeps announce
+new hosts to every subscriber that has not muted everything.  Offers of the last few
+sweeps are kept in memory for the buttons.
+"""
+import asyncio
+import dataclasses
+import ipaddress
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from config import Settings
+from icmp import ping_many
+from notifier import Buttons, NotificationDispatcher
+from ping import async_ping_stats
+from registry import CameraRegistry
+from storage import Camera
+from subscriptions import Subscriptions
+
+logger = logging.getLogger(__name__)
+
+# Probe suggested for a camera whose first open port is one of these; other ports get a TCP probe.
+_PROBES_BY_PORT = {554: "rtsp", 80: "http", 8080: "http"}
+MAX_LISTED_HOSTS = 50
+MAX_OFFER_BUTTONS = 20
+KEPT_SWEEPS = 16
+
+
+@dataclass
+class DiscoveredHost:
+    ip: str
+    echo: bool = False
+    rtt_ms: float | None = None
+    # Open ports in DISCOVERY_PORTS order.
+    ports: List[int] = field(default_factory=list)
+
+    @property
+    def probe(self) -> dict | None:
+        if not self.ports:
+            return None
+        port = self.ports[0]
+        return {"type": _PROBES_BY_PORT.get(port, "tcp"), "port": port}
+
+    def describe(self) -> str:
+        details = []
+        if self.ports:
+            details.append("порты " + ", ".join(str(port) for port in self.ports))
+        if self.echo:
+            details.append(f"ping {self.rtt_ms:.1f} мс" if self.rtt_ms is not None else "ping")
+        return f"{self.ip} ({'; '.join(details)})"
+
+
+@dataclass
+class SweepReport:
+    network: str
+    scanned: int = 0
+    known: int = 0
+    seconds: float = 0.0
+    found: List[DiscoveredHost] = field(default_factory=list)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+
+
+def parse_network(text: str, max_hosts: int) -> ipaddress.IPv4Network:
+    """Parse a CIDR for a sweep; raises :class:`ValueError` with a user-facing message."""
+
+    try:
+        network = ipaddress.ip_network(text.strip(), strict=False)
+    except ValueError:
+        raise ValueError(f"{text!r} не похоже на сеть вида 192.168.1.0/24") from None
+    if network.version != 4:
+        raise ValueError("поддерживаются только сети IPv4")
+    if network.num_addresses > max_hosts:
+        raise ValueError(f"в сети {network} {network.num_addresses} адресов, можно не больше {max_hosts}")
+    return network
+
+
+async def _port_open(ip: str, port: int, timeout_seconds: float) -> bool:
+    try:
+        _reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout=timeout_seconds)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def _ping_all(
+    ips: List[str], settings: Settings, semaphore: asyncio.Semaphore
+) -> Dict[str, Tuple[bool, float | None]]:
+    try:
+        echoes = await ping_many(ips, timeout_seconds=settings.ping_timeout_seconds)
+        return {ip: (echo.reachable, echo.rtt_ms) for ip, echo in echoes.items()}
+    except OSError as exc:
+        logger.info("ICMP socket unavailable (%s), sweeping with subprocess ping", exc)
+
+    async def ping(ip: str) -> Tuple[str, Tuple[bool, float | None]]:
+        async with semaphore:
+            stats = await async_ping_stats(ip, timeout_seconds=settings.ping_timeout_seconds)
+        return ip, (stats.received > 0, stats.rtt_ms)
+
+    return dict(await asyncio.gather(*(ping(ip) for ip in ips)))
+
+
+async def sweep(ips: List[str], settings: Settings) -> List[DiscoveredHost]:
+    """Ping and port-scan ``ips`` concurrently; returns the hosts that answered either way."""
+
+    semaphore = asyncio.Semaphore(settings.discovery_concurrency)
+    open_ports: Dict[str, set[int]] = {}
+
+    async def connect(ip: str, port: int) -> None:
+        async with semaphore:
+            if await _port_open(ip, port, settings.discovery_timeout_seconds):
+                open_ports.setdefault(ip, set()).add(port)
+
+    connects = asyncio.gather(*(connect(ip, port) for ip in ips for port in settings.discovery_ports))
+    echoes, _ = await asyncio.gather(_ping_all(ips, settings, semaphore), connects)
+
+    found = []
+    for ip in ips:
+        echo, rtt_ms = echoes.get(ip, (False, None))
+        ports = [port for port in settings.discovery_ports if port in open_ports.get(ip, ())]
+        if echo or ports:
+            found.append(DiscoveredHost(ip, echo, rtt_ms, ports))
+    return found
+
+
+class Discovery:
+    def __init__(
+        self,
+        settings: Settings,
+        registry: CameraRegistry,
+        dispatcher: NotificationDispatcher | None = None,
+        subscriptions: Subscriptions | None = None,
+    ) -> None:
+        self.settings = settings
+        self.registry = registry
+        self.dispatcher = dispatcher
+        self.subscriptions = subscriptions
+        self._sweeps: "OrderedDict[str, SweepReport]" = OrderedDict()
+        # Hosts the scheduled sweep already told subscribers about.
+        self._announced: set[str] = set()
+
+    def _remember(self, report: SweepReport) -> SweepReport:
+        self._sweeps[report.id] = report
+        while len(self._sweeps) > KEPT_SWEEPS:
+            self._sweeps.popitem(last=False)
+        return report
+
+    async def discover(self, network: ipaddress.IPv4Network) -> SweepReport:
+        started = time.monotonic()
+        report = SweepReport(str(network))
+        ips = []
+        for address in network.hosts():
+            ip = str(address)
+            if self.registry.find(ip) is None:
+                ips.append(ip)
+            else:
+                report.known += 1
+        report.scanned = len(ips)
+        report.found = await sweep(ips, self.settings)
+        report.seconds = time.monotonic() - started
+        logger.info(
+            "Swept %s: %d addresses in %.1fs, %d new hosts", network, report.scanned, report.seconds, len(report.found)
+        )
+        return self._remember(report)
+
+    # Offers --------------------------------------------------------------
+
+    def pending(self, report: SweepReport) -> List[DiscoveredHost]:
+        """Hosts of ``report`` that are still not in the registry."""
+
+        return [host for host in report.found if self.registry.find(host.ip) is None]
+
+    def report(self, sweep_id: str) -> SweepReport | None:
+        """One of the last KEPT_SWEEPS sweeps, for its enrollment buttons."""
+
+        return self._sweeps.get(sweep_id)
+
+    def offered(self, report: SweepReport, target: str) -> List[DiscoveredHost]:
+        """Hosts behind an enrollment button; ``target`` is an IP or ``all``."""
+
+        hosts = self.pending(report)
+        return hosts if target == "all" else [host for host in hosts if host.ip == target]
+
+    def enroll(self, hosts: List[DiscoveredHost]) -> List[Camera]:
+        cameras: List[Camera] = []
+        for host in hosts:
+            if self.registry.find(host.ip) is not None:
+                continue
+            camera: Camera = {
+                "id": str(uuid.uuid4()),
+                "name": f"Камера {host.ip}",
+                "ip": host.ip,
+                "enabled": True,
+                "last_status": "unknown",
+                "previous_status": "unknown",
+                "last_check_at": None,
+                "last_status_change_at": None,
+            }
+            if host.probe is not None:
+                camera["probe"] = host.probe
+            cameras.append(camera)
+        return self.registry.add_many(cameras)
+
+    def buttons(self, report: SweepReport) -> Buttons:
+        hosts = self.pending(report)
+        rows = [[[f"➕ {host.ip}", f"discover:{report.id}:{host.ip}"]] for host in hosts[:MAX_OFFER_BUTTONS]]
+        if len(hosts) > 1:
+            rows.append([[f"➕ Добавить все ({len(hosts)})", f"discover:{report.id}:all"]])
+        return rows
+
+    def message(self, report: SweepReport) -> Tuple[str, Buttons]:
+        lines = [
+            f"🔎 Сеть {report.network}: проверено адресов {report.scanned} за {report.seconds:.1f} с, "
+            f"уже в списке камер {report.known}."
+        ]
+        if not report.found:
+            lines.append("Новых устройств не найдено.")
+            return "\n".join(lines), []
+        lines.append(f"Новые устройства ({len(report.found)}):")
+        lines.extend(f"• {host.describe()}" for host in report.found[:MAX_LISTED_HOSTS])
+        if len(report.found) > MAX_LISTED_HOSTS:
+            lines.append(f"…и ещё {len(report.found) - MAX_LISTED_HOSTS}")
+        lines.append("")
+        lines.append("Нажмите кнопку, чтобы добавить устройство как камеру.")
+        return "\n".join(lines), self.buttons(report)
+
+    # Scheduled sweeps ----------------------------------------------------
+
+    async def sweep_configured(self) -> None:
+        for target in self.settings.discovery_networks:
+            try:
+                network = parse_network(target, self.settings.discovery_max_hosts)
+            except ValueError as exc:
+                logger.error("Skipping discovery of %s: %s", target, exc)
+                continue
+            report = await self.discover(network)
+            fresh = [host for host in report.found if host.ip not in self._announced]
+            self._announced.update(host.ip for host in report.found)
+            if not fresh or self.dispatcher is None or self.subscriptions is None:
+                continue
+            # Announce only what is new since the last sweep, with its own buttons.
+            announcement = self._remember(dataclasses.replace(report, found=fresh, id=uuid.uuid4().hex[:8]))
+            text, buttons = self.message(announcement)
+            self.dispatcher.enqueue_many(self.subscriptions.unmuted(), text, buttons)
+
+    async def run(self) -> None:
+        """Sweep DISCOVERY_NETWORKS every DISCOVERY_INTERVAL_SECONDS until cancelled."""
+
+        if not self.settings.discovery_networks:
+            return
+        while True:
+            try:
+                await self.sweep_configured()
+            except Exception:
+                logger.exception("Scheduled discovery sweep failed")
+            await asyncio.sleep(self.settings.discovery_interval_seconds)
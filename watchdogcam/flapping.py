@@ -0,0 +1,77 @@
+"""Flap detection for cameras whose status keeps changing.
+
+A camera with FLAP_THRESHOLD status changes within FLAP_WINDOW_SECONDS is
+flapping: subscribers get one alert saying so instead of an alert per
+change, and one more once it has settled, that is when at most half as many
+changes are left in the window.  The different thresholds for starting and
+ending keep a camera right at the limit from toggling the flap state itself.
+The change history is kept in memory only.
+"""
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable
+
+from storage import Camera
+
+FLAPPING = "flapping"
+SETTLED = "settled"
+
+
+class FlapDetector:
+    def __init__(self, window_seconds: float, threshold: int) -> None:
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        # Camera ID -> time.monotonic() of its recent status changes, oldest first.
+        self._changes: Dict[str, Deque[float]] = {}
+        self._flapping: set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def is_flapping(self, camera_id: str) -> bool:
+        return camera_id in self._flapping
+
+    def changes(self, camera_id: str, now: float | None = None) -> int:
+        """Status changes of the camera within the window."""
+
+        changes = self._changes.get(camera_id)
+        if changes is None:
+            return 0
+        cutoff = (time.monotonic() if now is None else now) - self.window_seconds
+        while changes and changes[0] <= cutoff:
+            changes.popleft()
+        if not changes:
+            del self._changes[camera_id]
+            return 0
+        return len(changes)
+
+    def update(self, changed: Iterable[Camera], checked: Iterable[Camera]) -> Dict[str, str]:
+        """Record the status changes of a cycle; returns flap events by camera ID.
+
+        ``changed`` are the cameras whose status changed, ``checked`` every
+        camera of the cycle; flapping ones among them may have settled.
+        """
+
+        if not self.enabled:
+            return {}
+        now = time.monotonic()
+        events: Dict[str, str] = {}
+        changed_ids = set()
+        for camera in changed:
+            camera_id = str(camera.get("id"))
+            changed_ids.add(camera_id)
+            self._changes.setdefault(camera_id, deque()).append(now)
+            if camera_id not in self._flapping and self.changes(camera_id, now) >= self.threshold:
+                self._flapping.add(camera_id)
+                events[camera_id] = FLAPPING
+        for camera in checked:
+            camera_id = str(camera.get("id"))
+            if (
+                camera_id in self._flapping
+                and camera_id not in changed_ids
+                and self.changes(camera_id, now) <= self.threshold // 2
+            ):
+                self._flapping.discard(camera_id)
+                events[camera_id] = SETTLED
+        return events
@@ -0,0 +1,172 @@
+"""Subprocess-free ICMP echo over a single socket.
+
+One socket is shared by the whole batch: echo requests are sent to every host
+up front (``count`` rounds, ``interval_seconds`` apart) and replies are
+matched back by source address and sequence number as they arrive.  An
+unprivileged datagram ICMP socket is preferred (Linux,
+``net.ipv4.ping_group_range``); a raw socket is used when that is not allowed.
+"""
+import asyncio
+import logging
+import os
+import socket
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+_HEADER = struct.Struct("!BBHHH")
+_TIMESTAMP = struct.Struct("!d")
+_RECEIVE_BUFFER_BYTES = 4 * 1024 * 1024
+
+
+@dataclass
+class EchoResult:
+    ip: str
+    reachable: bool
+    rtt_ms: float | None = None
+    sent: int = 0
+    received: int = 0
+
+    @property
+    def loss(self) -> float:
+        return 1 - self.received / self.sent if self.sent else 1.0
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _echo_request(identifier: int, sequence: int) -> bytes:
+    payload = _TIMESTAMP.pack(time.monotonic())
+    header = _HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = _checksum(header + payload)
+    return _HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence) + payload
+
+
+def open_icmp_socket() -> Tuple[socket.socket, bool]:
+    """Open a non-blocking ICMP socket.
+
+    Returns the socket and whether it is a raw socket.  Raises :class:`OSError`
+    when neither a datagram nor a raw ICMP socket can be created.
+    """
+
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        raw = False
+    except OSError:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        raw = True
+    try:
+        # Replies to a large batch arrive in a burst; don't let them overflow.
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _RECEIVE_BUFFER_BYTES)
+    except OSError:
+        pass
+    sock.setblocking(False)
+    return sock, raw
+
+
+def _parse_reply(packet: bytes, raw: bool) -> Tuple[int, int, float] | None:
+    if raw:
+        # Raw sockets deliver the IP header as well.
+        packet = packet[(packet[0] & 0x0F) * 4 :]
+    if len(packet) < _HEADER.size + _TIMESTAMP.size:
+        return None
+    icmp_type, _code, _checksum_value, identifier, sequence = _HEADER.unpack_from(packet)
+    if icmp_type != ICMP_ECHO_REPLY:
+        return None
+    (sent_at,) = _TIMESTAMP.unpack_from(packet, _HEADER.size)
+    return identifier, sequence, sent_at
+
+
+async def ping_many(
+    ips: Iterable[str], timeout_seconds: float = 1, count: int = 1, interval_seconds: float = 0.2
+) -> Dict[str, EchoResult]:
+    """Send ``count`` echo requests to every address in ``ips`` and collect replies.
+
+    Waits at most ``timeout_seconds`` after the last request was sent.  Hosts
+    that did not answer any request are reported as unreachable; ``rtt_ms``
+    is the average over the replies that did arrive.
+    """
+
+    targets = list(dict.fromkeys(ips))
+    results = {ip: EchoResult(ip=ip, reachable=False) for ip in targets}
+    if not targets:
+        return results
+
+    loop = asyncio.get_running_loop()
+    sock, raw = open_icmp_socket()
+    # Datagram sockets get their identifier assigned by the kernel, raw sockets
+    # see every ICMP packet on the host and have to filter by our own one.
+    identifier = os.getpid() & 0xFFFF
+    if not raw:
+        sock.bind(("", 0))
+        identifier = sock.getsockname()[1]
+
+    waiting: Dict[Tuple[str, int], str] = {}
+    rtt_totals: Dict[str, float] = {}
+    all_answered = loop.create_future()
+    sending = True
+
+    def on_readable() -> None:
+        while True:
+            try:
+                packet, address = sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                logger.debug("ICMP receive failed", exc_info=True)
+                return
+            parsed = _parse_reply(packet, raw)
+            if parsed is None:
+                continue
+            reply_identifier, sequence, sent_at = parsed
+            if raw and reply_identifier != identifier:
+                continue
+            ip = waiting.pop((address[0], sequence), None)
+            if ip is None:
+                continue
+            result = results[ip]
+            rtt_totals[ip] = rtt_totals.get(ip, 0.0) + (time.monotonic() - sent_at) * 1000
+            result.received += 1
+            result.reachable = True
+            result.rtt_ms = rtt_totals[ip] / result.received
+            if not waiting and not sending and not all_answered.done():
+                all_answered.set_result(None)
+
+    loop.add_reader(sock.fileno(), on_readable)
+    try:
+        sequence = 0
+        for attempt in range(count):
+            if attempt:
+                await asyncio.sleep(interval_seconds)
+            for ip in targets:
+                sequence = (sequence + 1) & 0xFFFF
+                waiting[(ip, sequence)] = ip
+                results[ip].sent += 1
+                try:
+                    await loop.sock_sendto(sock, _echo_request(identifier, sequence), (ip, 0))
+                except OSError as exc:
+                    waiting.pop((ip, sequence), None)
+                    logger.debug("ICMP send to %s failed: %s", ip, exc)
+        sending = False
+        if waiting:
+            try:
+                await asyncio.wait_for(asyncio.shield(all_answered), timeout=timeout_seconds)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        loop.remove_reader(sock.fileno())
+        sock.close()
+
+    return results
@@ -0,0 +1,137 @@
+"""Snapshot + append-only journal storage backend.
+
+The cameras file remains the snapshot.  Instead of rewriting it on every
+flush, pending changes are appended to a journal as compact JSON lines:
+
+* ``{"d": "<id>"}`` — camera removed;
+* ``{"t": "<timestamp>", "ids": [...]}`` or ``{"t": "<timestamp>", "skip": [...]}``
+  — ``last_check_at`` set for the listed cameras, or for every camera except
+  the listed ones (whichever is shorter);
+* ``{"c": {...}}`` — full camera record, for added, edited or changed cameras.
+
+On load the journal is replayed over the snapshot.  Once the journal grows
+past the compaction threshold it is folded into a fresh snapshot and
+truncated.  Replaying is idempotent, so a crash between writing the snapshot
+and truncating the journal is harmless.
+"""
+import json
+import logging
+import uuid
+from pathlib import Path
+from typing import Collection, Dict, List
+
+from storage import (
+    Camera,
+    SubscriberId,
+    read_cameras,
+    read_subscribers,
+    write_cameras,
+    write_subscribers,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+class JournalStore:
+    def __init__(
+        self,
+        cameras_file: Path,
+        subscribers_file: Path,
+        journal_file: Path,
+        compact_bytes: int = 1024 * 1024,
+    ) -> None:
+        self.cameras_file = cameras_file
+        self.subscribers_file = subscribers_file
+        self.journal_file = journal_file
+        self.compact_bytes = compact_bytes
+
+    def load_cameras(self) -> List[Camera]:
+        snapshot = read_cameras(self.cameras_file)
+        if any(not camera.get("id") for camera in snapshot):
+            # Journal records refer to cameras by ID, so legacy entries get
+            # a stable one in the snapshot before anything is journaled.
+            for camera in snapshot:
+                if not camera.get("id"):
+                    camera["id"] = str(uuid.uuid4())
+            write_cameras(self.cameras_file, snapshot)
+
+        cameras: Dict[str, Camera] = {str(camera["id"]): camera for camera in snapshot}
+        if not self.journal_file.exists():
+            return list(cameras.values())
+
+        applied = 0
+        with self.journal_file.open("r", encoding="utf-8") as fh:
+            for line_number, line in enumerate(fh, start=1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Most likely a write torn by a crash; everything before it is intact.
+                    logger.warning("Ignoring unreadable journal line %d in %s", line_number, self.journal_file)
+                    continue
+                self._apply(cameras, record)
+                applied += 1
+        logger.info("Replayed %d journal records from %s", applied, self.journal_file)
+        return list(cameras.values())
+
+    @staticmethod
+    def _apply(cameras: Dict[str, Camera], record: dict) -> None:
+        if "c" in record:
+            camera = record["c"]
+            cameras[str(camera.get("id"))] = camera
+        elif "d" in record:
+            cameras.pop(str(record["d"]), None)
+        elif "t" in record:
+            if "ids" in record:
+                targets = [cameras[camera_id] for camera_id in record["ids"] if camera_id in cameras]
+            else:
+                skip = set(record.get("skip", ()))
+                targets = [camera for camera_id, camera in cameras.items() if camera_id not in skip]
+            for camera in targets:
+                camera["last_check_at"] = record["t"]
+
+    def save_cameras(
+        self,
+        cameras: List[Camera],
+        changed: List[Camera],
+        removed: Collection[str],
+        checked: Dict[str, Collection[str]],
+    ) -> None:
+        lines = [_dumps({"d": camera_id}) for camera_id in removed]
+        for checked_at, camera_ids in checked.items():
+            ids = set(camera_ids)
+            if len(ids) * 2 > len(cameras):
+                skip = [str(camera.get("id")) for camera in cameras if str(camera.get("id")) not in ids]
+                lines.append(_dumps({"t": checked_at, "skip": skip}))
+            else:
+                lines.append(_dumps({"t": checked_at, "ids": sorted(ids)}))
+        lines.extend(_dumps({"c": camera}) for camera in changed)
+        if not lines:
+            return
+
+        self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+        with self.journal_file.open("a", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+            size = fh.tell()
+
+        if size >= self.compact_bytes:
+            self.compact(cameras)
+
+    def compact(self, cameras: List[Camera]) -> None:
+        """Write ``cameras`` as the new snapshot and start an empty journal."""
+
+        write_cameras(self.cameras_file, cameras)
+        self.journal_file.write_text("", encoding="utf-8")
+        logger.info("Compacted journal %s into %s", self.journal_file, self.cameras_file)
+
+    def read_subscribers(self) -> list[SubscriberId]:
+        return read_subscribers(self.subscribers_file)
+
+    def write_subscribers(self, subscribers: list[SubscriberId]) -> None:
+        write_subscribers(self.subscribers_file, subscribers)
+
+    def close(self) -> None:
+        pass
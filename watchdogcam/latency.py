@@ -0,0 +1,162 @@
+"""Per-camera round-trip time and packet loss history.
+
+Every probe result is recorded in two fixed-size ring buffers per camera: RTT
+as 32-bit floats (NaN when nothing answered) and loss as a whole percentage in
+one byte.  A camera with the default 64 samples costs 320 bytes of array
+storage instead of a list of dicts in the cameras file.  History is kept in
+memory only and starts empty after a restart.
+
+Fleet-wide percentiles come from a histogram of every buffered RTT sample in
+log-spaced buckets that grow by 2%, kept up to date as samples are added and
+evicted; reading them walks the buckets instead of sorting the whole fleet,
+and the value reported is within about 1% of the exact percentile.
+"""
+import math
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+from probes import ProbeResult
+from registry import CameraRegistry
+from storage import Camera
+
+PERCENTILES = (50, 95, 99)
+
+# Fleet histogram buckets: [HISTOGRAM_MIN_MS * HISTOGRAM_GROWTH**(i-1), ... ** i) for i >= 1;
+# bucket 0 holds everything below HISTOGRAM_MIN_MS and the last one everything above the range.
+HISTOGRAM_MIN_MS = 0.01
+HISTOGRAM_GROWTH = 1.02
+HISTOGRAM_BUCKETS = 2 + math.ceil(math.log(600_000 / HISTOGRAM_MIN_MS) / math.log(HISTOGRAM_GROWTH))
+
+
+class RingBuffer:
+    """Fixed-capacity buffer over an :class:`array.array` that overwrites the oldest value."""
+
+    __slots__ = ("_data", "_next", "_size")
+
+    def __init__(self, typecode: str, capacity: int) -> None:
+        self._data = array(typecode, bytes(array(typecode).itemsize * capacity))
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float) -> float | None:
+        """Store ``value``; returns the value it overwrote, if the buffer was full."""
+
+        evicted = self._data[self._next] if self._size == len(self._data) else None
+        self._data[self._next] = value
+        self._next = (self._next + 1) % len(self._data)
+        self._size = min(self._size + 1, len(self._data))
+        return evicted
+
+    def values(self) -> List[float]:
+        """Return the stored values, oldest first."""
+
+        if self._size < len(self._data):
+            return self._data[: self._size].tolist()
+        return (self._data[self._next :] + self._data[: self._next]).tolist()
+
+    def last(self) -> float | None:
+        return self._data[self._next - 1] if self._size else None
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _bucket(rtt_ms: float) -> int:
+    if rtt_ms < HISTOGRAM_MIN_MS:
+        return 0
+    return min(HISTOGRAM_BUCKETS - 1, 1 + int(math.log(rtt_ms / HISTOGRAM_MIN_MS) / math.log(HISTOGRAM_GROWTH)))
+
+
+def _bucket_value(index: int) -> float:
+    """The geometric middle of a bucket, the value reported for samples in it."""
+
+    if index == 0:
+        return HISTOGRAM_MIN_MS
+    return HISTOGRAM_MIN_MS * HISTOGRAM_GROWTH ** (index - 0.5)
+
+
+class LatencyHistory:
+    def __init__(self, capacity: int = 64, registry: CameraRegistry | None = None) -> None:
+        self.capacity = max(1, capacity)
+        self._rtt: Dict[str, RingBuffer] = {}
+        self._loss: Dict[str, RingBuffer] = {}
+        # Count of buffered RTT samples per bucket, over every camera.
+        self._histogram = array("L", bytes(array("L").itemsize * HISTOGRAM_BUCKETS))
+        self._histogram_size = 0
+        if registry is not None:
+            registry.add_listener(self._on_camera_changed)
+
+    def _on_camera_changed(self, camera_id: str, camera: Camera | None) -> None:
+        if camera is None:
+            rtt = self._rtt.pop(camera_id, None)
+            self._loss.pop(camera_id, None)
+            if rtt is not None:
+                for value in rtt.values():
+                    self._forget(value)
+
+    def _forget(self, rtt_ms: float | None) -> None:
+        if rtt_ms is not None and not math.isnan(rtt_ms):
+            self._histogram[_bucket(rtt_ms)] -= 1
+            self._histogram_size -= 1
+
+    def record(self, camera_id: str, result: ProbeResult) -> None:
+        rtt = self._rtt.get(camera_id)
+        if rtt is None:
+            rtt = self._rtt[camera_id] = RingBuffer("f", self.capacity)
+            self._loss[camera_id] = RingBuffer("B", self.capacity)
+        loss = result.loss if result.loss is not None else (0.0 if result.online else 1.0)
+        self._forget(rtt.append(result.rtt_ms if result.online and result.rtt_ms is not None else math.nan))
+        # Bucket the stored 32-bit value so that evicting it later hits the same bucket.
+        stored = rtt.last()
+        if stored is not None and not math.isnan(stored):
+            self._histogram[_bucket(stored)] += 1
+            self._histogram_size += 1
+        self._loss[camera_id].append(round(loss * 100))
+
+    def record_many(self, results: Iterable[Tuple[str, ProbeResult]]) -> None:
+        for camera_id, result in results:
+            self.record(camera_id, result)
+
+    def samples(self, camera_id: str) -> Tuple[List[float], List[float]]:
+        """Return the RTT samples that got a reply and the loss percentages, oldest first."""
+
+        rtt = self._rtt.get(camera_id)
+        if rtt is None:
+            return [], []
+        return [value for value in rtt.values() if not math.isnan(value)], self._loss[camera_id].values()
+
+    def last(self, camera_id: str) -> Tuple[float | None, float | None]:
+        """Return the last RTT (``None`` without a reply) and loss percentage."""
+
+        rtt = self._rtt.get(camera_id)
+        if rtt is None:
+            return None, None
+        value = rtt.last()
+        return (None if value is None or math.isnan(value) else value), self._loss[camera_id].last()
+
+    def camera_percentiles(self, camera_id: str) -> Dict[int, float]:
+        ordered = sorted(self.samples(camera_id)[0])
+        return {percent: percentile(ordered, percent) for percent in PERCENTILES} if ordered else {}
+
+    def fleet_percentiles(self) -> Dict[int, float]:
+        """Nearest-rank percentiles over every buffered RTT sample, read from the fleet histogram."""
+
+        if not self._histogram_size:
+            return {}
+        ranks = [(percent, max(1, math.ceil(percent / 100 * self._histogram_size))) for percent in PERCENTILES]
+        result: Dict[int, float] = {}
+        seen = 0
+        for index, count in enumerate(self._histogram):
+            seen += count
+            while ranks and ranks[0][1] <= seen:
+                result[ranks.pop(0)[0]] = _bucket_value(index)
+            if not ranks:
+                break
+        return result
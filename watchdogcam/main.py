@@ -1,21 +1,39 @@
 import asyncio
 import logging
+import sys
 
 from config import SettingsError, load_settings
-from bot import run_bot
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 
 def main() -> None:
+    mode = sys.argv[1] if sys.argv[1:2] in (["agent"], ["check"]) else "bot"
+    if mode == "check":
+        # Parsed first so that --help works without any settings.
+        from cli import parse_args
+
+        args = parse_args(sys.argv[2:])
     try:
-        settings = load_settings()
+        settings = load_settings(agent=mode == "agent", headless=mode == "check")
     except SettingsError as exc:
         logger.error("Настройки недействительны: %s", exc)
         raise SystemExit(1) from exc
 
-    asyncio.run(run_bot(settings))
+    # Imported lazily so that probe agents and headless checks do not need the Telegram library.
+    if mode == "agent":
+        from agent import run_agent
+
+        asyncio.run(run_agent(settings))
+    elif mode == "check":
+        from cli import run_check
+
+        raise SystemExit(asyncio.run(run_check(settings, args)))
+    else:
+        from bot import run_bot
+
+        asyncio.run(run_bot(settings))
 
 
 if __name__ == "__main__":
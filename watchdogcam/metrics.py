@@ -0,0 +1,220 @@
+"""Prometheus-style metrics with no external dependencies.
+
+Metrics are module-level objects that the hot paths update directly; an
+update is a dict lookup plus an addition (and a bisect for histograms), cheap
+enough to stay on permanently.  Values owned by other objects (status counts,
+dispatcher counters) are read through callbacks at scrape time only.
+:func:`render` produces the text exposition format served on ``/metrics``.
+"""
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from httpserver import Request, Response
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._callback: Callable[[], Dict[LabelValues, float]] | None = None
+        REGISTRY.append(self)
+
+    def set_function(self, callback: Callable[[], Dict[LabelValues, float] | float]) -> None:
+        """Read the value(s) from ``callback`` at scrape time instead of storing them."""
+
+        if self.label_names:
+            self._callback = callback  # type: ignore[assignment]
+        else:
+            self._callback = lambda: {(): callback()}  # type: ignore[dict-item]
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterable[str]:
+        values = self._callback() if self._callback is not None else self._values
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf), sum.
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def samples(self) -> Iterable[str]:
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_label = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, labels, bucket_label)} {cumulative}"
+            rendered = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{rendered} {_format_value(self._sums[labels])}"
+            yield f"{self.name}_count{rendered} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: Histogram, labels: LabelValues) -> None:
+        self._histogram = histogram
+        self._labels = labels
+        self._started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+
+
+REGISTRY: List[Metric] = []
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception:
+            logger.exception("Failed to collect metric %s", metric.name)
+    return "\n".join(lines) + "\n"
+
+
+# Metrics ------------------------------------------------------------------
+
+CHECK_CYCLE_SECONDS = Histogram(
+    "watchdogcam_check_cycle_seconds",
+    "Duration of check cycles; kind is full (every camera) or batch (scheduler).",
+    labels=("kind",),
+)
+PROBE_RTT_SECONDS = Histogram(
+    "watchdogcam_probe_rtt_seconds",
+    "Round-trip time reported by probes that got an answer.",
+    labels=("probe",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+PROBES_TOTAL = Counter(
+    "watchdogcam_probes_total", "Finished probes by probe type and result.", labels=("probe", "result")
+)
+CONFIRMATIONS = Counter(
+    "watchdogcam_probe_confirmations_total",
+    "Probe results that contradicted the camera status, by whether confirmation probes upheld them.",
+    labels=("outcome",),
+)
+CAMERAS = Gauge("watchdogcam_cameras", "Enabled cameras by status.", labels=("status",))
+NOTIFICATION_ATTEMPTS = Counter("watchdogcam_notification_attempts_total", "Telegram send attempts.")
+NOTIFICATIONS_SENT = Counter("watchdogcam_notifications_sent_total", "Notifications delivered.")
+NOTIFICATION_FAILURES = Counter("watchdogcam_notification_failures_total", "Notifications dropped or given up on.")
+NOTIFICATION_RETRIES = Counter(
+    "watchdogcam_notification_retries_total", "Send retries after flood control or transient errors."
+)
+NOTIFICATION_BACKLOG = Gauge("watchdogcam_notification_backlog", "Notifications waiting for delivery.")
+STORAGE_SECONDS = Histogram(
+    "watchdogcam_storage_seconds", "Time spent in storage backend calls.", labels=("operation",)
+)
+PROBE_AGENTS = Gauge("watchdogcam_probe_agents", "Connected probe agents.")
+AGENT_CAMERAS = Gauge("watchdogcam_agent_cameras", "Cameras assigned to each probe agent.", labels=("agent",))
+AGENT_RESULTS = Counter(
+    "watchdogcam_agent_results_total", "Probe results received from agents.", labels=("agent", "outcome")
+)
+WEBHOOK_UPDATES = Counter(
+    "watchdogcam_webhook_updates_total", "Telegram updates received over the webhook.", labels=("outcome",)
+)
+UPDATE_SECONDS = Histogram("watchdogcam_update_seconds", "Time spent handling one Telegram update.")
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "watchdogcam_event_loop_lag_seconds",
+    "How late the event loop woke up a periodic timer.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+async def handle_metrics(request: Request) -> Response:
+    return Response(body=render().encode("utf-8"), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Observe how late a periodic sleep wakes up; runs until cancelled."""
+
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - interval))
@@ -1,15 +1,38 @@
+import asyncio
 import logging
+import time
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
-from typing import List
-
-from telegram import Bot
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
 
 from config import Settings
-from ping import ping_host
-from storage import Camera, read_cameras, read_subscribers, write_cameras
+from flapping import FLAPPING, SETTLED, FlapDetector
+from icmp import EchoResult, ping_many
+from latency import LatencyHistory
+from metrics import CHECK_CYCLE_SECONDS, CONFIRMATIONS, PROBE_RTT_SECONDS, PROBES_TOTAL, STORAGE_SECONDS
+from probes import IcmpProbe, Probe, ProbeResult, probe_for_camera
+from registry import CameraRegistry
+from storage import Camera
+from topology import DOWN_STATUSES, Topology
+
+if TYPE_CHECKING:
+    # Only for annotations: probe agents import this module without Telegram.
+    from agents import AgentPool
+    from neighbors import NeighborSnapshot, PassiveLiveness
+    from notifier import NotificationDispatcher
+    from profiling import CycleProfiler, ProfileSession
+    from subscriptions import Subscriptions
 
 logger = logging.getLogger(__name__)
 
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Telegram counts UTF-16 code units, so emoji take two; keep some headroom.
+SAFE_MESSAGE_LENGTH = TELEGRAM_MESSAGE_LIMIT - 96
+# Status of cameras behind a failed upstream node; they are not probed.
+UNREACHABLE = "unreachable"
+# Statuses a probe result has to contradict CONFIRM_RESULTS times in a row to change.
+CONFIRMED_STATUSES = ("online", "degraded", "offline")
+
 
 def _timestamp() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
@@ -19,40 +42,173 @@ def _human_time() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M")
 
 
-def _status_message(camera: Camera) -> str | None:
+def _transition(camera: Camera) -> str | None:
+    """Classify the last status change as ``down``, ``up``, ``degraded`` or ``recovered``.
+
+    Becoming ``unreachable`` and coming back from it are not reported for the
+    camera itself: the failed upstream node is reported instead.  A camera
+    found ``offline`` once its upstream node is back is reported as down.
+    """
+
     previous = camera.get("previous_status")
     current = camera.get("last_status")
-    if previous == "online" and current == "offline":
-        return (
-            "⚠️ Камера перестала отвечать\n"
-            f"Название: {camera.get('name')}\n"
-            f"IP: {camera.get('ip')}\n"
-            f"Время: {_human_time()}"
-        )
-    if previous == "offline" and current == "online":
-        return (
-            "✅ Камера снова в сети\n"
-            f"Название: {camera.get('name')}\n"
-            f"IP: {camera.get('ip')}\n"
-            f"Время: {_human_time()}"
-        )
+    if previous in ("online", "degraded", UNREACHABLE) and current == "offline":
+        return "down"
+    if previous == "offline" and current in ("online", "degraded"):
+        return "up"
+    if previous == "online" and current == "degraded":
+        return "degraded"
+    if previous == "degraded" and current == "online":
+        return "recovered"
     return None
 
 
-def update_camera_status(camera: Camera, ping_timeout: int) -> Camera:
-    if not camera.get("enabled", True):
-        return camera
+_TRANSITION_TITLES = {
+    "down": "⚠️ Камера перестала отвечать",
+    "up": "✅ Камера снова в сети",
+    "degraded": "📶 Камера отвечает с большими задержками или потерями",
+    "recovered": "✅ Связь с камерой снова в норме",
+    FLAPPING: "🔁 Статус камеры постоянно меняется, уведомления о ней приостановлены",
+    SETTLED: "✅ Статус камеры стабилизировался, уведомления возобновлены",
+}
 
-    ip = str(camera.get("ip"))
-    name = camera.get("name", "Unknown")
 
-    logger.info("Pinging camera %s (%s)", name, ip)
-    is_online = ping_host(ip, timeout_seconds=ping_timeout)
-    logger.info("Ping result for %s (%s): %s", name, ip, "online" if is_online else "offline")
+def _notification_kind(camera: Camera, flap_events: Dict[str, str]) -> str | None:
+    """The transition to report for ``camera``; a flap event replaces it."""
+
+    return flap_events.get(str(camera.get("id"))) or _transition(camera)
+
+
+def _status_message(camera: Camera, behind: int = 0, flap_event: str | None = None) -> str | None:
+    transition = flap_event or _transition(camera)
+    if transition is None:
+        return None
+    message = f"{_TRANSITION_TITLES[transition]}\nНазвание: {camera.get('name')}\nIP: {camera.get('ip')}\n"
+    if flap_event:
+        message += f"Статус: {camera.get('last_status')}\n"
+    if behind:
+        message += f"Недоступны камеры за этим узлом: {behind}\n"
+    return message + f"Время: {_human_time()}"
+
+
+def split_message(text: str, limit: int = SAFE_MESSAGE_LENGTH) -> List[str]:
+    """Split ``text`` into chunks of at most ``limit`` characters on line breaks."""
+
+    chunks: List[str] = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+_DIGEST_TITLES = {
+    "down": "⚠️ Перестали отвечать",
+    "up": "✅ Снова в сети",
+    "degraded": "📶 С задержками или потерями",
+    "recovered": "✅ Связь в норме",
+    FLAPPING: "🔁 Статус постоянно меняется, уведомления приостановлены",
+    SETTLED: "✅ Статус стабилизировался",
+}
+
+
+def _digest_messages(cameras: List[Camera], behind: Dict[str, int], flap_events: Dict[str, str]) -> List[str]:
+    """One summary for many transitions, grouped by direction and split to fit Telegram."""
+
+    groups: Dict[str, List[Camera]] = {}
+    for camera in cameras:
+        groups.setdefault(_notification_kind(camera, flap_events) or "", []).append(camera)
+
+    lines = [f"📣 Изменения статуса камер: {len(cameras)}", f"Время: {_human_time()}"]
+    for transition, title in _DIGEST_TITLES.items():
+        group = groups.get(transition)
+        if group:
+            lines.append("")
+            lines.append(f"{title} ({len(group)}):")
+            for camera in group:
+                hidden = behind.get(str(camera.get("id")))
+                suffix = f" (за узлом недоступны: {hidden})" if hidden else ""
+                lines.append(f"• {camera.get('name')} – {camera.get('ip')}{suffix}")
+
+    text = "\n".join(lines)
+    if len(text) <= SAFE_MESSAGE_LENGTH:
+        return [text]
+    # Leave room for the "(i/n) " prefix.
+    chunks = split_message(text, SAFE_MESSAGE_LENGTH - 16)
+    return [f"({index}/{len(chunks)}) {chunk}" for index, chunk in enumerate(chunks, start=1)]
+
+
+def _compose_notifications(
+    cameras: List[Camera],
+    digest_threshold: int,
+    behind: Dict[str, int] | None = None,
+    flap_events: Dict[str, str] | None = None,
+) -> List[str]:
+    """Messages for ``cameras``; ``behind`` counts cameras cut off by each failed node.
+
+    ``flap_events`` maps cameras that started or stopped flapping to
+    :data:`~flapping.FLAPPING` or :data:`~flapping.SETTLED`.
+    """
+
+    behind = behind or {}
+    flap_events = flap_events or {}
+    if len(cameras) > digest_threshold:
+        return _digest_messages(cameras, behind, flap_events)
+    messages = (
+        _status_message(camera, behind.get(str(camera.get("id")), 0), flap_events.get(str(camera.get("id"))))
+        for camera in cameras
+    )
+    return [message for message in messages if message]
+
+
+def _queue_notifications(
+    dispatcher: "NotificationDispatcher",
+    changes_by_recipient: Dict[int, List[Camera]],
+    settings: Settings,
+    behind: Dict[str, int] | None = None,
+    flap_events: Dict[str, str] | None = None,
+) -> None:
+    # Recipients interested in the same cameras share the composed messages.
+    composed: Dict[Tuple[str, ...], List[str]] = {}
+    for recipient, cameras in changes_by_recipient.items():
+        if not cameras:
+            continue
+        key = tuple(str(camera.get("id")) for camera in cameras)
+        messages = composed.get(key)
+        if messages is None:
+            messages = composed[key] = _compose_notifications(cameras, settings.digest_threshold, behind, flap_events)
+        for message in messages:
+            dispatcher.enqueue(recipient, message)
+
+
+def _status_fields(camera: Camera) -> tuple:
+    return camera.get("last_status"), camera.get("previous_status"), camera.get("last_status_change_at")
 
-    new_status = "online" if is_online else "offline"
 
-    previous_status = camera.get("last_status", "unknown")
+def _classify(result: ProbeResult, settings: Settings) -> str:
+    if not result.online:
+        return "offline"
+    if result.loss is not None and result.loss * 100 >= settings.degraded_loss_percent:
+        return "degraded"
+    if result.rtt_ms is not None and result.rtt_ms >= settings.degraded_rtt_ms:
+        return "degraded"
+    return "online"
+
+
+def _apply_probe_result(camera: Camera, new_status: str) -> Camera:
+    previous_status = camera.get("last_status") or "unknown"
     camera["previous_status"] = previous_status
     camera["last_status"] = new_status
     camera["last_check_at"] = _timestamp()
@@ -63,28 +219,510 @@ def update_camera_status(camera: Camera, ping_timeout: int) -> Camera:
     return camera
 
 
-async def check_cameras(settings: Settings, bot: Bot) -> List[str]:
-    cameras = read_cameras(settings.cameras_file)
-    subscribers = read_subscribers(settings.subscribers_file)
-    notifications: List[str] = []
+def _mark_unreachable(camera: Camera) -> None:
+    """Like a probe result, except that ``last_check_at`` keeps the time of the last real probe."""
+
+    previous_status = camera.get("last_status") or "unknown"
+    camera["previous_status"] = previous_status
+    camera["last_status"] = UNREACHABLE
+    if previous_status != UNREACHABLE:
+        camera["last_status_change_at"] = _timestamp()
+
+
+def _cascade_unreachable(
+    topology: Topology, registry: CameraRegistry, cameras: Iterable[Camera], before: Dict[int, tuple]
+) -> List[Camera]:
+    """Mark every enabled camera behind the ones of ``cameras`` that are down as unreachable."""
 
+    marked: List[Camera] = []
     for camera in cameras:
-        if not camera.get("enabled", True):
+        if camera.get("last_status") not in DOWN_STATUSES:
             continue
-        update_camera_status(camera, settings.ping_timeout_seconds)
-        msg = _status_message(camera)
-        if msg:
-            notifications.append(msg)
+        for child_id in topology.descendants(str(camera.get("id"))):
+            child = registry.get(child_id)
+            if child is None or not child.get("enabled", True) or child.get("last_status") == UNREACHABLE:
+                continue
+            before.setdefault(id(child), _status_fields(child))
+            _mark_unreachable(child)
+            marked.append(child)
+    return marked
+
+
+async def _run_probe(camera: Camera, settings: Settings, probe: Probe, attempts: int | None = None) -> ProbeResult:
+    ip = str(camera.get("ip"))
+    name = camera.get("name", "Unknown")
+    timeout = settings.ping_timeout_seconds if isinstance(probe, IcmpProbe) else settings.probe_timeout_seconds
+
+    logger.debug("Probing camera %s (%s) via %s", name, ip, probe.kind)
+    result = await probe.check(ip, timeout, attempts=attempts or settings.echo_attempts)
+    logger.debug(
+        "Probe result for %s (%s): %s%s%s",
+        name,
+        ip,
+        "online" if result.online else "offline",
+        f", {result.rtt_ms:.1f} ms" if result.rtt_ms is not None else "",
+        f" ({result.error})" if result.error else "",
+    )
+    return result
+
+
+def _routine_attempts(settings: Settings) -> int:
+    """Echo requests of a routine probe: one when status changes are confirmed anyway."""
+
+    return 1 if settings.confirm_results > 1 else settings.echo_attempts
+
+
+def _disputed(camera: Camera, result: ProbeResult, settings: Settings) -> bool:
+    """Whether ``result`` contradicts the status of ``camera`` and has to be confirmed."""
+
+    previous = camera.get("last_status")
+    return previous in CONFIRMED_STATUSES and _classify(result, settings) != previous
+
+
+async def _confirm(
+    camera: Camera,
+    settings: Settings,
+    probe: Probe,
+    result: ProbeResult,
+    semaphore: asyncio.Semaphore,
+) -> ProbeResult:
+    """Re-probe a camera whose ``result`` contradicts its status, with backoff.
+
+    Stops at the first result that agrees with the status or once
+    ``settings.confirm_results`` results in a row disagree; the last result
+    is the one to apply.  Each re-probe holds ``semaphore``, the backoff
+    sleeps between them do not.
+    """
+
+    delay = settings.confirm_backoff_seconds
+    confirmations = 1
+    while confirmations < settings.confirm_results and _disputed(camera, result, settings):
+        await asyncio.sleep(delay)
+        delay *= 2
+        async with semaphore:
+            result = await _run_probe(camera, settings, probe)
+        confirmations += 1
+    if confirmations > 1:
+        CONFIRMATIONS.inc("confirmed" if _disputed(camera, result, settings) else "rejected")
+    return result
+
+
+def _echo_results(cameras: List[Camera], echoes: Dict[str, EchoResult]) -> Dict[int, ProbeResult]:
+    results: Dict[int, ProbeResult] = {}
+    for camera in cameras:
+        echo = echoes[str(camera.get("ip"))]
+        results[id(camera)] = ProbeResult(
+            online=echo.reachable,
+            rtt_ms=echo.rtt_ms,
+            loss=echo.loss,
+            error=None if echo.reachable else "no echo reply",
+        )
+    return results
+
+
+async def _ping_cameras_batch(cameras: List[Camera], settings: Settings) -> Dict[int, ProbeResult] | None:
+    """Probe ``cameras`` with a single ICMP socket.
+
+    Results that contradict a camera's status are confirmed like in
+    :func:`_confirm`, with one batch ping per round for all disputed cameras.
+    Returns the results keyed by ``id(camera)``, or ``None`` when no ICMP
+    socket can be opened so the caller can fall back to the subprocess pinger.
+    """
+
+    ips = [str(camera.get("ip")) for camera in cameras]
+    try:
+        echoes = await ping_many(
+            ips, timeout_seconds=settings.ping_timeout_seconds, count=_routine_attempts(settings)
+        )
+    except OSError as exc:
+        logger.warning("ICMP socket unavailable (%s), falling back to subprocess ping", exc)
+        return None
+    results = _echo_results(cameras, echoes)
+
+    delay = settings.confirm_backoff_seconds
+    disputed = [camera for camera in cameras if _disputed(camera, results[id(camera)], settings)]
+    confirming = list(disputed)
+    for _round in range(settings.confirm_results - 1):
+        if not confirming:
+            break
+        await asyncio.sleep(delay)
+        delay *= 2
+        try:
+            echoes = await ping_many(
+                [str(camera.get("ip")) for camera in confirming],
+                timeout_seconds=settings.ping_timeout_seconds,
+                count=settings.echo_attempts,
+            )
+        except OSError as exc:
+            # Without confirmation the disputed results must not change any status.
+            logger.warning("ICMP socket unavailable (%s), keeping the status of %d cameras", exc, len(confirming))
+            for camera in confirming:
+                del results[id(camera)]
+            break
+        results.update(_echo_results(confirming, echoes))
+        confirming = [camera for camera in confirming if _disputed(camera, results[id(camera)], settings)]
+    if settings.confirm_results > 1:
+        for camera in disputed:
+            if id(camera) in results:
+                CONFIRMATIONS.inc("confirmed" if _disputed(camera, results[id(camera)], settings) else "rejected")
+
+    for camera in cameras:
+        if id(camera) in results:
+            _apply_probe_result(camera, _classify(results[id(camera)], settings))
+    return results
+
+
+def observe_probe(kind: str, result: ProbeResult) -> None:
+    PROBES_TOTAL.inc(kind, "online" if result.online else "offline")
+    if result.online and result.rtt_ms is not None:
+        PROBE_RTT_SECONDS.observe(result.rtt_ms / 1000, kind)
+
+
+async def probe_cameras(
+    cameras: List[Camera], settings: Settings, neighbors: "NeighborSnapshot | None" = None
+) -> List[Tuple[Camera, ProbeResult]]:
+    """Probe ``cameras`` concurrently and return the ones that finished in time with their results.
 
-    write_cameras(settings.cameras_file, cameras)
+    Each camera is checked with the probe configured in its ``probe`` field.
+    In ``icmp`` ping mode all ICMP-probed cameras share one batch socket.
+    Cameras that ``neighbors`` vouches for are counted online without a probe.
 
-    unique_recipients = set(subscribers)
+    At most ``settings.probe_concurrency`` probes run at once, so a cycle takes
+    roughly ``len(cameras) / probe_concurrency`` probe timeouts.  Probes still
+    running when ``settings.check_deadline_seconds`` expires are cancelled and
+    their cameras keep the previous status until the next cycle.
+    """
 
-    for note in notifications:
-        for recipient in unique_recipients:
+    passive: List[Tuple[Camera, ProbeResult]] = []
+    if neighbors is not None:
+        skipped, cameras = neighbors.split(cameras)
+        for camera in skipped:
+            result = ProbeResult(online=True, passive=True)
+            _apply_probe_result(camera, "online")
+            observe_probe("neighbor", result)
+            passive.append((camera, result))
+        if skipped:
+            logger.debug("Counted %d cameras online from the neighbor table", len(skipped))
+    if not cameras:
+        return passive
+
+    semaphore = asyncio.Semaphore(settings.probe_concurrency)
+    finished: Dict[int, ProbeResult] = {}
+
+    camera_probes = {id(camera): probe_for_camera(camera) for camera in cameras}
+
+    async def probe(camera: Camera) -> None:
+        async with semaphore:
+            try:
+                result = await _run_probe(camera, settings, camera_probes[id(camera)], _routine_attempts(settings))
+            except Exception:
+                logger.exception("Probe failed for camera %s", camera.get("ip"))
+                return
+        if _disputed(camera, result, settings):
+            # The backoff must not hold a probe slot; each re-probe takes one.
             try:
-                await bot.send_message(chat_id=recipient, text=note)
-            except Exception:  # Telegram errors should not stop monitoring
-                logger.exception("Failed to send notification")
+                result = await _confirm(camera, settings, camera_probes[id(camera)], result, semaphore)
+            except Exception:
+                logger.exception("Confirmation probe failed for camera %s", camera.get("ip"))
+                return
+        _apply_probe_result(camera, _classify(result, settings))
+        observe_probe(camera_probes[id(camera)].kind, result)
+        finished[id(camera)] = result
+
+    async def probe_batch(batch: List[Camera]) -> None:
+        results = await _ping_cameras_batch(batch, settings)
+        if results is None:
+            await asyncio.gather(*(probe(camera) for camera in batch))
+            return
+        for result in results.values():
+            observe_probe("icmp", result)
+        finished.update(results)
+
+    individual = cameras
+    coroutines = []
+    if settings.ping_mode == "icmp":
+        batch = [camera for camera in cameras if isinstance(camera_probes[id(camera)], IcmpProbe)]
+        if batch:
+            individual = [camera for camera in cameras if not isinstance(camera_probes[id(camera)], IcmpProbe)]
+            coroutines.append(probe_batch(batch))
+    coroutines.extend(probe(camera) for camera in individual)
+
+    tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+    deadline = settings.check_deadline_seconds if settings.check_deadline_seconds > 0 else None
+    _done, pending = await asyncio.wait(tasks, timeout=deadline)
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    probed = [(camera, finished[id(camera)]) for camera in cameras if id(camera) in finished]
+    if neighbors is not None:
+        neighbors.probed(str(camera.get("id")) for camera, _result in probed)
+    if len(probed) < len(cameras):
+        logger.warning(
+            "Check cycle deadline of %ss reached, %d of %d cameras were not probed",
+            settings.check_deadline_seconds,
+            len(cameras) - len(probed),
+            len(cameras),
+        )
+    return passive + probed
+
+
+def _finish_cycle(
+    settings: Settings,
+    registry: CameraRegistry,
+    dispatcher: "NotificationDispatcher | None",
+    results: List[Tuple[Camera, ProbeResult]],
+    before: Dict[int, tuple],
+    history: LatencyHistory | None,
+    unreachable: List[Camera] | None = None,
+    topology: Topology | None = None,
+    subscriptions: "Subscriptions | None" = None,
+    flaps: FlapDetector | None = None,
+) -> List[str]:
+    """Persist the applied ``results`` and queue notifications; ``before`` holds the old status fields.
+
+    ``unreachable`` are the cameras marked unreachable instead of being probed.
+    With ``subscriptions`` each change goes only to the subscribers whose
+    filters match the camera; otherwise every subscriber gets every change.
+    With ``flaps``, changes of flapping cameras are not reported; only the
+    start and the end of the flapping are.
+    """
+
+    probed = [camera for camera, _result in results]
+    touched = probed + (unreachable or [])
+    if history is not None:
+        history.record_many((str(camera.get("id")), result) for camera, result in results if not result.passive)
+    # Most probes only refresh last_check_at; persist full rows just for the rest.
+    registry.mark_checked((str(camera.get("id")) for camera in probed), _timestamp())
+    registry.mark_dirty(str(camera.get("id")) for camera in touched if _status_fields(camera) != before[id(camera)])
 
+    changed = [camera for camera in touched if _transition(camera)]
+    flap_events: Dict[str, str] = {}
+    if flaps is not None:
+        flap_events = flaps.update(changed, touched)
+        changed = [
+            camera
+            for camera in touched
+            if str(camera.get("id")) in flap_events
+            or (_transition(camera) and not flaps.is_flapping(str(camera.get("id"))))
+        ]
+    # One alert for the failed node instead of one per camera behind it.
+    behind: Dict[str, int] = {}
+    for camera in unreachable or ():
+        cause = topology.root_cause(str(camera.get("id"))) if topology is not None else None
+        if camera.get("previous_status") != UNREACHABLE and cause is not None:
+            behind[str(cause.get("id"))] = behind.get(str(cause.get("id")), 0) + 1
+    notifications = _compose_notifications(changed, settings.digest_threshold, behind, flap_events)
+
+    if dispatcher is not None and changed:
+        if subscriptions is not None:
+            changes_by_recipient = subscriptions.route(changed)
+        else:
+            with STORAGE_SECONDS.time("read_subscribers"):
+                unique_recipients = set(registry.store.read_subscribers())
+            changes_by_recipient = {recipient: changed for recipient in unique_recipients}
+        _queue_notifications(dispatcher, changes_by_recipient, settings, behind, flap_events)
     return notifications
+
+
+def apply_probe_results(
+    settings: Settings,
+    registry: CameraRegistry,
+    dispatcher: "NotificationDispatcher | None",
+    results: List[Tuple[Camera, ProbeResult]],
+    history: LatencyHistory | None = None,
+    topology: Topology | None = None,
+    subscriptions: "Subscriptions | None" = None,
+    flaps: FlapDetector | None = None,
+) -> List[str]:
+    """Apply results probed elsewhere (by a probe agent) exactly like those of a local cycle.
+
+    With a ``topology``, results for cameras behind a failed node are
+    discarded and the cameras marked unreachable.
+    """
+
+    before = {id(camera): _status_fields(camera) for camera, _result in results}
+    unreachable: List[Camera] = []
+    if topology is not None:
+        results = sorted(results, key=lambda item: topology.depth(str(item[0].get("id"))))
+    applied: List[Tuple[Camera, ProbeResult]] = []
+    for camera, result in results:
+        if topology is not None and topology.blocking_node(str(camera.get("id"))) is not None:
+            _mark_unreachable(camera)
+            unreachable.append(camera)
+            continue
+        _apply_probe_result(camera, _classify(result, settings))
+        applied.append((camera, result))
+    if topology is not None:
+        unreachable += _cascade_unreachable(topology, registry, (camera for camera, _result in applied), before)
+    return _finish_cycle(
+        settings, registry, dispatcher, applied, before, history, unreachable, topology, subscriptions, flaps
+    )
+
+
+async def _probe_by_level(
+    cameras: List[Camera], settings: Settings, topology: Topology, neighbors: "NeighborSnapshot | None" = None
+) -> Tuple[List[Tuple[Camera, ProbeResult]], List[Camera]]:
+    """Probe upstream nodes before the cameras behind them.
+
+    Cameras behind a node that is down are marked unreachable instead of
+    being probed.  Returns the probe results and the unreachable cameras.
+    """
+
+    levels: Dict[int, List[Camera]] = {}
+    for camera in cameras:
+        levels.setdefault(topology.depth(str(camera.get("id"))), []).append(camera)
+
+    deadline = time.monotonic() + settings.check_deadline_seconds if settings.check_deadline_seconds > 0 else None
+    results: List[Tuple[Camera, ProbeResult]] = []
+    unreachable: List[Camera] = []
+    for depth in sorted(levels):
+        reachable = []
+        for camera in levels[depth]:
+            if topology.blocking_node(str(camera.get("id"))) is None:
+                reachable.append(camera)
+            else:
+                _mark_unreachable(camera)
+                unreachable.append(camera)
+        level_settings = settings
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("Check cycle deadline reached before probing topology level %d", depth)
+                break
+            level_settings = replace(settings, check_deadline_seconds=remaining)
+        results.extend(await probe_cameras(reachable, level_settings, neighbors))
+    return results, unreachable
+
+
+@dataclass
+class CycleResult:
+    results: List[Tuple[Camera, ProbeResult]]
+    # Cameras marked unreachable instead of being probed.
+    unreachable: List[Camera]
+    notifications: List[str]
+
+
+async def run_cycle(
+    settings: Settings,
+    registry: CameraRegistry,
+    dispatcher: "NotificationDispatcher | None" = None,
+    cameras: List[Camera] | None = None,
+    history: LatencyHistory | None = None,
+    agents: "AgentPool | None" = None,
+    topology: Topology | None = None,
+    subscriptions: "Subscriptions | None" = None,
+    neighbors: "PassiveLiveness | None" = None,
+    flaps: FlapDetector | None = None,
+    profiler: "CycleProfiler | None" = None,
+) -> CycleResult:
+    """Run one check cycle and queue notifications for status changes.
+
+    Checks ``cameras`` (by default every enabled camera in ``registry``) and
+    records RTT and loss of every probe in ``history``.  Cameras currently
+    assigned to a probe agent in ``agents`` are skipped; their results arrive
+    from the agent.  With a ``topology``, upstream nodes are probed before
+    the cameras behind them, and cameras behind a node that is down are
+    marked unreachable without a probe, with a single alert for the node.
+
+    Results that contradict a camera's status are confirmed by up to
+    ``settings.confirm_results`` probes before the status changes, and with
+    ``flaps`` cameras whose status keeps changing are reported only when they
+    start and stop flapping.
+
+    Each recipient gets one message per changed camera, or a digest once the
+    cycle has more than ``settings.digest_threshold`` changes for them.
+    Recipients are resolved through the tag index of ``subscriptions`` when
+    given, so subscribers only hear about the cameras they follow.  With
+    ``neighbors`` the kernel neighbor table is read once and cameras it shows
+    as reachable are not probed (see :mod:`neighbors`).
+    Delivery happens in the background through ``dispatcher``, so the cycle
+    does not wait for Telegram.  When ``profiler`` is armed this cycle runs
+    under it (see :mod:`profiling`).
+    """
+
+    session = None
+    if profiler is not None and profiler.armed:
+        session = profiler.start("полный цикл" if cameras is None else f"пакет из {len(cameras)} камер")
+    if session is None:
+        return await _run_cycle(
+            settings, registry, dispatcher, cameras, history, agents, topology, subscriptions, neighbors, flaps
+        )
+    cycle = None
+    try:
+        cycle = await _run_cycle(
+            settings, registry, dispatcher, cameras, history, agents, topology, subscriptions, neighbors, flaps, session
+        )
+        return cycle
+    finally:
+        session.finish(cycle)
+
+
+async def _run_cycle(
+    settings: Settings,
+    registry: CameraRegistry,
+    dispatcher: "NotificationDispatcher | None",
+    cameras: List[Camera] | None,
+    history: LatencyHistory | None,
+    agents: "AgentPool | None",
+    topology: Topology | None,
+    subscriptions: "Subscriptions | None",
+    neighbors: "PassiveLiveness | None",
+    flaps: FlapDetector | None,
+    session: "ProfileSession | None" = None,
+) -> CycleResult:
+    started = time.perf_counter()
+    enabled = registry.enabled() if cameras is None else cameras
+    if agents is not None:
+        enabled = [camera for camera in enabled if not agents.owns(camera)]
+    before = {id(camera): _status_fields(camera) for camera in enabled}
+    if session is not None:
+        session.phase("select")
+    snapshot = await neighbors.snapshot() if neighbors is not None else None
+    if session is not None:
+        session.phase("neighbors")
+    if topology is None or topology.empty:
+        results, unreachable = await probe_cameras(enabled, settings, snapshot), []
+    else:
+        results, unreachable = await _probe_by_level(enabled, settings, topology, snapshot)
+        # Cameras behind a node that just went down may not be part of this batch.
+        unreachable += _cascade_unreachable(topology, registry, (camera for camera, _result in results), before)
+    logger.log(
+        logging.INFO if cameras is None else logging.DEBUG,
+        "Check cycle probed %d of %d cameras",
+        len(results),
+        len(enabled),
+    )
+    if session is not None:
+        session.phase("probe")
+    notifications = _finish_cycle(
+        settings, registry, dispatcher, results, before, history, unreachable, topology, subscriptions, flaps
+    )
+    if session is not None:
+        session.phase("finish")
+
+    CHECK_CYCLE_SECONDS.observe(time.perf_counter() - started, "full" if cameras is None else "batch")
+    return CycleResult(results, unreachable, notifications)
+
+
+async def check_cameras(
+    settings: Settings,
+    registry: CameraRegistry,
+    dispatcher: "NotificationDispatcher | None" = None,
+    cameras: List[Camera] | None = None,
+    history: LatencyHistory | None = None,
+    agents: "AgentPool | None" = None,
+    topology: Topology | None = None,
+    subscriptions: "Subscriptions | None" = None,
+    neighbors: "PassiveLiveness | None" = None,
+    flaps: FlapDetector | None = None,
+    profiler: "CycleProfiler | None" = None,
+) -> List[str]:
+    """Run one check cycle (see :func:`run_cycle`) and return the notification texts."""
+
+    cycle = await run_cycle(
+        settings, registry, dispatcher, cameras, history, agents, topology, subscriptions, neighbors, flaps, profiler
+    )
+    return cycle.notifications
@@ -0,0 +1,188 @@
+"""Passive liveness from the kernel neighbor (ARP) table.
+
+Cameras on the bot host's own L2 segment that stream to an NVR keep their
+neighbor entries fresh all the time, so the kernel already knows they are
+alive.  With NEIGHBOR_TABLE set, every check cycle reads the table once,
+indexes it by IP and counts a camera as online without probing it when
+
+- its entry is REACHABLE,
+- it is checked with the default ICMP probe (a neighbor entry says nothing
+  about an HTTP or RTSP service),
+- its last status is ``online``, so status changes are always confirmed by
+  a real probe, and
+- it was actively probed less than PASSIVE_MAX_AGE_SECONDS ago.
+
+NEIGHBOR_TABLE is either ``ip`` (the output of ``ip -4 neigh show``, which
+has the kernel's NUD states) or the path of a file in that format or in the
+format of ``/proc/net/arp``.  ``/proc/net/arp`` only tells resolved from
+unresolved entries, so there every resolved entry counts as REACHABLE and
+PASSIVE_MAX_AGE_SECONDS is what bounds a stale entry.  It defaults to
+CHECK_INTERVAL_SECONDS, so a dead camera stays "online" no longer than it
+would without passive checks.  A fixture file in either format can stand in
+for the kernel table.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from probes import IcmpProbe, probe_for_camera
+from storage import Camera
+
+logger = logging.getLogger(__name__)
+
+# NEIGHBOR_TABLE value that reads the table from ``ip -4 neigh show``.
+IP_COMMAND_SOURCE = "ip"
+IP_COMMAND = ("ip", "-4", "neigh", "show")
+COMMAND_TIMEOUT_SECONDS = 5.0
+# Scheduler batches due within this window share one read of the table.
+SNAPSHOT_TTL_SECONDS = 1.0
+# Flags of /proc/net/arp entries (ATF_COM and ATF_PERM in <net/if_arp.h>).
+ATF_COM = 0x02
+ATF_PERM = 0x04
+FRESH_STATES = ("REACHABLE",)
+
+
+@dataclass
+class Neighbor:
+    ip: str
+    state: str
+    mac: str | None = None
+    device: str | None = None
+
+
+def parse_proc_arp(text: str) -> Dict[str, Neighbor]:
+    """Index the lines of ``/proc/net/arp`` by IP."""
+
+    neighbors: Dict[str, Neighbor] = {}
+    for line in text.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 6:
+            continue
+        try:
+            flags = int(fields[2], 16)
+        except ValueError:
+            continue
+        if flags & ATF_PERM:
+            state = "PERMANENT"
+        elif flags & ATF_COM:
+            state = "REACHABLE"
+        else:
+            state = "INCOMPLETE"
+        neighbors[fields[0]] = Neighbor(fields[0], state, fields[3], fields[5])
+    return neighbors
+
+
+def parse_ip_neigh(text: str) -> Dict[str, Neighbor]:
+    """Index the lines of ``ip neigh show`` (``IP dev IF lladdr MAC [router] STATE``) by IP."""
+
+    neighbors: Dict[str, Neighbor] = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        mac = fields[fields.index("lladdr") + 1] if "lladdr" in fields[:-1] else None
+        device = fields[fields.index("dev") + 1] if "dev" in fields[:-1] else None
+        neighbors[fields[0]] = Neighbor(fields[0], fields[-1].upper(), mac, device)
+    return neighbors
+
+
+def parse_neighbors(text: str) -> Dict[str, Neighbor]:
+    """Parse either format; ``/proc/net/arp`` is recognised by its header."""
+
+    if text.startswith("IP address"):
+        return parse_proc_arp(text)
+    return parse_ip_neigh(text)
+
+
+class NeighborSnapshot:
+    """The neighbor table read for one check cycle."""
+
+    def __init__(self, liveness: "PassiveLiveness", neighbors: Dict[str, Neighbor]) -> None:
+        self.liveness = liveness
+        self.neighbors = neighbors
+
+    def fresh(self, camera: Camera) -> bool:
+        neighbor = self.neighbors.get(str(camera.get("ip")))
+        return neighbor is not None and neighbor.state in FRESH_STATES
+
+    def split(self, cameras: List[Camera]) -> Tuple[List[Camera], List[Camera]]:
+        """Split ``cameras`` into the ones counted online passively and the ones to probe."""
+
+        if not self.neighbors:
+            return [], cameras
+        now = time.monotonic()
+        passive: List[Camera] = []
+        active: List[Camera] = []
+        for camera in cameras:
+            if (
+                camera.get("last_status") == "online"
+                and self.fresh(camera)
+                and isinstance(probe_for_camera(camera), IcmpProbe)
+                and not self.liveness.probe_due(str(camera.get("id")), now)
+            ):
+                passive.append(camera)
+            else:
+                active.append(camera)
+        return passive, active
+
+    def probed(self, camera_ids: Iterable[str]) -> None:
+        self.liveness.probed(camera_ids)
+
+
+class PassiveLiveness:
+    def __init__(self, source: str, max_age_seconds: float) -> None:
+        self.source = source
+        self.max_age_seconds = max_age_seconds
+        # Camera ID -> time.monotonic() of its last active probe.
+        self._probed_at: Dict[str, float] = {}
+        self._snapshot: NeighborSnapshot | None = None
+        self._snapshot_at = 0.0
+
+    def probe_due(self, camera_id: str, now: float) -> bool:
+        probed_at = self._probed_at.get(camera_id)
+        return probed_at is None or now - probed_at >= self.max_age_seconds
+
+    def probed(self, camera_ids: Iterable[str]) -> None:
+        now = time.monotonic()
+        for camera_id in camera_ids:
+            self._probed_at[camera_id] = now
+
+    async def _read_command(self) -> str:
+        process = await asyncio.create_subprocess_exec(
+            *IP_COMMAND,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout=COMMAND_TIMEOUT_SECONDS)
+        finally:
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+        if process.returncode != 0:
+            raise OSError(f"{' '.join(IP_COMMAND)} exited with status {process.returncode}")
+        return output.decode("utf-8", errors="replace")
+
+    async def snapshot(self) -> NeighborSnapshot:
+        """Read the neighbor table; when it cannot be read every camera is probed as usual."""
+
+        if self._snapshot is not None and time.monotonic() - self._snapshot_at < SNAPSHOT_TTL_SECONDS:
+            return self._snapshot
+        try:
+            if self.source == IP_COMMAND_SOURCE:
+                text = await self._read_command()
+            else:
+                text = Path(self.source).read_text(encoding="utf-8", errors="replace")
+        except (OSError, asyncio.TimeoutError) as exc:
+            logger.warning("Cannot read the neighbor table from %s: %s", self.source, exc)
+            neighbors: Dict[str, Neighbor] = {}
+        else:
+            neighbors = parse_neighbors(text)
+        self._snapshot, self._snapshot_at = NeighborSnapshot(self, neighbors), time.monotonic()
+        return self._snapshot
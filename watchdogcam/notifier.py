@@ -0,0 +1,333 @@
+"""Rate-limited notification delivery with a persistent outbox.
+
+Check cycles only enqueue messages; a pool of workers delivers them in the
+background so a cycle never waits on Telegram.  Sends are paced by a global
+token bucket and one bucket per chat (Telegram allows roughly 30 messages/s
+per bot and 1 message/s per chat), ``RetryAfter`` pauses delivery for the
+requested time, and transient errors are retried with exponential backoff.
+Every chat has its own queue; workers take whichever chat's bucket has a
+token first, so a busy chat waiting for its next second never holds up the
+others, and one chat is served by one worker at a time so its messages stay
+in order.  Undelivered messages are kept in a small JSON outbox that is reloaded on
+start, so they survive restarts.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Tuple
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+# Inline keyboard as rows of ``[text, callback_data]`` pairs, kept plain for the outbox.
+Buttons = List[List[List[str]]]
+
+
+def inline_keyboard(buttons: Buttons | None) -> InlineKeyboardMarkup | None:
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton(text, callback_data=data) for text, data in row] for row in buttons]
+    )
+
+
+@dataclass
+class OutboundMessage:
+    chat_id: int
+    text: str
+    attempts: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    buttons: Buttons | None = None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def block(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds`` (e.g. after a ``RetryAfter``)."""
+
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self._updated = self._blocked_until
+
+    def ready_at(self) -> float:
+        """The monotonic time at which :meth:`acquire` would return without waiting."""
+
+        now = time.monotonic()
+        start = max(now, self._updated, self._blocked_until)
+        tokens = min(self.capacity, self._tokens + max(0.0, now - self._updated) * self.rate)
+        return start if tokens >= 1 else start + (1 - tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._refill(max(now, self._updated))
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_after_seconds(exc: RetryAfter) -> float:
+    retry_after = exc.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        return float(retry_after.total_seconds())
+    return float(retry_after)
+
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        bot: Bot,
+        outbox_file: Path | None = None,
+        workers: int = 4,
+        rate_per_second: float = 25.0,
+        chat_rate_per_second: float = 1.0,
+        max_attempts: int = 5,
+    ) -> None:
+        self.bot = bot
+        self.outbox_file = outbox_file
+        self.max_attempts = max_attempts
+        self.attempts = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._global_bucket = TokenBucket(rate_per_second)
+        self._chat_rate = chat_rate_per_second
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._worker_count = max(1, workers)
+        # Messages per chat in order.  A chat with messages is either in the ready heap as
+        # (when its bucket has a token, sequence, chat_id) or being served by a worker.
+        self._chats: Dict[int, Deque[OutboundMessage]] = {}
+        self._ready: List[Tuple[float, int, int]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._pending: Dict[str, OutboundMessage] = {}
+        self._workers: List[asyncio.Task] = []
+        self._outbox_handle: asyncio.TimerHandle | None = None
+        self._outbox_write: asyncio.Future | None = None
+        self._outbox_lock = threading.Lock()
+
+    # Queueing ------------------------------------------------------------
+
+    def enqueue(self, chat_id: int, text: str) -> None:
+        self._put(OutboundMessage(chat_id=chat_id, text=text))
+        self._schedule_outbox_write()
+
+    def enqueue_many(self, chat_ids: Iterable[int], text: str, buttons: Buttons | None = None) -> None:
+        for chat_id in chat_ids:
+            self._put(OutboundMessage(chat_id=chat_id, text=text, buttons=buttons))
+        self._schedule_outbox_write()
+
+    def _put(self, message: OutboundMessage) -> None:
+        self._pending[message.id] = message
+        self._drained.clear()
+        messages = self._chats.get(message.chat_id)
+        if messages is None:
+            self._chats[message.chat_id] = deque([message])
+            self._push_ready(message.chat_id, self._chat_bucket(message.chat_id).ready_at())
+        else:
+            # Queued behind the chat's earlier messages; its worker or heap entry covers it.
+            messages.append(message)
+
+    def _push_ready(self, chat_id: int, ready_at: float) -> None:
+        heapq.heappush(self._ready, (ready_at, next(self._sequence), chat_id))
+        self._wakeup.set()
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    # Lifecycle -----------------------------------------------------------
+
+    async def start(self) -> None:
+        for message in self._load_outbox():
+            self._put(message)
+        if self._pending:
+            logger.info("Restored %d undelivered notifications from %s", len(self._pending), self.outbox_file)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._worker_count)]
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """Give queued messages ``drain_timeout`` seconds, then persist the rest."""
+
+        if self._pending and drain_timeout > 0:
+            try:
+                await asyncio.wait_for(self._drained.wait(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Stopping with %d undelivered notifications", len(self._pending))
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._outbox_write is not None:
+            # A snapshot still being written must not land after the final one below.
+            await self._outbox_write
+            self._outbox_write = None
+        if self._outbox_handle is not None:
+            self._outbox_handle.cancel()
+            self._outbox_handle = None
+        self._write_outbox()
+
+    # Delivery ------------------------------------------------------------
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self._chat_rate, capacity=1)
+        return bucket
+
+    async def _next_chat(self) -> int:
+        """Wait for the chat that can be sent to first and take it off the ready heap."""
+
+        while True:
+            now = time.monotonic()
+            if self._ready and self._ready[0][0] <= now:
+                return heapq.heappop(self._ready)[2]
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._ready[0][0] - now if self._ready else None)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self._next_chat()
+            messages = self._chats[chat_id]
+            message = messages[0]
+            retry_in: float | None = None
+            try:
+                retry_in = await self._deliver(message)
+            except Exception:
+                logger.exception("Unexpected error while delivering notification to %s", message.chat_id)
+                self._finish(message)
+            if retry_in is None:
+                messages.popleft()
+            if messages:
+                # Back on the heap instead of waiting here, so this worker serves other chats meanwhile.
+                ready_at = self._chat_bucket(chat_id).ready_at()
+                if retry_in is not None:
+                    ready_at = max(ready_at, time.monotonic() + retry_in)
+                self._push_ready(chat_id, ready_at)
+            else:
+                del self._chats[chat_id]
+
+    async def _deliver(self, message: OutboundMessage) -> float | None:
+        """Send ``message`` once; returns the seconds to wait before retrying it, or None when it is done."""
+
+        chat_bucket = self._chat_bucket(message.chat_id)
+        # The chat bucket goes last so that nothing delays the send after it.  The chat is
+        # only taken off the ready heap once its bucket has a token, so it rarely waits.
+        await self._global_bucket.acquire()
+        await chat_bucket.acquire()
+        message.attempts += 1
+        self.attempts += 1
+        try:
+            await self.bot.send_message(
+                chat_id=message.chat_id, text=message.text, reply_markup=inline_keyboard(message.buttons)
+            )
+        except RetryAfter as exc:
+            delay = _retry_after_seconds(exc)
+            logger.warning("Flood control hit, pausing notifications for %.1fs", delay)
+            self.retried += 1
+            message.attempts -= 1
+            self._global_bucket.block(delay)
+            chat_bucket.block(delay)
+            return delay
+        except (Forbidden, BadRequest) as exc:
+            # The chat blocked the bot or the message is invalid: retrying won't help.
+            logger.warning("Dropping notification to %s: %s", message.chat_id, exc)
+            self.failed += 1
+        except Exception:  # Telegram errors should not stop monitoring
+            if message.attempts < self.max_attempts:
+                delay = min(60.0, 2.0 ** message.attempts)
+                logger.warning(
+                    "Failed to send notification to %s (attempt %d), retrying in %.0fs",
+                    message.chat_id,
+                    message.attempts,
+                    delay,
+                    exc_info=True,
+                )
+                self.retried += 1
+                self._schedule_outbox_write()
+                return delay
+            logger.exception("Giving up on notification to %s after %d attempts", message.chat_id, message.attempts)
+            self.failed += 1
+        else:
+            self.sent += 1
+        self._finish(message)
+        return None
+
+    def _finish(self, message: OutboundMessage) -> None:
+        self._pending.pop(message.id, None)
+        if not self._pending:
+            self._drained.set()
+        self._schedule_outbox_write()
+
+    # Outbox --------------------------------------------------------------
+
+    def _schedule_outbox_write(self) -> None:
+        if self.outbox_file is None or self._outbox_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._outbox_handle = loop.call_later(1.0, self._flush_outbox)
+
+    def _flush_outbox(self) -> None:
+        self._outbox_handle = None
+        if self._outbox_write is not None and not self._outbox_write.done():
+            # One write at a time, so an older snapshot never replaces a newer one.
+            self._outbox_write.add_done_callback(lambda _future: self._schedule_outbox_write())
+            return
+        messages = [asdict(message) for message in self._pending.values()]
+        self._outbox_write = asyncio.get_running_loop().run_in_executor(None, self._write_outbox, messages)
+
+    def _write_outbox(self, messages: List[dict] | None = None) -> None:
+        if self.outbox_file is None:
+            return
+        if messages is None:
+            messages = [asdict(message) for message in self._pending.values()]
+        temp_path = self.outbox_file.with_suffix(".tmp")
+        try:
+            with self._outbox_lock:
+                self.outbox_file.parent.mkdir(parents=True, exist_ok=True)
+                with temp_path.open("w", encoding="utf-8") as fh:
+                    json.dump(messages, fh, ensure_ascii=False)
+                shutil.move(str(temp_path), self.outbox_file)
+        except OSError:
+            logger.exception("Failed to write notification outbox %s", self.outbox_file)
+
+    def _load_outbox(self) -> List[OutboundMessage]:
+        if self.outbox_file is None or not self.outbox_file.exists():
+            return []
+        try:
+            with self.outbox_file.open("r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            return [OutboundMessage(**item) for item in data]
+        except (OSError, json.JSONDecodeError, TypeError):
+            logger.exception("Invalid notification outbox %s; ignoring it", self.outbox_file)
+            return []
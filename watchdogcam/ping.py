@@ -1,13 +1,53 @@
+import asyncio
 import platform
+import re
 import subprocess
+from dataclasses import dataclass
+from typing import List
 
+# Gap between echo requests when several are sent; 0.2s is the smallest
+# interval unprivileged users may ask for on Linux.
+ECHO_INTERVAL_SECONDS = 0.2
 
-def ping_host(ip: str, timeout_seconds: int = 1) -> bool:
+_TRANSMITTED_RE = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+_RTT_RE = re.compile(r"= [\d.]+/([\d.]+)/")
+_WINDOWS_TRANSMITTED_RE = re.compile(r"Sent = (\d+), Received = (\d+)")
+_WINDOWS_RTT_RE = re.compile(r"Average = (\d+)ms")
+
+
+@dataclass
+class PingStats:
+    sent: int
+    received: int
+    rtt_ms: float | None = None
+
+    @property
+    def loss(self) -> float:
+        return 1 - self.received / self.sent if self.sent else 1.0
+
+
+def _ping_command(ip: str, timeout_seconds: int, count: int = 1) -> List[str]:
     system = platform.system().lower()
     if system == "windows":
-        command = ["ping", "-n", "1", "-w", str(timeout_seconds * 1000), ip]
+        return ["ping", "-n", str(count), "-w", str(timeout_seconds * 1000), ip]
+    if count > 1:
+        return ["ping", "-c", str(count), "-i", str(ECHO_INTERVAL_SECONDS), "-W", str(timeout_seconds), ip]
+    return ["ping", "-c", "1", "-W", str(timeout_seconds), ip]
+
+
+def _parse_ping_output(output: str, count: int, returncode: int | None) -> PingStats:
+    transmitted = _TRANSMITTED_RE.search(output) or _WINDOWS_TRANSMITTED_RE.search(output)
+    if transmitted:
+        sent, received = int(transmitted.group(1)), int(transmitted.group(2))
     else:
-        command = ["ping", "-c", "1", "-W", str(timeout_seconds), ip]
+        # Unfamiliar (e.g. localized) output: fall back to the exit code.
+        sent, received = count, count if returncode == 0 else 0
+    rtt = _RTT_RE.search(output) or _WINDOWS_RTT_RE.search(output)
+    return PingStats(sent=sent, received=received, rtt_ms=float(rtt.group(1)) if rtt and received else None)
+
+
+def ping_host(ip: str, timeout_seconds: int = 1) -> bool:
+    command = _ping_command(ip, timeout_seconds)
 
     try:
         result = subprocess.run(
@@ -20,3 +60,35 @@ def ping_host(ip: str, timeout_seconds: int = 1) -> bool:
         return result.returncode == 0
     except (subprocess.SubprocessError, OSError):
         return False
+
+
+async def async_ping_stats(ip: str, timeout_seconds: int = 1, count: int = 1) -> PingStats:
+    """Send ``count`` echo requests to ``ip`` and report replies and average RTT."""
+
+    command = _ping_command(ip, timeout_seconds, count)
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except (OSError, NotImplementedError):
+        return PingStats(sent=count, received=0)
+
+    output = b""
+    try:
+        output, _ = await asyncio.wait_for(
+            process.communicate(), timeout=timeout_seconds + count * ECHO_INTERVAL_SECONDS + 1
+        )
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+    return _parse_ping_output(output.decode("utf-8", "replace"), count, process.returncode)
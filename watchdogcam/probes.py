@@ -0,0 +1,205 @@
+"""Liveness probes that can be selected per camera.
+
+A camera chooses its probe through the optional ``probe`` field in the
+cameras file, either as a bare type name or as an object with options::
+
+    "probe": "rtsp"
+    "probe": {"type": "tcp", "port": 8000}
+    "probe": {"type": "http", "port": 80, "path": "/", "method": "GET", "expect_status": [200]}
+
+Cameras without the field keep using ICMP.  Everything except ICMP runs on
+asyncio streams and is bounded by a short connect/read timeout.
+
+ICMP probes send several echo requests and report the average RTT and the
+fraction lost; the other probes make a single attempt and report the time
+the whole exchange took.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+from ping import async_ping_stats
+from storage import Camera
+
+logger = logging.getLogger(__name__)
+
+PROBE_TYPES = ("icmp", "tcp", "http", "rtsp")
+
+
+@dataclass
+class ProbeResult:
+    online: bool
+    rtt_ms: float | None = None
+    error: str | None = None
+    # Fraction of echo requests that went unanswered; ``None`` if not measured.
+    loss: float | None = None
+    # Taken from the kernel neighbor table instead of probing; no RTT or loss.
+    passive: bool = False
+
+
+class Probe:
+    """Base class for a liveness check against a single address."""
+
+    kind = "icmp"
+
+    async def check(self, ip: str, timeout_seconds: float, attempts: int = 1) -> ProbeResult:
+        raise NotImplementedError
+
+
+class IcmpProbe(Probe):
+    kind = "icmp"
+
+    async def check(self, ip: str, timeout_seconds: float, attempts: int = 1) -> ProbeResult:
+        stats = await async_ping_stats(ip, timeout_seconds=max(1, int(timeout_seconds)), count=attempts)
+        online = stats.received > 0
+        return ProbeResult(
+            online=online, rtt_ms=stats.rtt_ms, loss=stats.loss, error=None if online else "no echo reply"
+        )
+
+
+@dataclass
+class TcpProbe(Probe):
+    port: int = 80
+    kind = "tcp"
+
+    async def _exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, ip: str) -> str | None:
+        """Talk to the service after connecting; return an error or ``None``."""
+
+        return None
+
+    async def check(self, ip: str, timeout_seconds: float, attempts: int = 1) -> ProbeResult:
+        started = time.monotonic()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, self.port), timeout=timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            return ProbeResult(online=False, error=f"connect to port {self.port} timed out")
+        except OSError as exc:
+            return ProbeResult(online=False, error=f"connect to port {self.port} failed: {exc.strerror or exc}")
+
+        try:
+            error = await asyncio.wait_for(self._exchange(reader, writer, ip), timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            error = "no response"
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            error = f"protocol error: {exc}"
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+        rtt_ms = (time.monotonic() - started) * 1000
+        if error:
+            return ProbeResult(online=False, rtt_ms=rtt_ms, error=error)
+        return ProbeResult(online=True, rtt_ms=rtt_ms)
+
+
+def _parse_status_line(line: bytes, protocol: str) -> int:
+    parts = line.decode("latin-1").split(None, 2)
+    if len(parts) < 2 or not parts[0].upper().startswith(protocol + "/"):
+        raise ValueError(f"unexpected status line {line[:64]!r}")
+    return int(parts[1])
+
+
+def _status_error(status: int, expect_status: List[int]) -> str | None:
+    if expect_status:
+        return None if status in expect_status else f"status {status}"
+    # Cameras usually answer 401 to anonymous requests, which still proves the
+    # service is alive; only server errors count as down by default.
+    return None if status < 500 else f"status {status}"
+
+
+@dataclass
+class HttpProbe(TcpProbe):
+    port: int = 80
+    path: str = "/"
+    method: str = "HEAD"
+    expect_status: List[int] = field(default_factory=list)
+    kind = "http"
+
+    async def _exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, ip: str) -> str | None:
+        request = (
+            f"{self.method} {self.path} HTTP/1.1\r\n"
+            f"Host: {ip}:{self.port}\r\n"
+            "User-Agent: WatchDogCam\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        writer.write(request.encode("ascii"))
+        await writer.drain()
+        status = _parse_status_line(await reader.readline(), "HTTP")
+        return _status_error(status, self.expect_status)
+
+
+@dataclass
+class RtspProbe(TcpProbe):
+    port: int = 554
+    path: str = "/"
+    expect_status: List[int] = field(default_factory=list)
+    kind = "rtsp"
+
+    async def _exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, ip: str) -> str | None:
+        request = (
+            f"OPTIONS rtsp://{ip}:{self.port}{self.path} RTSP/1.0\r\n"
+            "CSeq: 1\r\n"
+            "User-Agent: WatchDogCam\r\n\r\n"
+        )
+        writer.write(request.encode("ascii"))
+        await writer.drain()
+        status = _parse_status_line(await reader.readline(), "RTSP")
+        return _status_error(status, self.expect_status)
+
+
+_PROBE_FACTORIES: Dict[str, Callable[..., Probe]] = {
+    "icmp": IcmpProbe,
+    "tcp": TcpProbe,
+    "http": HttpProbe,
+    "rtsp": RtspProbe,
+}
+
+_DEFAULT_PROBE = IcmpProbe()
+
+
+def build_probe(spec: object) -> Probe:
+    """Create a probe from the ``probe`` field of a camera entry.
+
+    Raises :class:`ValueError` for unknown probe types or options.
+    """
+
+    if spec is None:
+        return _DEFAULT_PROBE
+    if isinstance(spec, str):
+        spec = {"type": spec}
+    if not isinstance(spec, dict):
+        raise ValueError(f"probe must be a string or an object, got {type(spec).__name__}")
+
+    options = dict(spec)
+    kind = str(options.pop("type", "icmp")).lower()
+    factory = _PROBE_FACTORIES.get(kind)
+    if factory is None:
+        raise ValueError(f"unknown probe type {kind!r}, expected one of: {', '.join(PROBE_TYPES)}")
+    try:
+        if "port" in options:
+            options["port"] = int(options["port"])
+            if not 1 <= options["port"] <= 65535:
+                raise ValueError(f"port {options['port']} is outside 1-65535")
+        if "method" in options:
+            options["method"] = str(options["method"]).upper()
+        if "expect_status" in options:
+            codes = options["expect_status"]
+            options["expect_status"] = [int(codes)] if isinstance(codes, (int, str)) else [int(code) for code in codes]
+        return factory(**options)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"invalid options for {kind} probe: {exc}") from exc
+
+
+def probe_for_camera(camera: Camera) -> Probe:
+    try:
+        return build_probe(camera.get("probe"))
+    except ValueError as exc:
+        logger.error("Invalid probe for camera %s (%s): %s; using ICMP", camera.get("name"), camera.get("ip"), exc)
+        return _DEFAULT_PROBE
@@ -0,0 +1,214 @@
+"""On-demand profiling of a check cycle.
+
+``/profile`` in the bot and ``check --profile`` arm a :class:`CycleProfiler`;
+the next check cycle (a full cycle, a ``/check`` or a scheduler batch) then
+runs under cProfile and tracemalloc while a sampler task measures how late
+the event loop wakes up.  The text report lists the time per cycle phase,
+the event loop stalls, the functions with the most own and cumulative time
+and the source lines that allocated the most memory during the cycle.
+
+cProfile traces the whole thread, so coroutines that run while the cycle
+awaits (Telegram handlers, notification delivery) show up in the report as
+well, and every timing is inflated by the profiler itself.  While nothing
+is armed a cycle pays a single attribute check: neither cProfile nor
+tracemalloc is started.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, List, Tuple
+
+from latency import PERCENTILES, percentile
+
+if TYPE_CHECKING:
+    from monitor import CycleResult
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 20
+TOP_STALLS = 10
+# How often the sampler task checks how late the event loop is.
+STALL_SAMPLE_SECONDS = 0.01
+
+
+def _format_bytes(size: float) -> str:
+    if abs(size) < 1024:
+        return f"{size:.0f} Б"
+    for unit in ("КБ", "МБ"):
+        size /= 1024
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+    return f"{size / 1024:.1f} ГБ"
+
+
+class ProfileSession:
+    """Instruments one check cycle; created by :meth:`CycleProfiler.start`."""
+
+    def __init__(self, profiler: "CycleProfiler", label: str, waiters: List[asyncio.Future]) -> None:
+        self.profiler = profiler
+        self.label = label
+        self.waiters = waiters
+        self.started_at = datetime.now(timezone.utc)
+        self._profile = cProfile.Profile()
+        self._was_tracing = tracemalloc.is_tracing()
+        self._baseline: tracemalloc.Snapshot | None = None
+        # (phase, seconds) in the order the phases ran.
+        self._phases: List[Tuple[str, float]] = []
+        # (seconds since the start, how late the sampler woke up).
+        self._stalls: List[Tuple[float, float]] = []
+        self._sampler: asyncio.Task | None = None
+        self._started = 0.0
+        self._lap = 0.0
+
+    def begin(self) -> None:
+        if self._was_tracing:
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.take_snapshot()
+        else:
+            tracemalloc.start()
+        self._sampler = asyncio.get_running_loop().create_task(self._sample_stalls())
+        self._started = self._lap = time.perf_counter()
+        self._profile.enable()
+
+    def phase(self, name: str) -> None:
+        """Attribute the time since the previous phase (or the start) to ``name``."""
+
+        now = time.perf_counter()
+        self._phases.append((name, now - self._lap))
+        self._lap = now
+
+    async def _sample_stalls(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(STALL_SAMPLE_SECONDS)
+            self._stalls.append((started - self._started, max(0.0, loop.time() - started - STALL_SAMPLE_SECONDS)))
+
+    def finish(self, cycle: "CycleResult | None") -> None:
+        """Stop instrumenting and hand the report to everyone waiting for it."""
+
+        self._profile.disable()
+        seconds = time.perf_counter() - self._started
+        if self._sampler is not None:
+            self._sampler.cancel()
+        snapshot = tracemalloc.take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+        if not self._was_tracing:
+            tracemalloc.stop()
+        try:
+            report = self._report(cycle, seconds, snapshot, traced, peak)
+        except Exception:
+            logger.exception("Cannot build the profile report")
+            report = "Не удалось составить отчёт профилирования, подробности в журнале."
+        finally:
+            self.profiler._active = None
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(report)
+        logger.info("Profiled check cycle (%s) in %.3fs", self.label, seconds)
+
+    # Report --------------------------------------------------------------
+
+    def _report(
+        self, cycle: "CycleResult | None", seconds: float, snapshot: tracemalloc.Snapshot, traced: int, peak: int
+    ) -> str:
+        lines = [
+            f"Профиль цикла проверки: {self.label}",
+            f"Начало: {self.started_at.replace(microsecond=0).isoformat()}",
+            f"Длительность под профилировщиком: {seconds:.3f} с",
+        ]
+        if cycle is None:
+            lines.append("Цикл завершился ошибкой, отчёт охватывает его до ошибки.")
+        else:
+            lines.append(
+                f"Проверено камер: {len(cycle.results)}, недоступны за узлом: {len(cycle.unreachable)}, "
+                f"уведомлений: {len(cycle.notifications)}"
+            )
+        lines += ["", "Фазы цикла"]
+        for name, phase_seconds in self._phases:
+            share = phase_seconds / seconds * 100 if seconds > 0 else 0.0
+            lines.append(f"  {name:<10} {phase_seconds:9.3f} с {share:6.1f}%")
+        lines += ["", *self._stall_lines(), "", *self._function_lines(), "", *self._allocation_lines(snapshot)]
+        lines.append(f"Память под tracemalloc: сейчас {_format_bytes(traced)}, пик за цикл {_format_bytes(peak)}")
+        return "\n".join(lines) + "\n"
+
+    def _stall_lines(self) -> List[str]:
+        lines = [f"Задержки цикла событий (выборка каждые {STALL_SAMPLE_SECONDS * 1000:.0f} мс)"]
+        if not self._stalls:
+            return lines + ["  Нет выборок: цикл не отдавал управление."]
+        ordered = sorted(stall for _offset, stall in self._stalls)
+        summary = ", ".join(f"p{percent} {percentile(ordered, percent) * 1000:.1f} мс" for percent in PERCENTILES)
+        lines.append(f"  Выборок: {len(ordered)}, {summary}, максимум {ordered[-1] * 1000:.1f} мс")
+        lines.append("  Самые долгие:")
+        for offset, stall in sorted(self._stalls, key=lambda sample: sample[1], reverse=True)[:TOP_STALLS]:
+            lines.append(f"    +{offset:8.3f} с  {stall * 1000:8.1f} мс")
+        return lines
+
+    def _function_lines(self) -> List[str]:
+        lines = []
+        for sort, title in (("tottime", "собственному"), ("cumulative", "суммарному")):
+            buffer = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=buffer)
+            stats.sort_stats(sort).print_stats(TOP_FUNCTIONS)
+            lines += [f"Функции по {title} времени (первые {TOP_FUNCTIONS})", buffer.getvalue().strip("\n"), ""]
+        return lines[:-1]
+
+    def _allocation_lines(self, snapshot: tracemalloc.Snapshot) -> List[str]:
+        # Neither tracemalloc nor the sampler task of this module are part of the cycle.
+        filters = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )
+        snapshot = snapshot.filter_traces(filters)
+        if self._baseline is not None:
+            stats = snapshot.compare_to(self._baseline.filter_traces(filters), "lineno")
+            stats = [stat for stat in stats if stat.size_diff > 0][:TOP_ALLOCATIONS]
+            entries = [(stat.traceback[0], stat.size_diff, stat.count_diff) for stat in stats]
+        else:
+            entries = [(stat.traceback[0], stat.size, stat.count) for stat in snapshot.statistics("lineno")]
+            entries = entries[:TOP_ALLOCATIONS]
+        lines = [f"Память, выделенная за цикл и не освобождённая (первые {TOP_ALLOCATIONS} строк)"]
+        if not entries:
+            lines.append("  Нет.")
+        for frame, size, count in entries:
+            lines.append(f"  {_format_bytes(size):>10}  {count:7d} блоков  {frame.filename}:{frame.lineno}")
+        return lines
+
+
+class CycleProfiler:
+    """Profiles the next check cycle on request; one per process."""
+
+    def __init__(self) -> None:
+        self._waiters: List[asyncio.Future] = []
+        self._active: ProfileSession | None = None
+
+    @property
+    def armed(self) -> bool:
+        return bool(self._waiters)
+
+    def arm(self) -> "asyncio.Future[str]":
+        """Profile the next check cycle; the future resolves to the text report."""
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        return waiter
+
+    def start(self, label: str) -> ProfileSession | None:
+        """Begin profiling a cycle if armed; cycles running concurrently are not profiled."""
+
+        if self._active is not None:
+            return None
+        waiters = [waiter for waiter in self._waiters if not waiter.done()]
+        self._waiters = []
+        if not waiters:
+            return None
+        self._active = ProfileSession(self, label, waiters)
+        self._active.begin()
+        return self._active
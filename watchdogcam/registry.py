@@ -0,0 +1,236 @@
+"""Process-wide in-memory camera registry with write-behind persistence.
+
+The storage backend is read once at startup.  Bot commands and check cycles
+read from memory; every mutation marks the affected cameras dirty and
+schedules a debounced flush that hands the pending changes to the backend in
+a worker thread, so a burst of changes costs a single write.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from metrics import STORAGE_SECONDS
+from storage import Camera, CameraStore
+
+logger = logging.getLogger(__name__)
+
+# Called with the camera ID and the camera, or ``None`` once it was removed.
+Listener = Callable[[str, Camera | None], None]
+# Failed flushes are retried after flush_delay, doubled per failure up to this.
+MAX_FLUSH_RETRY_SECONDS = 300.0
+
+
+class CameraRegistry:
+    def __init__(self, store: CameraStore, cameras: Iterable[Camera] = (), flush_delay: float = 2.0) -> None:
+        self.store = store
+        self.flush_delay = flush_delay
+        self._cameras: Dict[str, Camera] = {}
+        self._by_ip: Dict[str, str] = {}
+        self._dirty: set[str] = set()
+        self._removed: set[str] = set()
+        self._checked: Dict[str, set[str]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_failures = 0
+        self._listeners: List[Listener] = []
+
+        for camera in cameras:
+            if not camera.get("id"):
+                camera["id"] = str(uuid.uuid4())
+                self._dirty.add(str(camera["id"]))
+            self._insert(camera)
+
+    @classmethod
+    def load(cls, store: CameraStore, flush_delay: float = 2.0) -> "CameraRegistry":
+        with STORAGE_SECONDS.time("load_cameras"):
+            cameras = store.load_cameras()
+        registry = cls(store, cameras, flush_delay=flush_delay)
+        logger.info("Loaded %d cameras from %s", len(registry), type(store).__name__)
+        return registry
+
+    def __len__(self) -> int:
+        return len(self._cameras)
+
+    def _insert(self, camera: Camera) -> None:
+        camera_id = str(camera["id"])
+        self._cameras[camera_id] = camera
+        if camera.get("ip"):
+            self._by_ip[str(camera["ip"])] = camera_id
+
+    # Reads ---------------------------------------------------------------
+
+    def all(self) -> List[Camera]:
+        return list(self._cameras.values())
+
+    def enabled(self) -> List[Camera]:
+        return [camera for camera in self._cameras.values() if camera.get("enabled", True)]
+
+    def get(self, camera_id: str) -> Camera | None:
+        return self._cameras.get(camera_id)
+
+    def find(self, target: str) -> Camera | None:
+        """Look a camera up by ID or IP address."""
+
+        camera = self._cameras.get(target)
+        if camera is not None:
+            return camera
+        camera_id = self._by_ip.get(target)
+        return self._cameras.get(camera_id) if camera_id else None
+
+    # Mutations -----------------------------------------------------------
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call ``listener`` whenever a camera is added, changed or removed."""
+
+        self._listeners.append(listener)
+
+    def _notify(self, camera_id: str, camera: Camera | None) -> None:
+        for listener in self._listeners:
+            try:
+                listener(camera_id, camera)
+            except Exception:
+                logger.exception("Camera listener failed for %s", camera_id)
+
+    def add(self, camera: Camera) -> Camera:
+        if not camera.get("id"):
+            camera["id"] = str(uuid.uuid4())
+        self._insert(camera)
+        self.mark_dirty([str(camera["id"])])
+        return camera
+
+    def add_many(self, cameras: List[Camera]) -> List[Camera]:
+        """Add several cameras as one change, e.g. for a bulk import."""
+
+        for camera in cameras:
+            if not camera.get("id"):
+                camera["id"] = str(uuid.uuid4())
+            self._insert(camera)
+        self.mark_dirty([str(camera["id"]) for camera in cameras])
+        return cameras
+
+    def remove(self, camera_id: str) -> Camera | None:
+        camera = self._cameras.pop(camera_id, None)
+        if camera is None:
+            return None
+        ip = str(camera.get("ip"))
+        if self._by_ip.get(ip) == camera_id:
+            del self._by_ip[ip]
+        self._dirty.discard(camera_id)
+        self._removed.add(camera_id)
+        self._schedule_flush()
+        self._notify(camera_id, None)
+        return camera
+
+    def update(self, camera_id: str, **fields: object) -> Camera | None:
+        camera = self._cameras.get(camera_id)
+        if camera is None:
+            return None
+        if "ip" in fields:
+            old_ip = str(camera.get("ip"))
+            if self._by_ip.get(old_ip) == camera_id:
+                del self._by_ip[old_ip]
+            self._by_ip[str(fields["ip"])] = camera_id
+        camera.update(fields)
+        self.mark_dirty([camera_id])
+        return camera
+
+    def mark_dirty(self, camera_ids: Iterable[str]) -> None:
+        """Record cameras changed in place (e.g. by a check cycle) for the next flush."""
+
+        changed = [camera_id for camera_id in camera_ids if camera_id in self._cameras]
+        self._dirty.update(changed)
+        self._schedule_flush()
+        for camera_id in changed:
+            self._notify(camera_id, self._cameras[camera_id])
+
+    def mark_checked(self, camera_ids: Iterable[str], checked_at: str) -> None:
+        """Set ``last_check_at`` for cameras whose probe did not change anything else.
+
+        Backends that support it persist this as one cheap timestamp update
+        instead of rewriting the cameras.
+        """
+
+        checked = self._checked.setdefault(checked_at, set())
+        for camera_id in camera_ids:
+            camera = self._cameras.get(camera_id)
+            if camera is None:
+                continue
+            camera["last_check_at"] = checked_at
+            checked.add(camera_id)
+        self._schedule_flush()
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty or self._removed or any(self._checked.values()))
+
+    # Persistence ---------------------------------------------------------
+
+    def _schedule_flush(self) -> None:
+        if not self.dirty or self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        delay = self.flush_delay
+        if self._flush_failures:
+            delay = min(max(self.flush_delay, 1.0) * 2**self._flush_failures, MAX_FLUSH_RETRY_SECONDS)
+        self._flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._flush_handle = None
+        self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    def _take_snapshot(self) -> Tuple[List[Camera], List[Camera], set[str], Dict[str, set[str]]]:
+        cameras = [dict(camera) for camera in self._cameras.values()]
+        changed = [dict(self._cameras[camera_id]) for camera_id in self._dirty]
+        removed = set(self._removed)
+        checked = {
+            checked_at: camera_ids - self._dirty
+            for checked_at, camera_ids in self._checked.items()
+            if camera_ids - self._dirty
+        }
+        self._dirty.clear()
+        self._removed.clear()
+        self._checked.clear()
+        return cameras, changed, removed, checked
+
+    async def flush(self) -> None:
+        """Hand pending changes to the backend without blocking the event loop."""
+
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        async with self._flush_lock:
+            if not self.dirty:
+                return
+            snapshot = self._take_snapshot()
+            try:
+                await asyncio.to_thread(self._save, snapshot)
+            except Exception:
+                self._flush_failures += 1
+                logger.exception("Failed to save cameras (attempt %d)", self._flush_failures)
+                self._restore_snapshot(snapshot)
+                self._schedule_flush()
+            else:
+                self._flush_failures = 0
+
+    def _restore_snapshot(self, snapshot: Tuple[List[Camera], List[Camera], set[str], Dict[str, set[str]]]) -> None:
+        """Mark the changes of a failed save pending again; saving them twice is harmless."""
+
+        _cameras, changed, removed, checked = snapshot
+        self._dirty.update(str(camera.get("id")) for camera in changed if str(camera.get("id")) in self._cameras)
+        self._removed.update(removed)
+        for checked_at, camera_ids in checked.items():
+            self._checked.setdefault(checked_at, set()).update(camera_ids)
+
+    def _save(self, snapshot: Tuple[List[Camera], List[Camera], set[str], Dict[str, set[str]]]) -> None:
+        with STORAGE_SECONDS.time("save_cameras"):
+            self.store.save_cameras(*snapshot)
+
+    def flush_sync(self) -> None:
+        if self.dirty:
+            self._save(self._take_snapshot())
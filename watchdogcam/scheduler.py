@@ -0,0 +1,178 @@
+"""Adaptive per-camera check scheduling.
+
+Instead of probing the whole fleet every ``check_interval_seconds``, every
+camera has its own next-due time kept in a heap.  Initial checks are spread
+evenly over one interval, each reschedule adds a little jitter, and the
+interval adapts per camera:
+
+* offline cameras and cameras whose status just changed are rechecked after
+  ``recheck_fast_seconds``;
+* a camera that stays unchanged backs off from ``check_interval_seconds``
+  by ``BACKOFF_FACTOR`` per check, up to ``max_check_interval_seconds``.
+
+Cameras that come due at about the same time are probed as one small batch.
+Cameras assigned to a probe agent are not probed here; they keep coming due
+every ``check_interval_seconds`` so they are picked up soon after their agent
+disappears.  Cameras behind a failed upstream node are not probed at all
+(see :mod:`topology`); they are checked again as soon as the node recovers.
+Batches run through the :class:`~coordinator.CheckCoordinator`, which skips
+cameras that a ``/check`` or ``/refresh`` cycle is probing at that moment.
+"""
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Dict, List, Tuple
+
+from coordinator import CheckCoordinator
+from storage import Camera
+from topology import DOWN_STATUSES
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_FACTOR = 1.5
+JITTER_FRACTION = 0.1
+# Cameras due within this window of the earliest one share a batch.
+BATCH_WINDOW_SECONDS = 1.0
+
+
+class AdaptiveScheduler:
+    def __init__(self, coordinator: CheckCoordinator) -> None:
+        self.coordinator = coordinator
+        self.settings = coordinator.settings
+        self.registry = coordinator.registry
+        self.agents = coordinator.agents
+        self.topology = coordinator.topology
+        self.probes = 0
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}
+        self._intervals: Dict[str, float] = {}
+        self._running: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self.registry.add_listener(self._on_camera_changed)
+
+    def _jitter(self, interval: float) -> float:
+        return interval * random.uniform(-JITTER_FRACTION, JITTER_FRACTION)
+
+    def _schedule(self, camera_id: str, due: float) -> None:
+        previous = self._due.get(camera_id)
+        if previous is not None and previous <= due:
+            return
+        self._due[camera_id] = due
+        heapq.heappush(self._heap, (due, camera_id))
+        if self._heap[0][1] == camera_id:
+            self._wakeup.set()
+
+    def seed(self) -> None:
+        """Spread the first check of every enabled camera evenly over one interval."""
+
+        cameras = self.registry.enabled()
+        now = time.monotonic()
+        slot = float(self.settings.check_interval_seconds) / max(1, len(cameras))
+        for index, camera in enumerate(cameras):
+            self._schedule(str(camera.get("id")), now + slot * index + abs(self._jitter(slot)))
+        logger.info("Scheduled %d cameras over %ss", len(cameras), self.settings.check_interval_seconds)
+
+    def _on_camera_changed(self, camera_id: str, camera: Camera | None) -> None:
+        if camera is None:
+            self._due.pop(camera_id, None)
+            self._intervals.pop(camera_id, None)
+        elif camera_id not in self._due and camera_id not in self._running and camera.get("enabled", True):
+            # A new or re-enabled camera is checked right away.
+            self._schedule(camera_id, time.monotonic())
+
+    def next_interval(self, camera: Camera, changed: bool) -> float:
+        camera_id = str(camera.get("id"))
+        if camera.get("last_status") == "unreachable":
+            # Rechecked early when the upstream node recovers.
+            interval = float(self.settings.check_interval_seconds)
+            self._intervals.pop(camera_id, None)
+        elif changed or camera.get("last_status") != "online":
+            interval = float(self.settings.recheck_fast_seconds)
+            self._intervals.pop(camera_id, None)
+        else:
+            previous = self._intervals.get(camera_id)
+            if previous is None:
+                interval = float(self.settings.check_interval_seconds)
+            else:
+                interval = min(previous * BACKOFF_FACTOR, float(self.settings.max_check_interval_seconds))
+            self._intervals[camera_id] = interval
+        return interval
+
+    def _pop_due_batch(self, now: float) -> List[Camera]:
+        batch: List[Camera] = []
+        while self._heap and self._heap[0][0] <= now + BATCH_WINDOW_SECONDS:
+            due, camera_id = heapq.heappop(self._heap)
+            if self._due.get(camera_id) != due:
+                continue  # stale heap entry, rescheduled or removed since
+            del self._due[camera_id]
+            camera = self.registry.get(camera_id)
+            if camera is None or not camera.get("enabled", True):
+                self._intervals.pop(camera_id, None)
+                continue
+            batch.append(camera)
+        return batch
+
+    async def _check_batch(self, batch: List[Camera]) -> None:
+        now = time.monotonic()
+        if self.agents is not None:
+            remote = [camera for camera in batch if self.agents.owns(camera)]
+            if remote:
+                interval = float(self.settings.check_interval_seconds)
+                for camera in remote:
+                    self._schedule(str(camera.get("id")), now + interval + self._jitter(interval))
+                batch = [camera for camera in batch if not self.agents.owns(camera)]
+        if not batch:
+            return
+        before = {str(camera.get("id")): camera.get("last_status_change_at") for camera in batch}
+        was_down = {str(camera.get("id")) for camera in batch if camera.get("last_status") in DOWN_STATUSES}
+        self._running.update(before)
+        try:
+            # Cameras a running full cycle is probing are skipped and rescheduled like the rest.
+            self.probes += len(await self.coordinator.check_batch(batch))
+        except Exception:
+            logger.exception("Scheduled check of %d cameras failed", len(batch))
+        finally:
+            self._running.difference_update(before)
+
+        now = time.monotonic()
+        for camera in batch:
+            camera_id = str(camera.get("id"))
+            if self.registry.get(camera_id) is None:
+                continue
+            interval = self.next_interval(camera, camera.get("last_status_change_at") != before[camera_id])
+            self._schedule(camera_id, now + interval + self._jitter(interval))
+            recovered = camera_id in was_down and camera.get("last_status") not in DOWN_STATUSES
+            if recovered and self.topology is not None:
+                for child_id in self.topology.descendants(camera_id):
+                    self._schedule(child_id, now)
+
+    async def check_now(self, cameras: List[Camera]) -> None:
+        """Probe ``cameras`` right away, e.g. after an import, and reschedule them from the result."""
+
+        batch = []
+        for camera in cameras:
+            camera_id = str(camera.get("id"))
+            # Their heap entries become stale and are skipped.
+            self._due.pop(camera_id, None)
+            if camera_id not in self._running and camera.get("enabled", True):
+                batch.append(camera)
+        await self._check_batch(batch)
+
+    async def run(self) -> None:
+        self.seed()
+        while True:
+            now = time.monotonic()
+            if not self._heap or self._heap[0][0] > now:
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            batch = self._pop_due_batch(now)
+            if batch:
+                await self._check_batch(batch)
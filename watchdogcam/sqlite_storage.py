@@ -0,0 +1,185 @@
+"""SQLite storage backend.
+
+Cameras live in a table instead of a JSON array that is rewritten whole,
+with unique indexes on ``id`` and ``ip``.  Lookups go through the in-memory
+registry, so the table has no other indexes to keep up.  The database runs in WAL mode and every save — in
+particular all status updates of a check cycle — is a single transaction
+that only touches the rows that changed.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Collection, Dict, List, Tuple
+
+from storage import Camera, SubscriberId, read_cameras, read_subscribers
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = (
+    "id",
+    "name",
+    "ip",
+    "enabled",
+    "last_status",
+    "previous_status",
+    "last_check_at",
+    "last_status_change_at",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cameras (
+    id TEXT NOT NULL,
+    name TEXT,
+    ip TEXT NOT NULL,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    last_status TEXT,
+    previous_status TEXT,
+    last_check_at TEXT,
+    last_status_change_at TEXT,
+    extra TEXT,
+    position INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS cameras_id ON cameras (id);
+CREATE UNIQUE INDEX IF NOT EXISTS cameras_ip ON cameras (ip);
+DROP INDEX IF EXISTS cameras_enabled_status;
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id INTEGER PRIMARY KEY
+);
+"""
+
+_UPSERT = f"""
+INSERT INTO cameras ({", ".join(_COLUMNS)}, extra, position)
+VALUES ({", ".join("?" for _ in _COLUMNS)}, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    {", ".join(f"{column} = excluded.{column}" for column in _COLUMNS[1:])},
+    extra = excluded.extra
+"""
+
+
+def _to_row(camera: Camera, position: int) -> Tuple[object, ...]:
+    extra = {key: value for key, value in camera.items() if key not in _COLUMNS}
+    return (
+        str(camera.get("id")),
+        camera.get("name"),
+        str(camera.get("ip")),
+        1 if camera.get("enabled", True) else 0,
+        camera.get("last_status"),
+        camera.get("previous_status"),
+        camera.get("last_check_at"),
+        camera.get("last_status_change_at"),
+        json.dumps(extra, ensure_ascii=False) if extra else None,
+        position,
+    )
+
+
+def _from_row(row: sqlite3.Row) -> Camera:
+    camera: Camera = {column: row[column] for column in _COLUMNS}
+    camera["enabled"] = bool(row["enabled"])
+    if row["extra"]:
+        camera.update(json.loads(row["extra"]))
+    return camera
+
+
+class SqliteStore:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Saves run in a worker thread; the lock serializes access instead.
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def load_cameras(self) -> List[Camera]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)}, extra FROM cameras ORDER BY position, rowid"
+            ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def save_cameras(
+        self,
+        cameras: List[Camera],
+        changed: List[Camera],
+        removed: Collection[str],
+        checked: Dict[str, Collection[str]],
+    ) -> None:
+        positions = {str(camera.get("id")): index for index, camera in enumerate(cameras)}
+        with self._lock, self._conn:
+            if removed:
+                self._conn.executemany("DELETE FROM cameras WHERE id = ?", [(camera_id,) for camera_id in removed])
+            if changed:
+                # Cameras may have swapped IPs since the last save; with the old rows still in place
+                # the unique IP index would reject the first upsert.  Re-inserting keeps the positions.
+                self._conn.executemany(
+                    "DELETE FROM cameras WHERE id = ?", [(str(camera.get("id")),) for camera in changed]
+                )
+                self._conn.executemany(
+                    _UPSERT,
+                    [_to_row(camera, positions.get(str(camera.get("id")), len(positions))) for camera in changed],
+                )
+            for checked_at, camera_ids in checked.items():
+                self._conn.executemany(
+                    "UPDATE cameras SET last_check_at = ? WHERE id = ?",
+                    [(checked_at, camera_id) for camera_id in camera_ids],
+                )
+
+    def read_subscribers(self) -> list[SubscriberId]:
+        with self._lock:
+            rows = self._conn.execute("SELECT chat_id FROM subscribers ORDER BY rowid").fetchall()
+        return [int(row["chat_id"]) for row in rows]
+
+    def write_subscribers(self, subscribers: list[SubscriberId]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM subscribers")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO subscribers (chat_id) VALUES (?)",
+                [(int(chat_id),) for chat_id in subscribers],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_from_json(store: SqliteStore, cameras_file: Path, subscribers_file: Path) -> Tuple[int, int]:
+    """Copy cameras and subscribers from the JSON files into ``store``.
+
+    Cameras without an ID get a new one; cameras without an IP or with an
+    ID/IP that was already imported are skipped with a warning.  Returns the
+    number of imported cameras and subscribers.
+    """
+
+    cameras: List[Camera] = []
+    seen_ids: set[str] = set()
+    seen_ips: set[str] = set()
+    for camera in read_cameras(cameras_file):
+        if not camera.get("id"):
+            camera["id"] = str(uuid.uuid4())
+        camera_id, ip = camera.get("id"), camera.get("ip")
+        if not ip or str(camera_id) in seen_ids or str(ip) in seen_ips:
+            logger.warning("Skipping camera %s (%s) during migration: missing or duplicate id/ip", camera_id, ip)
+            continue
+        seen_ids.add(str(camera_id))
+        seen_ips.add(str(ip))
+        cameras.append(camera)
+
+    subscribers = read_subscribers(subscribers_file) if subscribers_file.exists() else []
+
+    store.save_cameras(cameras, cameras, (), {})
+    store.write_subscribers(subscribers)
+    logger.info(
+        "Migrated %d cameras from %s and %d subscribers from %s into %s",
+        len(cameras),
+        cameras_file,
+        len(subscribers),
+        subscribers_file,
+        store.path,
+    )
+    return len(cameras), len(subscribers)
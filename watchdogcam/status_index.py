@@ -0,0 +1,172 @@
+"""Incrementally maintained status index and cached list pages.
+
+The index listens to the camera registry, so every add, edit, delete and
+status change made by a check cycle updates it in place.  It keeps per-status
+counters for ``/stats`` and, for every list view (all enabled cameras, online,
+degraded, offline), the cameras in registry order.  Lists are shown in pages
+of ``PAGE_SIZE`` cameras; rendered page bodies are cached and a page is
+dropped from the cache only when one of its cameras changes, or when cameras
+are inserted or removed before or on it and shift its contents.
+"""
+import logging
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from registry import CameraRegistry
+from storage import Camera
+
+logger = logging.getLogger(__name__)
+
+VIEWS = ("all", "online", "degraded", "offline")
+PAGE_SIZE = 25
+STATUS_TEXT = {
+    "online": "работает",
+    "degraded": "с задержками",
+    "offline": "не работает",
+    "unreachable": "недоступна (отказ вышестоящего узла)",
+}
+# Long names or addresses are shortened so a full page fits in one message.
+FIELD_LIMIT = 64
+
+
+def _shorten(value: object) -> str:
+    text = str(value)
+    return text if len(text) <= FIELD_LIMIT else text[: FIELD_LIMIT - 1] + "…"
+
+
+def status_text(camera: Camera) -> str:
+    return STATUS_TEXT.get(str(camera.get("last_status")), "неизвестно")
+
+
+def format_camera_line(camera: Camera) -> str:
+    return f"{_shorten(camera.get('name'))} – {_shorten(camera.get('ip'))} – {status_text(camera)}"
+
+
+def _format_view_line(view: str, camera: Camera) -> str:
+    if view == "all":
+        return format_camera_line(camera)
+    return f"• {_shorten(camera.get('name'))} – {_shorten(camera.get('ip'))}"
+
+
+class StatusIndex:
+    def __init__(self, registry: CameraRegistry, page_size: int = PAGE_SIZE) -> None:
+        self.registry = registry
+        self.page_size = page_size
+        self.renders = 0
+        self._seq: Dict[str, int] = {}
+        self._ids_by_seq: Dict[int, str] = {}
+        self._next_seq = 0
+        # Status of every enabled camera; disabled cameras are not listed.
+        self._status: Dict[str, str] = {}
+        self._counts: Counter = Counter()
+        self._views: Dict[str, List[int]] = {view: [] for view in VIEWS}
+        self._pages: Dict[str, Dict[int, str]] = {view: {} for view in VIEWS}
+
+        for camera in registry.all():
+            self._on_camera_changed(str(camera.get("id")), camera)
+        registry.add_listener(self._on_camera_changed)
+
+    # Counters ------------------------------------------------------------
+
+    @property
+    def total(self) -> int:
+        return len(self._status)
+
+    def count(self, status: str) -> int:
+        return self._counts[status]
+
+    def counts(self) -> Dict[str, int]:
+        return {status: count for status, count in self._counts.items() if count}
+
+    # Maintenance ---------------------------------------------------------
+
+    @staticmethod
+    def _views_for(status: str | None) -> Tuple[str, ...]:
+        if status is None:
+            return ()
+        return ("all", status) if status in VIEWS else ("all",)
+
+    def _on_camera_changed(self, camera_id: str, camera: Camera | None) -> None:
+        old_status = self._status.get(camera_id)
+        if camera is None or not camera.get("enabled", True):
+            new_status = None
+        else:
+            new_status = camera.get("last_status") or "unknown"
+
+        seq = self._seq.get(camera_id)
+        if seq is None:
+            if camera is None:
+                return
+            seq = self._seq[camera_id] = self._next_seq
+            self._ids_by_seq[seq] = camera_id
+            self._next_seq += 1
+
+        old_views = self._views_for(old_status)
+        new_views = self._views_for(new_status)
+        for view in old_views:
+            if view not in new_views:
+                self._remove(view, seq)
+        for view in new_views:
+            if view in old_views:
+                self._touch(view, seq)
+            else:
+                self._insert(view, seq)
+
+        if old_status is not None:
+            self._counts[old_status] -= 1
+            del self._status[camera_id]
+        if new_status is not None:
+            self._counts[new_status] += 1
+            self._status[camera_id] = new_status
+        if camera is None:
+            del self._seq[camera_id]
+            del self._ids_by_seq[seq]
+
+    def _invalidate_from(self, view: str, position: int) -> None:
+        first_page = position // self.page_size
+        pages = self._pages[view]
+        for page in [page for page in pages if page >= first_page]:
+            del pages[page]
+
+    def _insert(self, view: str, seq: int) -> None:
+        members = self._views[view]
+        position = bisect_left(members, seq)
+        insort(members, seq)
+        self._invalidate_from(view, position)
+
+    def _remove(self, view: str, seq: int) -> None:
+        members = self._views[view]
+        position = bisect_left(members, seq)
+        if position < len(members) and members[position] == seq:
+            del members[position]
+            self._invalidate_from(view, position)
+
+    def _touch(self, view: str, seq: int) -> None:
+        position = bisect_left(self._views[view], seq)
+        self._pages[view].pop(position // self.page_size, None)
+
+    # Pages ---------------------------------------------------------------
+
+    def size(self, view: str) -> int:
+        return len(self._views[view])
+
+    def page_count(self, view: str) -> int:
+        return max(1, -(-len(self._views[view]) // self.page_size))
+
+    def page(self, view: str, page: int) -> Tuple[str, int, int]:
+        """Return the body of ``page`` of ``view`` with the clamped page number and page count."""
+
+        pages = self.page_count(view)
+        page = min(max(page, 0), pages - 1)
+        body = self._pages[view].get(page)
+        if body is None:
+            start = page * self.page_size
+            lines = []
+            for seq in self._views[view][start : start + self.page_size]:
+                camera = self.registry.get(self._ids_by_seq[seq])
+                if camera is not None:
+                    lines.append(_format_view_line(view, camera))
+            body = self._pages[view][page] = "\n".join(lines)
+            self.renders += 1
+        return body, page, pages
@@ -2,7 +2,10 @@ import json
 import logging
 import shutil
 from pathlib import Path
-from typing import Dict, List
+from typing import TYPE_CHECKING, Collection, Dict, List, Protocol
+
+if TYPE_CHECKING:
+    from config import Settings
 
 logger = logging.getLogger(__name__)
 
@@ -65,3 +68,86 @@ def find_camera(cameras: List[Camera], target: str) -> Camera | None:
         if camera.get("id") == target or camera.get("ip") == target:
             return camera
     return None
+
+
+class CameraStore(Protocol):
+    """Persistence backend behind :class:`registry.CameraRegistry`."""
+
+    def load_cameras(self) -> List[Camera]:
+        ...
+
+    def save_cameras(
+        self,
+        cameras: List[Camera],
+        changed: List[Camera],
+        removed: Collection[str],
+        checked: Dict[str, Collection[str]],
+    ) -> None:
+        """Persist pending changes.
+
+        ``cameras`` is the full current list, ``changed`` the cameras modified
+        since the last save, ``removed`` the IDs deleted since then and
+        ``checked`` maps a check timestamp to the IDs whose ``last_check_at``
+        was set to it without any other change.
+        """
+
+    def read_subscribers(self) -> list[SubscriberId]:
+        ...
+
+    def write_subscribers(self, subscribers: list[SubscriberId]) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class JsonStore:
+    """The default backend: whole-file JSON arrays for cameras and subscribers."""
+
+    def __init__(self, cameras_file: Path, subscribers_file: Path) -> None:
+        self.cameras_file = cameras_file
+        self.subscribers_file = subscribers_file
+
+    def load_cameras(self) -> List[Camera]:
+        return read_cameras(self.cameras_file)
+
+    def save_cameras(
+        self,
+        cameras: List[Camera],
+        changed: List[Camera],
+        removed: Collection[str],
+        checked: Dict[str, Collection[str]],
+    ) -> None:
+        write_cameras(self.cameras_file, cameras)
+
+    def read_subscribers(self) -> list[SubscriberId]:
+        return read_subscribers(self.subscribers_file)
+
+    def write_subscribers(self, subscribers: list[SubscriberId]) -> None:
+        write_subscribers(self.subscribers_file, subscribers)
+
+    def close(self) -> None:
+        pass
+
+
+def open_store(settings: "Settings") -> CameraStore:
+    """Create the storage backend selected by ``settings.storage_backend``."""
+
+    if settings.storage_backend == "sqlite":
+        from sqlite_storage import SqliteStore, migrate_from_json
+
+        is_new = not settings.database_file.exists()
+        store = SqliteStore(settings.database_file)
+        if is_new and settings.cameras_file.exists():
+            migrate_from_json(store, settings.cameras_file, settings.subscribers_file)
+        return store
+    if settings.storage_backend == "journal":
+        from journal import JournalStore
+
+        return JournalStore(
+            settings.cameras_file,
+            settings.subscribers_file,
+            settings.journal_file or settings.cameras_file.with_suffix(".journal"),
+            compact_bytes=settings.journal_compact_bytes,
+        )
+    return JsonStore(settings.cameras_file, settings.subscribers_file)
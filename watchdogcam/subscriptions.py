@@ -0,0 +1,236 @@
+"""Per-subscriber notification filters and mutes.
+
+Cameras carry tags: the optional ``tags`` list of the camera entry plus its
+``site``.  A subscriber either gets notifications about every camera or,
+after ``/subscribe <tag>...``, only about cameras with one of those tags.
+``/mute`` silences a camera (by ID or IP), a tag or everything for a while.
+
+The filters live in SUBSCRIPTIONS_FILE next to the subscriber list of the
+storage backend and are indexed by tag, so resolving the recipients of a
+status change costs one set lookup per camera tag instead of a pass over
+every subscriber.  The subscriber list is read once and kept in memory;
+``/start`` and ``/subscribe`` write it back through the store.
+"""
+import json
+import logging
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from storage import Camera, CameraStore, SubscriberId
+
+logger = logging.getLogger(__name__)
+
+# Mute target that silences every camera.
+MUTE_ALL = "all"
+_DURATION_RE = re.compile(r"^(\d+)\s*(m|min|h|d|м|мин|ч|д)?$")
+_DURATION_UNITS = {"m": 60, "min": 60, "м": 60, "мин": 60, "h": 3600, "ч": 3600, "d": 86400, "д": 86400}
+
+
+def normalize_tag(tag: object) -> str:
+    return str(tag).strip().lower()
+
+
+def parse_tags(value: object) -> List[str]:
+    """Normalized tags from a list or a comma- or space-separated string, in order, without duplicates."""
+
+    items = re.split(r"[,\s]+", value) if isinstance(value, str) else value or []
+    tags: List[str] = []
+    for item in items:
+        tag = normalize_tag(item)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def camera_tags(camera: Camera) -> set[str]:
+    """Tags of a camera: its ``tags`` list and its ``site``."""
+
+    tags = set(parse_tags(camera.get("tags")))
+    if camera.get("site"):
+        tags.add(normalize_tag(camera["site"]))
+    return tags
+
+
+def parse_duration(text: str) -> int:
+    """Seconds in ``30m``, ``2h``, ``1d`` or a bare number of minutes; raises :class:`ValueError`."""
+
+    match = _DURATION_RE.match(text.strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"не понимаю длительность {text!r}, примеры: 30m, 2h, 1d")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2) or "m"]
+
+
+class Subscriptions:
+    def __init__(self, store: CameraStore, path: Path | None = None) -> None:
+        self.store = store
+        self.path = path
+        self._subscribers: set[SubscriberId] = set(store.read_subscribers())
+        self._tags: Dict[SubscriberId, set[str]] = {}
+        # Mute target (camera ID or IP, tag, or MUTE_ALL) -> end as a Unix timestamp.
+        self._muted: Dict[SubscriberId, Dict[str, float]] = {}
+        self._load()
+        self._by_tag: Dict[str, set[SubscriberId]] = {}
+        self._everything: set[SubscriberId] = set()
+        self._reindex()
+
+    # Persistence ---------------------------------------------------------
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            for chat_id, entry in data.items():
+                if entry.get("tags"):
+                    self._tags[int(chat_id)] = {normalize_tag(tag) for tag in entry["tags"]}
+                if entry.get("muted"):
+                    self._muted[int(chat_id)] = {str(target): float(until) for target, until in entry["muted"].items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            logger.exception("Invalid subscriptions file %s; ignoring it", self.path)
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        now = time.time()
+        data = {}
+        for chat_id in sorted(set(self._tags) | set(self._muted)):
+            entry: dict = {}
+            if self._tags.get(chat_id):
+                entry["tags"] = sorted(self._tags[chat_id])
+            muted = {target: until for target, until in self._muted.get(chat_id, {}).items() if until > now}
+            if muted:
+                entry["muted"] = muted
+            if entry:
+                data[str(chat_id)] = entry
+        temp_path = self.path.with_suffix(".tmp")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with temp_path.open("w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False, indent=2)
+        shutil.move(str(temp_path), self.path)
+
+    def _reindex(self) -> None:
+        by_tag: Dict[str, set[SubscriberId]] = {}
+        everything: set[SubscriberId] = set()
+        for chat_id in self._subscribers:
+            tags = self._tags.get(chat_id)
+            if not tags:
+                everything.add(chat_id)
+            for tag in tags or ():
+                by_tag.setdefault(tag, set()).add(chat_id)
+        self._by_tag, self._everything = by_tag, everything
+
+    # Subscribers ---------------------------------------------------------
+
+    @property
+    def subscribers(self) -> List[SubscriberId]:
+        return sorted(self._subscribers)
+
+    def is_subscribed(self, chat_id: SubscriberId) -> bool:
+        return chat_id in self._subscribers
+
+    def subscribe(self, chat_id: SubscriberId, tags: Iterable[str] = ()) -> None:
+        """Subscribe ``chat_id``; with ``tags`` it is limited to (additionally) those tags."""
+
+        if chat_id not in self._subscribers:
+            self._subscribers.add(chat_id)
+            self.store.write_subscribers(self.subscribers)
+        new_tags = parse_tags(list(tags))
+        if new_tags:
+            self._tags.setdefault(chat_id, set()).update(new_tags)
+            self._save()
+        self._reindex()
+
+    def unsubscribe(self, chat_id: SubscriberId, tags: Iterable[str] = ()) -> List[str]:
+        """Drop some of the tags of ``chat_id`` or, without ``tags``, the whole subscription.
+
+        Returns the given tags that were not in the filter; those change nothing.
+        """
+
+        requested = parse_tags(list(tags))
+        current = self._tags.get(chat_id, set())
+        unknown = [tag for tag in requested if tag not in current]
+        removed = set(requested) & current
+        if requested and not removed:
+            return unknown
+        if removed:
+            remaining = current - removed
+            if remaining:
+                self._tags[chat_id] = remaining
+            else:
+                # Removing the last tag would silently widen the filter to every camera.
+                self._tags.pop(chat_id, None)
+                self._subscribers.discard(chat_id)
+                self.store.write_subscribers(self.subscribers)
+        else:
+            self._tags.pop(chat_id, None)
+            self._muted.pop(chat_id, None)
+            if chat_id in self._subscribers:
+                self._subscribers.discard(chat_id)
+                self.store.write_subscribers(self.subscribers)
+        self._save()
+        self._reindex()
+        return unknown
+
+    def tags(self, chat_id: SubscriberId) -> List[str]:
+        return sorted(self._tags.get(chat_id, ()))
+
+    # Mutes ---------------------------------------------------------------
+
+    def mute(self, chat_id: SubscriberId, target: str, seconds: int) -> float:
+        until = time.time() + seconds
+        self._muted.setdefault(chat_id, {})[target] = until
+        self._save()
+        return until
+
+    def unmute(self, chat_id: SubscriberId, target: str | None = None) -> bool:
+        muted = self._muted.get(chat_id, {})
+        if target is None:
+            found = bool(muted)
+            self._muted.pop(chat_id, None)
+        else:
+            found = muted.pop(target, None) is not None
+        self._save()
+        return found
+
+    def mutes(self, chat_id: SubscriberId) -> Dict[str, float]:
+        now = time.time()
+        return {target: until for target, until in self._muted.get(chat_id, {}).items() if until > now}
+
+    def _is_muted(self, chat_id: SubscriberId, keys: Iterable[str], now: float) -> bool:
+        muted = self._muted.get(chat_id)
+        return bool(muted) and any(muted.get(key, 0) > now for key in keys)
+
+    def unmuted(self, now: float | None = None) -> List[SubscriberId]:
+        """Subscribers that have not muted everything, for messages that are not about one camera."""
+
+        now = time.time() if now is None else now
+        return [chat_id for chat_id in self.subscribers if not self._is_muted(chat_id, (MUTE_ALL,), now)]
+
+    # Routing -------------------------------------------------------------
+
+    def recipients(self, camera: Camera, now: float | None = None) -> set[SubscriberId]:
+        """Subscribers that want notifications about ``camera`` right now."""
+
+        tags = camera_tags(camera)
+        chats = set(self._everything)
+        for tag in tags:
+            chats |= self._by_tag.get(tag, set())
+        if self._muted:
+            now = time.time() if now is None else now
+            keys = [MUTE_ALL, str(camera.get("id")), str(camera.get("ip")), *tags]
+            chats = {chat_id for chat_id in chats if not self._is_muted(chat_id, keys, now)}
+        return chats
+
+    def route(self, cameras: Iterable[Camera]) -> Dict[SubscriberId, List[Camera]]:
+        """Group changed ``cameras`` by the subscribers that should hear about them."""
+
+        now = time.time()
+        by_recipient: Dict[SubscriberId, List[Camera]] = {}
+        for camera in cameras:
+            for chat_id in self.recipients(camera, now):
+                by_recipient.setdefault(chat_id, []).append(camera)
+        return by_recipient
@@ -0,0 +1,139 @@
+"""Upstream dependencies between cameras and infrastructure nodes.
+
+Any entry of the cameras file may name its upstream node (gateway, switch,
+NVR) in a ``parent`` field, by ID or IP; the node itself is an ordinary
+entry, usually with its own probe, and may have a parent as well.  Check
+cycles probe nodes before the cameras behind them, and a camera whose
+upstream chain contains an ``offline`` node is marked ``unreachable``
+without being probed.
+
+The parent links are rebuilt lazily after a camera is added, removed, or has
+its ``parent`` or address changed; status updates do not touch them.
+"""
+import logging
+from typing import Dict, List
+
+from registry import CameraRegistry
+from storage import Camera
+
+logger = logging.getLogger(__name__)
+
+# Statuses that cut off everything behind a node.
+DOWN_STATUSES = ("offline", "unreachable")
+
+
+class Topology:
+    def __init__(self, registry: CameraRegistry) -> None:
+        self.registry = registry
+        # Raw ``parent`` references and addresses, to spot relevant changes.
+        self._refs: Dict[str, str] = {}
+        self._ips: Dict[str, str] = {}
+        self._parent: Dict[str, str] = {}
+        self._children: Dict[str, List[str]] = {}
+        self._depth: Dict[str, int] = {}
+        self._stale = True
+
+        for camera in registry.all():
+            self._on_camera_changed(str(camera.get("id")), camera)
+        registry.add_listener(self._on_camera_changed)
+
+    def _on_camera_changed(self, camera_id: str, camera: Camera | None) -> None:
+        if camera is None:
+            self._refs.pop(camera_id, None)
+            self._ips.pop(camera_id, None)
+            self._stale = True
+            return
+        ref = str(camera.get("parent") or "")
+        ip = str(camera.get("ip"))
+        if self._ips.get(camera_id) == ip and self._refs.get(camera_id, "") == ref:
+            return
+        self._ips[camera_id] = ip
+        if ref:
+            self._refs[camera_id] = ref
+        else:
+            self._refs.pop(camera_id, None)
+        self._stale = True
+
+    def _rebuild(self) -> None:
+        parent: Dict[str, str] = {}
+        for camera_id, ref in self._refs.items():
+            node = self.registry.find(ref)
+            if node is None:
+                logger.warning("Parent %s of camera %s not found, ignoring it", ref, camera_id)
+                continue
+            parent[camera_id] = str(node.get("id"))
+
+        depth: Dict[str, int] = {}
+        for camera_id in list(parent):
+            while camera_id not in depth:
+                chain = [camera_id]
+                node = parent.get(camera_id)
+                while node is not None and node not in depth and node not in chain:
+                    chain.append(node)
+                    node = parent.get(node)
+                if node is not None and node in chain:
+                    logger.warning("Parent loop through camera %s, ignoring its parent", node)
+                    del parent[node]
+                    continue
+                base = depth[node] + 1 if node is not None else 0
+                for offset, member in enumerate(reversed(chain)):
+                    depth[member] = base + offset
+
+        children: Dict[str, List[str]] = {}
+        for camera_id, parent_id in parent.items():
+            children.setdefault(parent_id, []).append(camera_id)
+        self._parent, self._children, self._depth = parent, children, depth
+        self._stale = False
+
+    def _fresh(self) -> "Topology":
+        if self._stale:
+            self._rebuild()
+        return self
+
+    @property
+    def empty(self) -> bool:
+        return not self._fresh()._parent
+
+    def parent(self, camera_id: str) -> Camera | None:
+        parent_id = self._fresh()._parent.get(camera_id)
+        return self.registry.get(parent_id) if parent_id is not None else None
+
+    def depth(self, camera_id: str) -> int:
+        return self._fresh()._depth.get(camera_id, 0)
+
+    def children(self, camera_id: str) -> List[str]:
+        return self._fresh()._children.get(camera_id, [])
+
+    def descendants(self, camera_id: str) -> List[str]:
+        found: List[str] = []
+        pending = list(self.children(camera_id))
+        while pending:
+            node = pending.pop()
+            found.append(node)
+            pending.extend(self._children.get(node, ()))
+        return found
+
+    def blocking_node(self, camera_id: str) -> Camera | None:
+        """The nearest enabled upstream node that is down, or ``None``.
+
+        Disabled nodes are not probed, so their status says nothing and they
+        are looked through.
+        """
+
+        node = self.parent(camera_id)
+        while node is not None:
+            if node.get("enabled", True) and node.get("last_status") in DOWN_STATUSES:
+                return node
+            node = self.parent(str(node.get("id")))
+        return None
+
+    def root_cause(self, camera_id: str) -> Camera | None:
+        """The topmost enabled upstream node that is down, i.e. the failure to report."""
+
+        cause = None
+        node = self.parent(camera_id)
+        while node is not None:
+            if node.get("enabled", True) and node.get("last_status") in DOWN_STATUSES:
+                cause = node
+            node = self.parent(str(node.get("id")))
+        return cause
@@ -0,0 +1,430 @@
+"""Memory-mapped uptime history for SLA queries.
+
+The history is a fixed-width binary time series: one row per time slot
+(``slot_seconds`` long, one minute by default) with a 2-bit code per camera
+column, four cameras to a byte.  Codes are ``0`` no data (bot not running,
+camera disabled, status unknown, or camera unreachable behind a failed
+upstream node), ``1`` online, ``2`` degraded and ``3`` offline.  2 000
+cameras at one-minute resolution take 500 bytes per slot, or about 260 MB
+for a year.
+
+Rows are appended as time passes: every slot gets the current status of every
+camera (a camera keeps its last known status until its next check), and a
+status change also patches the row of the running slot.  The file grows by a
+day of rows at a time.  Camera IDs are mapped to columns in a small JSON file
+next to it.  When a new camera does not fit the row width, the file is
+rewritten with twice as many columns in a worker thread; until then the new
+columns are kept in memory only.  Once a day of rows has piled up beyond
+``retention_days``, the same rewrite copies the file without its oldest rows.
+
+Queries slice one camera's column out of the mapping with a strided slice and
+decode it with :meth:`bytes.translate`, so uptime percentages and outage
+intervals over 24h/7d/30d windows never loop over slots in Python.
+"""
+import asyncio
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from registry import CameraRegistry
+from storage import Camera
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WDCU"
+VERSION = 1
+# magic, version, slot seconds, column capacity, start epoch, written slots
+_HEADER = struct.Struct("<4sHIIqQ")
+HEADER_SIZE = 64
+
+NO_DATA, ONLINE, DEGRADED, OFFLINE = range(4)
+STATUS_CODES = {"online": ONLINE, "degraded": DEGRADED, "offline": OFFLINE}
+
+# Slots skipped while the event loop was busy are filled with the current
+# status; longer gaps mean the bot was not running and stay without data.
+MAX_FILL_SLOTS = 5
+
+WINDOWS = {"24h": 24 * 3600, "7d": 7 * 24 * 3600, "30d": 30 * 24 * 3600}
+
+_OUTAGE_RE = re.compile(bytes([OFFLINE]) + b"+")
+# _DECODE[k] maps a packed byte to the code of the k-th camera in it.
+_DECODE = [bytes((value >> (2 * shift)) & 3 for value in range(256)) for shift in range(4)]
+
+
+@dataclass
+class UptimeReport:
+    window_seconds: int
+    # Percentage of slots with data in which the camera was up; ``None`` without data.
+    uptime_percent: float | None
+    # Fraction of the window for which there is data at all.
+    coverage: float
+    # Offline intervals as (start, end) epoch seconds, oldest first.
+    outages: List[Tuple[float, float]] = field(default_factory=list)
+
+
+def _round_capacity(columns: int) -> int:
+    capacity = 64
+    while capacity < columns:
+        capacity *= 2
+    return capacity
+
+
+class UptimeHistory:
+    def __init__(
+        self,
+        path: Path,
+        slot_seconds: int = 60,
+        retention_days: int = 400,
+        registry: CameraRegistry | None = None,
+    ) -> None:
+        self.path = path
+        self.columns_file = path.with_name(path.name + ".columns.json")
+        self.slot_seconds = slot_seconds
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._file = None
+        self._map: mmap.mmap | None = None
+        self._capacity = 0
+        self._start = 0
+        self._slots = 0
+        self._allocated = 0
+        self._columns: Dict[str, int] = {}
+        self._columns_dirty = False
+        self._current = bytearray()
+        self._rewriting: asyncio.Future | None = None
+
+        self._open()
+        if registry is not None:
+            for camera in registry.all():
+                self._on_camera_changed(str(camera.get("id")), camera)
+            registry.add_listener(self._on_camera_changed)
+        if len(self._columns) > self._capacity:
+            self._request_grow(len(self._columns))
+        self._save_columns()
+
+    # File layout ---------------------------------------------------------
+
+    @property
+    def row_bytes(self) -> int:
+        return self._capacity // 4
+
+    @property
+    def chunk_slots(self) -> int:
+        return max(1, 86400 // self.slot_seconds)
+
+    def _open(self) -> None:
+        if self.columns_file.exists():
+            try:
+                columns = json.loads(self.columns_file.read_text(encoding="utf-8"))
+                self._columns = {str(key): int(value) for key, value in columns.items()}
+            except (OSError, ValueError, AttributeError):
+                logger.exception("Invalid uptime column map %s; starting a new history", self.columns_file)
+                self._columns = {}
+                self.path.unlink(missing_ok=True)
+
+        if self.path.exists() and self.path.stat().st_size >= HEADER_SIZE:
+            with self.path.open("rb") as fh:
+                magic, version, slot_seconds, capacity, start, slots = _HEADER.unpack(fh.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{self.path} is not an uptime history file")
+            if slot_seconds != self.slot_seconds:
+                logger.warning(
+                    "%s uses %ss slots, ignoring the configured %ss", self.path, slot_seconds, self.slot_seconds
+                )
+                self.slot_seconds = slot_seconds
+            self._capacity, self._start, self._slots = capacity, start, slots
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._capacity = _round_capacity(len(self._columns) + 1)
+            self._start = int(time.time()) // self.slot_seconds * self.slot_seconds
+            self._slots = 0
+            with self.path.open("wb") as fh:
+                fh.write(_HEADER.pack(MAGIC, VERSION, self.slot_seconds, self._capacity, self._start, self._slots))
+
+        self._current = bytearray(self.row_bytes)
+        self._map_file(self._slots + self.chunk_slots)
+
+    def _map_file(self, slots: int) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._allocated = slots
+        self._file = self.path.open("r+b")
+        self._file.truncate(HEADER_SIZE + slots * self.row_bytes)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _store_header(self) -> None:
+        self._map[: _HEADER.size] = _HEADER.pack(
+            MAGIC, VERSION, self.slot_seconds, self._capacity, self._start, self._slots
+        )
+
+    def _row_offset(self, slot: int) -> int:
+        return HEADER_SIZE + slot * self.row_bytes
+
+    @property
+    def _rewrite_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".tmp")
+
+    def _request_grow(self, columns: int) -> None:
+        """Make room for ``columns`` cameras per row without blocking the event loop."""
+
+        self._request_rewrite(_round_capacity(columns), 0)
+
+    def _request_trim(self) -> None:
+        """Drop the rows older than ``retention_days`` without blocking the event loop."""
+
+        drop = self._slots - self.retention_days * 86400 // self.slot_seconds
+        if drop > 0:
+            self._request_rewrite(self._capacity, drop)
+
+    def _request_rewrite(self, capacity: int, drop: int) -> None:
+        if self._rewriting is not None:
+            # _rewritten() widens again if needed; the next tick() asks for the trim again.
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._finish_rewrite(capacity, drop, self._rewrite(capacity, drop))
+            return
+        self._rewriting = loop.run_in_executor(None, self._rewrite, capacity, drop)
+        self._rewriting.add_done_callback(lambda future: self._rewritten(capacity, drop, future))
+
+    def _rewrite(self, capacity: int, drop: int) -> int:
+        """Copy the rows written so far, without the first ``drop``, into a file with
+        ``capacity`` columns; returns how many rows of the old file were read.
+
+        Runs in a worker thread on a mapping of its own, so ticks and status
+        changes go on meanwhile.
+        """
+
+        with self._lock:
+            slots, old_row, start = self._slots, self.row_bytes, self._start
+        padding = bytes(capacity // 4 - old_row)
+        with (
+            self.path.open("rb") as source,
+            mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as view,
+            self._rewrite_path.open("wb") as fh,
+        ):
+            fh.write(_HEADER.pack(MAGIC, VERSION, self.slot_seconds, capacity, start + drop * self.slot_seconds, 0))
+            fh.write(bytes(HEADER_SIZE - _HEADER.size))
+            if padding:
+                for slot in range(drop, slots):
+                    offset = HEADER_SIZE + slot * old_row
+                    fh.write(view[offset : offset + old_row] + padding)
+            else:
+                # Same row width: copy a day of rows at a time.
+                step = self.chunk_slots * old_row
+                for offset in range(HEADER_SIZE + drop * old_row, HEADER_SIZE + slots * old_row, step):
+                    fh.write(view[offset : min(offset + step, HEADER_SIZE + slots * old_row)])
+        return slots
+
+    def _rewritten(self, capacity: int, drop: int, future: asyncio.Future) -> None:
+        self._rewriting = None
+        try:
+            copied = future.result()
+        except Exception:
+            logger.exception("Cannot rewrite the uptime history %s", self.path)
+            self._rewrite_path.unlink(missing_ok=True)
+            return
+        self._finish_rewrite(capacity, drop, copied)
+        if len(self._columns) > self._capacity:
+            self._request_grow(len(self._columns))
+
+    def _finish_rewrite(self, capacity: int, drop: int, copied: int) -> None:
+        """Copy the rows written since the rewrite started and switch to the new file."""
+
+        with self._lock:
+            if self._map is None:
+                self._rewrite_path.unlink(missing_ok=True)
+                return
+            old_row, new_row = self.row_bytes, capacity // 4
+            padding = bytes(new_row - old_row)
+            with self._rewrite_path.open("r+b") as fh:
+                # The last copied row may be the running slot, which status changes patch.
+                first = max(drop, copied - 1)
+                fh.seek(HEADER_SIZE + (first - drop) * new_row)
+                for slot in range(first, self._slots):
+                    offset = self._row_offset(slot)
+                    fh.write(self._map[offset : offset + old_row] + padding)
+            self._map.close()
+            self._file.close()
+            self._map = None
+            os.replace(self._rewrite_path, self.path)
+            self._capacity = capacity
+            self._slots -= drop
+            self._start += drop * self.slot_seconds
+            self._map_file(self._slots + self.chunk_slots)
+            self._store_header()
+            # Columns added meanwhile are only in the current row so far.
+            slot = self.slot_at(time.time())
+            if 0 <= slot < self._slots:
+                offset = self._row_offset(slot)
+                self._map[offset : offset + new_row] = bytes(self._current[:new_row])
+        if drop:
+            logger.info("Trimmed %d slots from the uptime history %s", drop, self.path)
+        else:
+            logger.info("Uptime history %s now has room for %d cameras", self.path, capacity)
+
+    # Recording -----------------------------------------------------------
+
+    def _save_columns(self) -> None:
+        if not self._columns_dirty:
+            return
+        self._columns_dirty = False
+        temp_path = self.columns_file.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self._columns), encoding="utf-8")
+        shutil.move(str(temp_path), self.columns_file)
+
+    def _column(self, camera_id: str) -> int:
+        column = self._columns.get(camera_id)
+        if column is None:
+            column = self._columns[camera_id] = len(self._columns)
+            if column // 4 >= len(self._current):
+                self._current += bytes(_round_capacity(column + 1) // 4 - len(self._current))
+            # Saved before the next row is written, see tick().
+            self._columns_dirty = True
+        return column
+
+    @staticmethod
+    def _set(row: bytearray | mmap.mmap, offset: int, column: int, code: int) -> None:
+        index = offset + column // 4
+        shift = 2 * (column % 4)
+        row[index] = (row[index] & ~(3 << shift) & 0xFF) | (code << shift)
+
+    def _on_camera_changed(self, camera_id: str, camera: Camera | None) -> None:
+        if camera is None or not camera.get("enabled", True):
+            code = NO_DATA
+            if camera_id not in self._columns:
+                return
+        else:
+            code = STATUS_CODES.get(str(camera.get("last_status")), NO_DATA)
+        with self._lock:
+            column = self._column(camera_id)
+            self._set(self._current, 0, column, code)
+            slot = self.slot_at(time.time())
+            if 0 <= slot < self._slots and column < self._capacity:
+                self._set(self._map, self._row_offset(slot), column, code)
+        if column >= self._capacity:
+            self._request_grow(column + 1)
+
+    def slot_at(self, timestamp: float) -> int:
+        return math.floor((timestamp - self._start) / self.slot_seconds)
+
+    def tick(self, now: float | None = None) -> None:
+        """Append rows up to the slot of ``now`` with the current statuses."""
+
+        slot = self.slot_at(time.time() if now is None else now)
+        with self._lock:
+            if slot < self._slots:
+                return
+            self._save_columns()
+            if slot >= self._allocated:
+                self._map_file(slot + self.chunk_slots)
+            row = bytes(self._current[: self.row_bytes])
+            for filled in range(max(self._slots, slot - MAX_FILL_SLOTS), slot + 1):
+                offset = self._row_offset(filled)
+                self._map[offset : offset + len(row)] = row
+            self._slots = slot + 1
+            self._store_header()
+            retention_slots = self.retention_days * 86400 // self.slot_seconds
+            trim = self._rewriting is None and self._slots > retention_slots + self.chunk_slots
+        if trim:
+            self._request_trim()
+
+    async def run(self) -> None:
+        while True:
+            self.tick()
+            now = time.time()
+            next_slot = self._start + (self.slot_at(now) + 1) * self.slot_seconds
+            await asyncio.sleep(max(0.0, next_slot - now))
+
+    def close(self) -> None:
+        with self._lock:
+            self._save_columns()
+            if self._map is not None:
+                self._map.flush()
+                self._map.close()
+                self._file.close()
+                self._map = None
+
+    # Queries -------------------------------------------------------------
+
+    def _codes(self, column: int, first_slot: int, last_slot: int) -> bytes:
+        """One code byte per slot in ``[first_slot, last_slot)`` for ``column``."""
+
+        first_slot = max(first_slot, 0)
+        last_slot = min(last_slot, self._slots)
+        if last_slot <= first_slot:
+            return b""
+        with self._lock:
+            start = self._row_offset(first_slot) + column // 4
+            end = self._row_offset(last_slot)
+            packed = self._map[start:end : self.row_bytes]
+        return packed.translate(_DECODE[column % 4])
+
+    def report(self, camera_id: str, window_seconds: int, now: float | None = None) -> UptimeReport:
+        now = time.time() if now is None else now
+        window_slots = max(1, window_seconds // self.slot_seconds)
+        last_slot = self.slot_at(now) + 1
+        first_slot = last_slot - window_slots
+        column = self._columns.get(camera_id)
+        if column is None or column >= self._capacity:
+            return UptimeReport(window_seconds, None, 0.0)
+
+        codes = self._codes(column, first_slot, last_slot)
+        down = codes.count(OFFLINE)
+        known = len(codes) - codes.count(NO_DATA)
+        offset = max(first_slot, 0)
+        outages = [
+            (
+                self._start + (offset + match.start()) * self.slot_seconds,
+                self._start + (offset + match.end()) * self.slot_seconds,
+            )
+            for match in _OUTAGE_RE.finditer(codes)
+        ]
+        return UptimeReport(
+            window_seconds,
+            (known - down) / known * 100 if known else None,
+            known / window_slots,
+            outages,
+        )
+
+    def fleet_uptime(
+        self, camera_ids: Iterable[str], window_seconds: int, now: float | None = None
+    ) -> Dict[str, float]:
+        """Uptime percentage over the window for every camera that has data in it."""
+
+        now = time.time() if now is None else now
+        last_slot = min(self.slot_at(now) + 1, self._slots)
+        first_slot = max(0, last_slot - max(1, window_seconds // self.slot_seconds))
+        if last_slot <= first_slot:
+            return {}
+        with self._lock:
+            block = self._map[self._row_offset(first_slot) : self._row_offset(last_slot)]
+
+        # Cameras sharing a byte column are sliced out of the block together.
+        by_byte: Dict[int, List[Tuple[str, int]]] = {}
+        for camera_id in camera_ids:
+            column = self._columns.get(camera_id)
+            if column is not None and column < self._capacity:
+                by_byte.setdefault(column // 4, []).append((camera_id, column % 4))
+
+        result: Dict[str, float] = {}
+        for byte, cameras in by_byte.items():
+            packed = block[byte :: self.row_bytes]
+            for camera_id, shift in cameras:
+                codes = packed.translate(_DECODE[shift])
+                known = len(codes) - codes.count(NO_DATA)
+                if known:
+                    result[camera_id] = (known - codes.count(OFFLINE)) / known * 100
+        return result
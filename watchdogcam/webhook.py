@@ -0,0 +1,151 @@
+"""Telegram webhook delivery as an alternative to long polling.
+
+With WEBHOOK_URL set the bot registers that URL with Telegram and receives
+updates as ``POST`` requests on the embedded HTTP server instead of keeping
+a long-poll request open.  Telegram must reach the URL over HTTPS, so the
+endpoint is normally published through a reverse proxy that terminates TLS
+and forwards to WEBHOOK_HOST:WEBHOOK_PORT.
+
+Every request has to carry WEBHOOK_SECRET in the
+``X-Telegram-Bot-Api-Secret-Token`` header.  Accepted updates are answered
+right away and handled by UPDATE_WORKERS workers.  Like notifications, every
+chat has its own queue and is served by one worker at a time, so its updates
+(and conversations) stay in order while a slow ``/check`` in one chat never
+holds up the others.  Updates Telegram redelivers are recognised by their ``update_id``.
+On shutdown the endpoint stops accepting updates and the ones already
+received get WEBHOOK_DRAIN_SECONDS to finish.
+"""
+import asyncio
+import hmac
+import json
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import Settings
+from httpserver import HttpServer, Request, Response
+from metrics import UPDATE_SECONDS, WEBHOOK_UPDATES
+
+logger = logging.getLogger(__name__)
+
+# Recent update IDs remembered to drop redeliveries.
+SEEN_UPDATES = 1024
+
+
+class TelegramWebhook:
+    def __init__(self, application: Application, settings: Settings) -> None:
+        self.application = application
+        self.settings = settings
+        self.path = urlsplit(settings.webhook_url).path or "/"
+        # Updates per chat in order.  A chat with updates is either in the ready queue
+        # once or being served by a worker, which puts it back while updates remain.
+        self._chats: Dict[int, Deque[Update]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._accepting = False
+
+    @property
+    def backlog(self) -> int:
+        return sum(len(updates) for updates in self._chats.values())
+
+    def route(self, server: HttpServer) -> None:
+        server.route("POST", self.path, self.handle_update)
+
+    async def start(self) -> None:
+        """Start the workers and point Telegram at WEBHOOK_URL; the HTTP server must be listening."""
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.settings.update_workers)]
+        self._accepting = True
+        await self.application.bot.set_webhook(
+            url=self.settings.webhook_url,
+            secret_token=self.settings.webhook_secret,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=max(1, min(100, self.settings.update_workers * 5)),
+        )
+        logger.info("Receiving updates through the webhook at %s", self.settings.webhook_url)
+
+    async def stop(self) -> None:
+        """Refuse new updates and give the received ones WEBHOOK_DRAIN_SECONDS to finish.
+
+        The webhook stays registered, so Telegram keeps updates that arrive
+        meanwhile and delivers them after the next start.
+        """
+
+        self._accepting = False
+        if self._chats and self.settings.webhook_drain_seconds > 0:
+            try:
+                await asyncio.wait_for(self._ready.join(), self.settings.webhook_drain_seconds)
+            except asyncio.TimeoutError:
+                logger.warning("Stopping with %d unprocessed updates", self.backlog)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _authorized(self, request: Request) -> bool:
+        supplied = request.headers.get("x-telegram-bot-api-secret-token", "").encode("utf-8")
+        return hmac.compare_digest(supplied, self.settings.webhook_secret.encode("utf-8"))
+
+    def _duplicate(self, update_id: int) -> bool:
+        if update_id in self._seen:
+            return True
+        self._seen[update_id] = None
+        if len(self._seen) > SEEN_UPDATES:
+            self._seen.popitem(last=False)
+        return False
+
+    async def handle_update(self, request: Request) -> Response:
+        if not self._authorized(request):
+            logger.warning("Rejected webhook request from %s: bad secret token", request.peer)
+            WEBHOOK_UPDATES.inc("unauthorized")
+            return Response(401, b"unauthorized")
+        if not self._accepting:
+            # Telegram retries later, after the restart.
+            return Response(503, b"shutting down")
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            WEBHOOK_UPDATES.inc("invalid")
+            return Response(400, b"invalid JSON")
+        if not isinstance(payload, dict) or not isinstance(payload.get("update_id"), int):
+            WEBHOOK_UPDATES.inc("invalid")
+            return Response(400, b"not an update")
+        if self._duplicate(payload["update_id"]):
+            WEBHOOK_UPDATES.inc("duplicate")
+            return Response(200, b"ok")
+
+        update = Update.de_json(payload, self.application.bot)
+        chat = update.effective_chat
+        user = update.effective_user
+        key = chat.id if chat is not None else user.id if user is not None else 0
+        updates = self._chats.get(key)
+        if updates is None:
+            self._chats[key] = deque([update])
+            self._ready.put_nowait(key)
+        else:
+            updates.append(update)
+        WEBHOOK_UPDATES.inc("accepted")
+        return Response(200, b"ok")
+
+    async def _worker(self) -> None:
+        while True:
+            key: int = await self._ready.get()
+            updates = self._chats[key]
+            update = updates.popleft()
+            try:
+                with UPDATE_SECONDS.time():
+                    await self.application.process_update(update)
+            except Exception:
+                logger.exception("Failed to process update %s", update.update_id)
+            finally:
+                # Back of the line, so a chat with many updates takes turns with the others.
+                if updates:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+                self._ready.task_done()